@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# BD_RELA/backfill_consultas_diarias.py
+"""
+Crea (si hace falta) y reconstruye la tabla de agregados diarios consultas_diarias a partir de
+consultas. También crea contadores_cambios, que versiona los datos para los ETag de administración. Sirve para bases existentes antes de activar las estadísticas desde el rollup, y para
+corregir cualquier desvío (p. ej. si falló la actualización incremental de alguna consulta).
+
+Reconstruye en una sola transacción: borra los días del rango y los vuelve a calcular.
+Conviene correrlo con poco tráfico: lo que se inserte mientras corre puede sumarse dos veces
+(volver a correrlo sobre ese día lo corrige).
+
+Uso:
+    python BD_RELA/backfill_consultas_diarias.py
+    python BD_RELA/backfill_consultas_diarias.py --desde 2025-06-01 --hasta 2025-06-30
+    python BD_RELA/backfill_consultas_diarias.py --verificar
+"""
+
+import argparse
+import sys
+import time
+import traceback
+from datetime import datetime
+
+import create_tables
+from create_tables import ConsultaDiaria, ContadorCambios, get_engine
+
+from app.services import rollup_service, version_datos
+
+
+def fecha_valida(valor):
+    datetime.strptime(valor, "%Y-%m-%d")
+    return valor
+
+
+def verificar(cursor):
+    """Compara los totales del rollup con los de consultas"""
+    cursor.execute("SELECT COUNT(*), SUM(COALESCE(tokens_input, 0)), SUM(COALESCE(tokens_output, 0)) FROM consultas")
+    origen = tuple(int(v or 0) for v in cursor.fetchone())
+    cursor.execute("SELECT SUM(cantidad), SUM(tokens_input), SUM(tokens_output) FROM consultas_diarias")
+    rollup = tuple(int(v or 0) for v in cursor.fetchone())
+    print(f"consultas:         {origen[0]:>10} consultas, {origen[1]:>12} tokens entrada, {origen[2]:>12} tokens salida")
+    print(f"consultas_diarias: {rollup[0]:>10} consultas, {rollup[1]:>12} tokens entrada, {rollup[2]:>12} tokens salida")
+    if origen == rollup:
+        print("✅ El rollup coincide con consultas.")
+        return True
+    print("❌ El rollup no coincide: correr el backfill sin --verificar.")
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye consultas_diarias desde consultas")
+    parser.add_argument("--desde", type=fecha_valida, default=None, help="Primer día a reconstruir (YYYY-MM-DD)")
+    parser.add_argument("--hasta", type=fecha_valida, default=None, help="Último día a reconstruir (YYYY-MM-DD)")
+    parser.add_argument("--verificar", action="store_true", help="Sólo comparar totales del rollup con consultas")
+    args = parser.parse_args()
+
+    try:
+        engine = get_engine()
+        dialecto = create_tables.current_engine_type
+        print(f"Usando base de datos: {dialecto.upper()}")
+        ConsultaDiaria.__table__.create(engine, checkfirst=True)
+        ContadorCambios.__table__.create(engine, checkfirst=True)
+
+        conexion = engine.raw_connection()
+        try:
+            cursor = conexion.cursor()
+            if args.verificar:
+                sys.exit(0 if verificar(cursor) else 1)
+
+            rango = f"{args.desde or 'inicio'} a {args.hasta or 'hoy'}"
+            print(f"Reconstruyendo consultas_diarias ({rango})...")
+            inicio = time.perf_counter()
+            grupos = rollup_service.reconstruir(cursor, dialecto, args.desde, args.hasta)
+            # Las estadísticas pueden haber cambiado: invalidar los ETag de administración
+            version_datos.registrar_cambio(cursor, dialecto)
+            conexion.commit()
+            print(f"✅ {grupos} grupos escritos en {time.perf_counter() - inicio:.1f} s.")
+            if not args.desde and not args.hasta:
+                verificar(cursor)
+        except Exception:
+            conexion.rollback()
+            raise
+        finally:
+            conexion.close()
+    except Exception as e:
+        print(f"❌ Error en el backfill de consultas_diarias: {e}")
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@ if project_root not in sys.path:
 from dotenv import load_dotenv
 import time
 import traceback
-from sqlalchemy import create_engine, text, text, Column, Integer, String, Text, Boolean, ForeignKey, DateTime, MetaData, event
+from sqlalchemy import create_engine, text, text, Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Date, BigInteger, MetaData, Index, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from datetime import datetime
@@ -42,6 +42,31 @@ else:
     SQLITE_PATH = os.path.join(project_root, SQLITE_DIR_RELATIVE_TO_ROOT, DEFAULT_SQLITE_FILENAME)
     # print(f"SQLITE_PATH no encontrado en .env. Usando ruta por defecto construida: {SQLITE_PATH}") # Log de depuración opcional
 
+# Perfil de SQLite para producción, aplicado a cada conexión nueva de los tres accesos a la base:
+# este engine (API y scripts), el de app/services/prompt_service.py y las conexiones de
+# administración de app/api/endpoints.py. WAL permite leer mientras otro escribe (sin
+# "database is locked" entre el panel y el feedback); no sirve sobre discos de red.
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() in ("1", "true", "si", "yes")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "32768"))
+
+def aplicar_perfil_sqlite(dbapi_connection):
+    """PRAGMAs de conexión: busy_timeout, WAL + synchronous=NORMAL, mmap_size, cache_size y foreign_keys"""
+    cursor = dbapi_connection.cursor()
+    try:
+        # Primero el timeout: pasar a WAL puede tener que esperar a otra conexión
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        if SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")  # queda guardado en el archivo; en las siguientes no cambia nada
+            # Con WAL, NORMAL no arriesga la integridad: sólo la última transacción ante un corte de energía
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")  # negativo = KiB
+        cursor.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cursor.close()
+
 # Crear metadata y base declarativa
 metadata = MetaData()
 Base = declarative_base(metadata=metadata)
@@ -91,9 +116,7 @@ def get_engine():
     
     @event.listens_for(engine, "connect")
     def set_sqlite_pragma(dbapi_connection, connection_record):
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
-        cursor.close()
+        aplicar_perfil_sqlite(dbapi_connection)
     
     current_engine_type = "sqlite"
     print(f"Conexión a SQLite ({SQLITE_PATH}) establecida.")
@@ -158,6 +181,38 @@ class Consulta(Base):
     # usuario = relationship("Usuario")  # ELIMINADO
     # prompt = relationship("Prompt")    # ELIMINADO
 
+    # Índices para los filtros del panel de administración (rango de fechas, UGL y utilidad).
+    # Todos terminan en timestamp para que el filtro de igualdad + rango y el ORDER BY timestamp
+    # se resuelvan sobre el índice. En bases existentes: python BD_RELA/migrar_indices_consultas.py
+    __table_args__ = (
+        Index("ix_consultas_timestamp", "timestamp"),
+        Index("ix_consultas_ugel_timestamp", "ugel_origen", "timestamp"),
+        Index("ix_consultas_util_timestamp", "respuesta_util", "timestamp"),
+    )
+
+class ConsultaDiaria(Base):
+    """Agregados diarios de consultas para las estadísticas de administración (ver app/services/rollup_service.py)"""
+    __tablename__ = "consultas_diarias"
+
+    fecha = Column(Date, primary_key=True, autoincrement=False)
+    # Los NULL de consultas se guardan como 'Sin UGEL' / 'sin clasificar' / -1 (columnas de la PK)
+    ugel_origen = Column(String(100), primary_key=True, autoincrement=False)
+    respuesta_util = Column(String(15), primary_key=True, autoincrement=False)
+    respuesta_es_vacia = Column(Integer, primary_key=True, autoincrement=False)
+
+    cantidad = Column(Integer, nullable=False, default=0)
+    tokens_input = Column(BigInteger, nullable=False, default=0)
+    tokens_output = Column(BigInteger, nullable=False, default=0)
+    tiempo_respuesta_ms = Column(BigInteger, nullable=False, default=0)  # suma de los tiempos > 0
+    cantidad_con_tiempo = Column(Integer, nullable=False, default=0)     # consultas con tiempo > 0
+
+class ContadorCambios(Base):
+    """Contadores que versionan los datos de consultas para los ETag de administración (ver app/services/version_datos.py)"""
+    __tablename__ = "contadores_cambios"
+
+    nombre = Column(String(50), primary_key=True, autoincrement=False)
+    valor = Column(BigInteger, nullable=False, default=0)
+
 class FeedbackRespuesta(Base):
     __tablename__ = "feedback_respuesta"
     
@@ -226,7 +281,7 @@ def crear_tablas():
         
         # Eliminar tablas si existen en orden inverso a las dependencias
         print("\nEliminando tablas existentes para recrearlas...")
-        for tabla in reversed([FeedbackRespuesta, Consulta, Usuario, Prompt, LogBatchBDV, LogArranqueApp]):
+        for tabla in reversed([FeedbackRespuesta, Consulta, ConsultaDiaria, ContadorCambios, Usuario, Prompt, LogBatchBDV, LogArranqueApp]):
             tabla_nombre = tabla.__tablename__
             try:
                 tabla.__table__.drop(engine, checkfirst=True)
@@ -246,7 +301,7 @@ def crear_tablas():
         print("\nCreando tablas...")
         
         # Primero crear tablas sin dependencias
-        for tabla in [Usuario, Prompt, LogBatchBDV, LogArranqueApp]:
+        for tabla in [Usuario, Prompt, ConsultaDiaria, ContadorCambios, LogBatchBDV, LogArranqueApp]:
             tabla_nombre = tabla.__tablename__
             try:
                 tabla.__table__.create(engine, checkfirst=True)
@@ -262,6 +317,9 @@ def crear_tablas():
             try:
                 tabla.__table__.create(engine, checkfirst=True)
                 print(f"Tabla '{tabla_nombre}' creada exitosamente.")
+                # create() también crea los índices declarados en __table_args__
+                for indice in tabla.__table__.indexes:
+                    print(f"  Índice '{indice.name}' ({', '.join(c.name for c in indice.columns)}) creado.")
                 time.sleep(0.2)  # Pequeña pausa
             except Exception as e:
                 print(f"Error al crear la tabla '{tabla_nombre}': {e}")
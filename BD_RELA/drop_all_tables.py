@@ -20,6 +20,8 @@ def eliminar_todas_las_tablas():
         tablas = [
             "feedback_respuesta",
             "consultas",
+            "consultas_diarias",
+            "contadores_cambios",
             "prompts",
             "usuarios",
             "log_batch_bdv",
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# BD_RELA/migrar_indices_consultas.py
+"""
+Crea en una base existente (MySQL o SQLite) los índices de la tabla consultas declarados en
+create_tables.Consulta, sin recrear tablas ni tocar datos:
+
+    ix_consultas_timestamp        (timestamp)
+    ix_consultas_ugel_timestamp   (ugel_origen, timestamp)
+    ix_consultas_util_timestamp   (respuesta_util, timestamp)
+
+Es idempotente: los índices que ya existen se saltean. Al final muestra el plan de ejecución de
+las consultas del panel de administración para verificar que usan los índices.
+
+Uso:
+    python BD_RELA/migrar_indices_consultas.py
+    python BD_RELA/migrar_indices_consultas.py --solo-plan
+"""
+
+import argparse
+import sys
+import time
+import traceback
+
+from sqlalchemy import inspect, text
+
+import create_tables
+from create_tables import Consulta, get_engine
+
+# Consultas representativas de los endpoints de administración (rango semiabierto sobre timestamp)
+CONSULTAS_PLAN = {
+    "listado por fecha": (
+        "SELECT id_consulta FROM consultas WHERE timestamp >= :desde AND timestamp < :hasta "
+        "ORDER BY timestamp DESC, id_consulta DESC LIMIT 50"
+    ),
+    "listado por utilidad": (
+        "SELECT id_consulta FROM consultas WHERE respuesta_util = 'si' AND timestamp >= :desde AND timestamp < :hasta "
+        "ORDER BY timestamp DESC LIMIT 50"
+    ),
+    "conteo por UGL": (
+        "SELECT COUNT(*) FROM consultas WHERE ugel_origen = 'UGL I' AND timestamp >= :desde AND timestamp < :hasta"
+    ),
+    "registros por día": (
+        "SELECT DATE(timestamp), COUNT(*) FROM consultas WHERE timestamp >= :desde AND timestamp < :hasta "
+        "GROUP BY DATE(timestamp)"
+    ),
+}
+
+
+def crear_indices(engine):
+    existentes = {indice["name"] for indice in inspect(engine).get_indexes(Consulta.__tablename__)}
+    for indice in sorted(Consulta.__table__.indexes, key=lambda i: i.name):
+        columnas = ", ".join(c.name for c in indice.columns)
+        if indice.name in existentes:
+            print(f"= Índice '{indice.name}' ({columnas}) ya existe.")
+            continue
+        inicio = time.perf_counter()
+        indice.create(engine)
+        print(f"✅ Índice '{indice.name}' ({columnas}) creado en {time.perf_counter() - inicio:.1f} s.")
+
+    # Actualizar estadísticas para que el planificador elija los índices nuevos
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE" if create_tables.current_engine_type == "sqlite" else "ANALYZE TABLE consultas"))
+    print("Estadísticas de la tabla actualizadas (ANALYZE).")
+
+
+def mostrar_planes(engine):
+    prefijo = "EXPLAIN QUERY PLAN " if create_tables.current_engine_type == "sqlite" else "EXPLAIN "
+    params = {"desde": "2025-01-01 00:00:00", "hasta": "2025-02-01 00:00:00"}
+    with engine.connect() as conn:
+        for nombre, sql in CONSULTAS_PLAN.items():
+            print(f"\n--- {nombre} ---")
+            for fila in conn.execute(text(prefijo + sql), params):
+                print("   ", " | ".join(str(valor) for valor in fila))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crea los índices de la tabla consultas en una base existente")
+    parser.add_argument("--solo-plan", action="store_true", help="No crear índices, sólo mostrar los planes de ejecución")
+    args = parser.parse_args()
+
+    try:
+        engine = get_engine()
+        print(f"Usando base de datos: {create_tables.current_engine_type.upper()}")
+        if not args.solo_plan:
+            crear_indices(engine)
+        mostrar_planes(engine)
+    except Exception as e:
+        print(f"❌ Error en la migración de índices: {e}")
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
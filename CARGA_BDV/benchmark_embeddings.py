@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de backends de embeddings: OpenAI vs local (sentence-transformers en CPU).
+
+Para cada backend mide, sobre las preguntas del set golden:
+  - tiempo de carga / calentamiento (primera llamada)
+  - latencia de embedding de consulta (p50/p95/p99) y throughput en lote
+  - calidad de recuperación (recall@k, MRR) contra la colección cargada con ese backend
+
+Cada backend necesita su propia colección (la dimensión de los vectores es distinta), p. ej.:
+    python carga_bdv_q1.py --embeddings-backend local     # carga una versión nueva con 384 dim
+Uso:
+    python benchmark_embeddings.py --golden preguntas_golden.jsonl \
+        --coleccion-openai fragment_store --coleccion-local fragment_store_local
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from qdrant_client import QdrantClient
+
+from benchmark_transporte_qdrant import percentil
+from benchmark_recuperacion import RecuperadorDenso, cargar_golden, evaluar
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.embeddings_local import crear_embeddings, dimension_embeddings, MODELO_LOCAL_POR_DEFECTO
+
+
+def medir_backend(nombre, embeddings, preguntas):
+    textos = [p["pregunta"] for p in preguntas]
+
+    # Primera llamada: carga del modelo (local) o apertura de conexión (OpenAI)
+    inicio = time.perf_counter()
+    embeddings.embed_query(textos[0])
+    calentamiento = time.perf_counter() - inicio
+
+    latencias_ms = []
+    for texto in textos:
+        t0 = time.perf_counter()
+        embeddings.embed_query(texto)
+        latencias_ms.append((time.perf_counter() - t0) * 1000)
+
+    inicio = time.perf_counter()
+    embeddings.embed_documents(textos)
+    tiempo_lote = time.perf_counter() - inicio
+
+    return {
+        "backend": nombre,
+        "dimension": dimension_embeddings(embeddings),
+        "calentamiento_segundos": round(calentamiento, 3),
+        "consulta_ms_media": round(statistics.mean(latencias_ms), 2),
+        "consulta_ms_p50": round(percentil(latencias_ms, 50), 2),
+        "consulta_ms_p95": round(percentil(latencias_ms, 95), 2),
+        "consulta_ms_p99": round(percentil(latencias_ms, 99), 2),
+        "lote_textos_por_segundo": round(len(textos) / tiempo_lote, 1) if tiempo_lote > 0 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de embeddings OpenAI vs local (latencia y calidad de recuperación)")
+    parser.add_argument("--golden", default="preguntas_golden.jsonl", help="Set de preguntas golden (JSONL)")
+    parser.add_argument("--backends", default="openai,local", help="Backends a comparar: openai,local")
+    parser.add_argument("--url", default=os.getenv("QDRANT_URL", "http://localhost:6333"), help="URL de Qdrant")
+    parser.add_argument("--coleccion-openai", default="fragment_store", help="Colección cargada con embeddings de OpenAI")
+    parser.add_argument("--coleccion-local", default="fragment_store_local", help="Colección cargada con el backend local")
+    parser.add_argument("--modelo-local", default=os.getenv("EMBEDDINGS_MODELO_LOCAL", MODELO_LOCAL_POR_DEFECTO), help="Modelo de sentence-transformers")
+    parser.add_argument("--hilos", type=int, default=int(os.getenv("EMBEDDINGS_HILOS_LOCAL", 2)), help="Hilos de CPU para el backend local")
+    parser.add_argument("--k", type=int, default=5, help="Registros a recuperar por pregunta")
+    parser.add_argument("--sin-calidad", action="store_true", help="Medir sólo latencias de embedding (sin Qdrant)")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    preguntas = cargar_golden(args.golden)
+    if not preguntas:
+        print(f"Error: el set golden {args.golden} no tiene preguntas válidas")
+        return
+    print(f"Set golden: {len(preguntas)} preguntas")
+
+    client = None if args.sin_calidad else QdrantClient(url=args.url, timeout=60)
+    colecciones = {"openai": args.coleccion_openai, "local": args.coleccion_local}
+    resultados = []
+    try:
+        for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+            print(f"\n--- Backend: {backend} ---")
+            embeddings = crear_embeddings(backend, api_key=os.getenv("OPENAI_API_KEY"), modelo_local=args.modelo_local, hilos=args.hilos)
+            resultado = medir_backend(backend, embeddings, preguntas)
+
+            if client is not None:
+                calidad = evaluar(RecuperadorDenso(client, colecciones[backend], embeddings), preguntas, args.k)
+                resultado.update({clave: valor for clave, valor in calidad.items() if clave not in ("recuperador", "detalle")})
+                resultado["coleccion"] = colecciones[backend]
+
+            resultados.append(resultado)
+            for clave, valor in resultado.items():
+                print(f"  {clave}: {valor}")
+    finally:
+        if client is not None:
+            client.close()
+
+    salida = args.salida or f"benchmark_embeddings_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump({"fecha": datetime.now().isoformat(), "golden": args.golden, "resultados": resultados}, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark offline de recuperación sobre un set de preguntas "golden".
+
+Reemplaza a consulta_comparativa.py / comparar_resultados.py (scripts generados al vuelo y
+resultados parseados con regex). Cada recuperador se ejecuta en el mismo proceso y devuelve
+una lista ordenada de ID_SUB; el runner calcula recall@k, MRR, latencias p50/p95/p99 y
+throughput, y guarda todo en JSON.
+
+Recuperadores disponibles:
+  - denso:      Qdrant (vector denso, colección/alias configurado)
+  - chroma:     Chroma persistido en disco (mismo embedding de consulta)
+  - hibrido:    BM25 sobre el corpus de la colección + denso, fusionados con RRF
+  - reordenado: candidatos densos reordenados con un cross-encoder (sentence-transformers)
+
+Set golden (JSONL, una pregunta por línea):
+    {"id": "q001", "pregunta": "¿Cómo pido un audífono?", "id_sub_esperados": [1234, 1240]}
+
+Los embeddings de las preguntas se guardan con app/services/embeddings_cache.py: la primera
+corrida los graba (necesita OPENAI_API_KEY) y las siguientes corren sin red con --offline.
+
+Uso:
+    python benchmark_recuperacion.py --golden preguntas_golden.jsonl --recuperadores denso,hibrido --k 5
+    python benchmark_recuperacion.py --generar-golden ../data/json/servicios.json --muestra 50
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import unicodedata
+from datetime import datetime
+
+from qdrant_client import QdrantClient
+
+from benchmark_transporte_qdrant import percentil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.embeddings_cache import EmbeddingsGrabadas
+
+
+# ---------------------------------------------------------------------------
+# Recuperadores: buscar(pregunta, k) -> lista ordenada de id_sub (str, sin repetidos)
+# ---------------------------------------------------------------------------
+
+def _id_sub_de_payload(payload):
+    metadata = (payload or {}).get("metadata") or {}
+    valor = metadata.get("id_sub")
+    return None if valor in (None, "") else str(valor)
+
+
+def _sin_repetidos(ids, k):
+    """Primeras k apariciones distintas (varios chunks de un registro cuentan una vez)"""
+    vistos = []
+    for id_sub in ids:
+        if id_sub is not None and id_sub not in vistos:
+            vistos.append(id_sub)
+            if len(vistos) == k:
+                break
+    return vistos
+
+
+class RecuperadorDenso:
+    nombre = "denso"
+
+    def __init__(self, client, coleccion, embeddings, sobremuestreo=3):
+        self.client = client
+        self.coleccion = coleccion
+        self.embeddings = embeddings
+        self.sobremuestreo = sobremuestreo
+
+    def candidatos(self, pregunta, limite):
+        respuesta = self.client.query_points(
+            collection_name=self.coleccion,
+            query=self.embeddings.embed_query(pregunta),
+            limit=limite,
+            with_payload=True,
+        )
+        return respuesta.points
+
+    def buscar(self, pregunta, k):
+        puntos = self.candidatos(pregunta, k * self.sobremuestreo)
+        return _sin_repetidos((_id_sub_de_payload(p.payload) for p in puntos), k)
+
+
+class RecuperadorChroma:
+    nombre = "chroma"
+
+    def __init__(self, directorio, coleccion, embeddings, sobremuestreo=3):
+        from langchain_chroma import Chroma
+        self.embeddings = embeddings
+        self.sobremuestreo = sobremuestreo
+        self.vector_store = Chroma(persist_directory=directorio, embedding_function=embeddings, collection_name=coleccion)
+
+    def buscar(self, pregunta, k):
+        docs = self.vector_store.similarity_search_by_vector(self.embeddings.embed_query(pregunta), k=k * self.sobremuestreo)
+        ids = (None if d.metadata.get("id_sub") in (None, "") else str(d.metadata.get("id_sub")) for d in docs)
+        return _sin_repetidos(ids, k)
+
+
+def tokenizar(texto):
+    """Minúsculas, sin acentos, palabras de 2+ caracteres (BM25)"""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.findall(r"[a-z0-9]{2,}", texto)
+
+
+class RecuperadorHibrido:
+    """BM25 sobre el texto de la colección + búsqueda densa, fusionados con Reciprocal Rank Fusion"""
+    nombre = "hibrido"
+
+    def __init__(self, denso, rrf_k=60, profundidad=50):
+        from rank_bm25 import BM25Okapi
+        self.denso = denso
+        self.rrf_k = rrf_k
+        self.profundidad = profundidad
+
+        # Corpus: todos los puntos de la colección (payload sin vectores)
+        self.ids = []
+        corpus = []
+        offset = None
+        while True:
+            puntos, offset = denso.client.scroll(
+                collection_name=denso.coleccion, limit=1000, offset=offset,
+                with_payload=["page_content", "metadata.id_sub"], with_vectors=False,
+            )
+            for p in puntos:
+                self.ids.append(_id_sub_de_payload(p.payload))
+                corpus.append(tokenizar((p.payload or {}).get("page_content", "")))
+            if offset is None:
+                break
+        print(f"Índice BM25 construido sobre {len(corpus)} fragmentos")
+        self.bm25 = BM25Okapi(corpus)
+
+    def buscar(self, pregunta, k):
+        puntajes = self.bm25.get_scores(tokenizar(pregunta))
+        orden_bm25 = sorted(range(len(puntajes)), key=lambda i: puntajes[i], reverse=True)[:self.profundidad]
+        ranking_bm25 = _sin_repetidos((self.ids[i] for i in orden_bm25), self.profundidad)
+        ranking_denso = self.denso.buscar(pregunta, self.profundidad)
+
+        fusion = {}
+        for ranking in (ranking_bm25, ranking_denso):
+            for posicion, id_sub in enumerate(ranking, 1):
+                fusion[id_sub] = fusion.get(id_sub, 0.0) + 1.0 / (self.rrf_k + posicion)
+        return [id_sub for id_sub, _ in sorted(fusion.items(), key=lambda par: par[1], reverse=True)[:k]]
+
+
+class RecuperadorReordenado:
+    """Candidatos densos reordenados con un cross-encoder local"""
+    nombre = "reordenado"
+
+    def __init__(self, denso, modelo, candidatos=30):
+        from sentence_transformers import CrossEncoder
+        self.denso = denso
+        self.candidatos = candidatos
+        self.modelo = CrossEncoder(modelo)
+
+    def buscar(self, pregunta, k):
+        puntos = self.denso.candidatos(pregunta, self.candidatos)
+        if not puntos:
+            return []
+        pares = [(pregunta, (p.payload or {}).get("page_content", "")) for p in puntos]
+        puntajes = self.modelo.predict(pares)
+        orden = sorted(range(len(puntos)), key=lambda i: puntajes[i], reverse=True)
+        return _sin_repetidos((_id_sub_de_payload(puntos[i].payload) for i in orden), k)
+
+
+# ---------------------------------------------------------------------------
+# Métricas
+# ---------------------------------------------------------------------------
+
+def cargar_golden(ruta):
+    preguntas = []
+    with open(ruta, "r", encoding="utf-8") as f:
+        for numero, linea in enumerate(f, 1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            item = json.loads(linea)
+            esperados = [str(x) for x in item.get("id_sub_esperados", [])]
+            if not item.get("pregunta") or not esperados:
+                print(f"Advertencia: línea {numero} sin pregunta o sin id_sub_esperados, se omite")
+                continue
+            preguntas.append({"id": item.get("id", f"q{numero:03d}"), "pregunta": item["pregunta"], "esperados": esperados})
+    return preguntas
+
+
+def evaluar(recuperador, preguntas, k, repeticiones=1):
+    """Ejecuta todas las preguntas y devuelve métricas agregadas y el detalle por pregunta"""
+    # Calentamiento: primera consulta fuera de la medición (conexiones, carga de modelos)
+    recuperador.buscar(preguntas[0]["pregunta"], k)
+
+    latencias_ms = []
+    detalle = []
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for item in preguntas:
+            t0 = time.perf_counter()
+            ranking = recuperador.buscar(item["pregunta"], k)
+            latencias_ms.append((time.perf_counter() - t0) * 1000)
+            if len(detalle) < len(preguntas):
+                encontrados = [e for e in item["esperados"] if e in ranking]
+                posiciones = [ranking.index(e) + 1 for e in encontrados]
+                detalle.append({
+                    "id": item["id"],
+                    "recall": len(encontrados) / len(item["esperados"]),
+                    "rr": 1.0 / min(posiciones) if posiciones else 0.0,
+                    "ranking": ranking,
+                })
+    tiempo_total = time.perf_counter() - inicio
+
+    return {
+        "recuperador": recuperador.nombre,
+        "k": k,
+        "preguntas": len(preguntas),
+        f"recall@{k}": round(statistics.mean(d["recall"] for d in detalle), 4),
+        "mrr": round(statistics.mean(d["rr"] for d in detalle), 4),
+        "aciertos@k": sum(1 for d in detalle if d["recall"] > 0),
+        "latencia_ms_p50": round(percentil(latencias_ms, 50), 2),
+        "latencia_ms_p95": round(percentil(latencias_ms, 95), 2),
+        "latencia_ms_p99": round(percentil(latencias_ms, 99), 2),
+        "consultas_por_segundo": round(len(latencias_ms) / tiempo_total, 2) if tiempo_total > 0 else None,
+        "detalle": detalle,
+    }
+
+
+def generar_golden(ruta_json, salida, muestra, semilla):
+    """
+    Borrador de set golden a partir del export SIMAP: una pregunta por registro muestreado
+    armada con su servicio/subtipo, con su ID_SUB como esperado. Conviene revisarlo a mano.
+    """
+    with open(ruta_json, "r", encoding="utf-8") as f:
+        registros = [r for r in json.load(f).get("RECORDS", []) if r.get("ID_SUB") and r.get("SERVICIO")]
+    random.seed(semilla)
+    seleccion = random.sample(registros, min(muestra, len(registros)))
+    with open(salida, "w", encoding="utf-8") as f:
+        for i, registro in enumerate(seleccion, 1):
+            tema = " ".join(x for x in (registro.get("SERVICIO"), registro.get("SUBTIPO")) if x).strip()
+            f.write(json.dumps({
+                "id": f"q{i:03d}",
+                "pregunta": f"¿Cómo se tramita {tema}?",
+                "id_sub_esperados": [registro["ID_SUB"]],
+            }, ensure_ascii=False) + "\n")
+    print(f"Set golden borrador con {len(seleccion)} preguntas guardado en {salida}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline de recuperación (recall@k, MRR, latencias)")
+    parser.add_argument("--golden", default="preguntas_golden.jsonl", help="Set de preguntas golden (JSONL)")
+    parser.add_argument("--recuperadores", default="denso,hibrido", help="Lista separada por comas: denso,chroma,hibrido,reordenado")
+    parser.add_argument("--k", type=int, default=5, help="Registros (ID_SUB distintos) a recuperar por pregunta")
+    parser.add_argument("--url", default=os.getenv("QDRANT_URL", "http://localhost:6333"), help="URL de Qdrant")
+    parser.add_argument("--coleccion", default=os.getenv("COLLECTION_NAME", "fragment_store"), help="Colección o alias de Qdrant")
+    parser.add_argument("--chroma-dir", default="./data/SERVICIOS/CHROMA_DB", help="Directorio de Chroma persistido")
+    parser.add_argument("--chroma-coleccion", default="fragment_store", help="Colección de Chroma")
+    parser.add_argument("--modelo-embeddings", default=os.getenv("OPENAI_EMBEDDINGS_MODEL", "text-embedding-ada-002"), help="Modelo de embeddings de consulta")
+    parser.add_argument("--modelo-reranker", default="cross-encoder/mmarco-mMiniLMv2-L12-H384-v1", help="Cross-encoder para el recuperador reordenado")
+    parser.add_argument("--cache-embeddings", default="cache_embeddings", help="Directorio del cache de embeddings (shards .npy + índice)")
+    parser.add_argument("--offline", action="store_true", help="No llamar a OpenAI: todas las preguntas deben estar en el cache")
+    parser.add_argument("--repeticiones", type=int, default=1, help="Veces que se repite el set para medir latencias")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--generar-golden", metavar="JSON_SIMAP", default=None, help="Generar un set golden borrador desde el export SIMAP y salir")
+    parser.add_argument("--muestra", type=int, default=50, help="Preguntas del set golden borrador")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla para el muestreo del set borrador")
+    args = parser.parse_args()
+
+    if args.generar_golden:
+        generar_golden(args.generar_golden, args.golden, args.muestra, args.semilla)
+        return
+
+    preguntas = cargar_golden(args.golden)
+    if not preguntas:
+        print(f"Error: el set golden {args.golden} no tiene preguntas válidas")
+        return
+    print(f"Set golden: {len(preguntas)} preguntas")
+
+    base = None
+    if not args.offline:
+        from langchain_openai import OpenAIEmbeddings
+        base = OpenAIEmbeddings(model=args.modelo_embeddings, api_key=os.getenv("OPENAI_API_KEY"))
+    embeddings = EmbeddingsGrabadas(
+        base, args.cache_embeddings, modo="reproducir" if args.offline else "grabar", modelo=args.modelo_embeddings,
+    )
+    client = QdrantClient(url=args.url, timeout=60)
+    denso = RecuperadorDenso(client, args.coleccion, embeddings)
+
+    resultados = []
+    try:
+        for nombre in [n.strip() for n in args.recuperadores.split(",") if n.strip()]:
+            print(f"\n--- Recuperador: {nombre} ---")
+            if nombre == "denso":
+                recuperador = denso
+            elif nombre == "chroma":
+                recuperador = RecuperadorChroma(args.chroma_dir, args.chroma_coleccion, embeddings)
+            elif nombre == "hibrido":
+                recuperador = RecuperadorHibrido(denso)
+            elif nombre == "reordenado":
+                recuperador = RecuperadorReordenado(denso, args.modelo_reranker)
+            else:
+                print(f"Recuperador desconocido: {nombre}")
+                continue
+
+            resultado = evaluar(recuperador, preguntas, args.k, args.repeticiones)
+            resultados.append(resultado)
+            for clave, valor in resultado.items():
+                if clave != "detalle":
+                    print(f"  {clave}: {valor}")
+    finally:
+        embeddings.guardar()
+        client.close()
+
+    salida = args.salida or f"benchmark_recuperacion_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump({
+            "fecha": datetime.now().isoformat(),
+            "golden": args.golden,
+            "coleccion": args.coleccion,
+            "modelo_embeddings": args.modelo_embeddings,
+            "cache_embeddings": embeddings.metricas,
+            "resultados": resultados,
+        }, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
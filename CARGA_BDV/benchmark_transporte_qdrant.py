@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de transporte Qdrant: HTTP/JSON vs gRPC.
+
+Crea una colección temporal por transporte en un Qdrant local (ver docker-compose-qdrant.yml,
+que expone 6333 para HTTP y 6334 para gRPC), sube vectores aleatorios de 1536 dimensiones en
+lotes y luego ejecuta búsquedas. Reporta el throughput de carga (puntos/s) y la latencia de
+búsqueda (p50/p95/p99). No llama a OpenAI: los vectores son sintéticos.
+
+Uso:
+    python benchmark_transporte_qdrant.py --url http://localhost:6333 --puntos 5000 --consultas 300
+"""
+
+import argparse
+import json
+import math
+import random
+import statistics
+import time
+from datetime import datetime
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano sobre una lista de valores"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, math.ceil(p / 100.0 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def vector_aleatorio(dimension):
+    return [random.uniform(-1.0, 1.0) for _ in range(dimension)]
+
+
+def crear_cliente(url, transporte, grpc_port, timeout):
+    if transporte == "grpc":
+        return QdrantClient(
+            url=url,
+            prefer_grpc=True,
+            grpc_port=grpc_port,
+            timeout=timeout,
+            grpc_options={
+                "grpc.keepalive_time_ms": 30000,
+                "grpc.keepalive_permit_without_calls": 1,
+                "grpc.max_send_message_length": 64 * 1024 * 1024,
+            },
+        )
+    return QdrantClient(url=url, timeout=timeout)
+
+
+def ejecutar_benchmark(cliente, transporte, vectores, consultas, tamano_lote, k):
+    """Carga los vectores y ejecuta las consultas con un cliente ya creado"""
+    nombre_coleccion = f"bench_transporte_{transporte}"
+    dimension = len(vectores[0])
+
+    if cliente.collection_exists(nombre_coleccion):
+        cliente.delete_collection(nombre_coleccion)
+    cliente.create_collection(
+        collection_name=nombre_coleccion,
+        vectors_config=models.VectorParams(size=dimension, distance=models.Distance.COSINE),
+    )
+
+    try:
+        # 1. Carga en lotes
+        inicio = time.perf_counter()
+        for desde in range(0, len(vectores), tamano_lote):
+            lote = vectores[desde:desde + tamano_lote]
+            puntos = [
+                models.PointStruct(id=desde + i, vector=v, payload={"page_content": f"doc {desde + i}", "metadata": {"id_sub": desde + i}})
+                for i, v in enumerate(lote)
+            ]
+            cliente.upsert(collection_name=nombre_coleccion, points=puntos, wait=True)
+        tiempo_carga = time.perf_counter() - inicio
+
+        # 2. Calentamiento (abrir canal / conexión keep-alive)
+        for consulta in consultas[:5]:
+            cliente.query_points(collection_name=nombre_coleccion, query=consulta, limit=k)
+
+        # 3. Búsquedas
+        latencias_ms = []
+        inicio_busquedas = time.perf_counter()
+        for consulta in consultas:
+            t0 = time.perf_counter()
+            cliente.query_points(collection_name=nombre_coleccion, query=consulta, limit=k, with_payload=True)
+            latencias_ms.append((time.perf_counter() - t0) * 1000)
+        tiempo_busquedas = time.perf_counter() - inicio_busquedas
+    finally:
+        cliente.delete_collection(nombre_coleccion)
+
+    return {
+        "transporte": transporte,
+        "puntos": len(vectores),
+        "tamano_lote": tamano_lote,
+        "carga_segundos": round(tiempo_carga, 3),
+        "carga_puntos_por_segundo": round(len(vectores) / tiempo_carga, 1) if tiempo_carga > 0 else None,
+        "consultas": len(consultas),
+        "busqueda_qps": round(len(consultas) / tiempo_busquedas, 1) if tiempo_busquedas > 0 else None,
+        "busqueda_ms_media": round(statistics.mean(latencias_ms), 2),
+        "busqueda_ms_p50": round(percentil(latencias_ms, 50), 2),
+        "busqueda_ms_p95": round(percentil(latencias_ms, 95), 2),
+        "busqueda_ms_p99": round(percentil(latencias_ms, 99), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de transporte HTTP vs gRPC contra un Qdrant local")
+    parser.add_argument("--url", default="http://localhost:6333", help="URL HTTP de Qdrant")
+    parser.add_argument("--grpc-port", type=int, default=6334, help="Puerto gRPC de Qdrant")
+    parser.add_argument("--puntos", type=int, default=5000, help="Cantidad de vectores a subir")
+    parser.add_argument("--dimension", type=int, default=1536, help="Dimensión de los vectores (1536 = OpenAI)")
+    parser.add_argument("--lote", type=int, default=256, help="Tamaño de lote para upsert")
+    parser.add_argument("--consultas", type=int, default=300, help="Cantidad de búsquedas a medir")
+    parser.add_argument("--k", type=int, default=5, help="Resultados por búsqueda")
+    parser.add_argument("--timeout", type=int, default=60, help="Timeout del cliente en segundos")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla para los vectores aleatorios")
+    parser.add_argument("--salida", default=None, help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    random.seed(args.semilla)
+    print(f"Generando {args.puntos} vectores de {args.dimension} dimensiones...")
+    vectores = [vector_aleatorio(args.dimension) for _ in range(args.puntos)]
+    consultas = [vector_aleatorio(args.dimension) for _ in range(args.consultas)]
+
+    resultados = []
+    for transporte in ("http", "grpc"):
+        print(f"\n--- Transporte: {transporte.upper()} ---")
+        cliente = crear_cliente(args.url, transporte, args.grpc_port, args.timeout)
+        try:
+            resultado = ejecutar_benchmark(cliente, transporte, vectores, consultas, args.lote, args.k)
+        finally:
+            cliente.close()
+        resultados.append(resultado)
+        for clave, valor in resultado.items():
+            print(f"  {clave}: {valor}")
+
+    http, grpc = resultados
+    if http["carga_segundos"] and grpc["carga_segundos"]:
+        print(f"\nAceleración de carga gRPC vs HTTP: x{http['carga_segundos'] / grpc['carga_segundos']:.2f}")
+    if grpc["busqueda_ms_p50"]:
+        print(f"Aceleración de búsqueda p50 gRPC vs HTTP: x{http['busqueda_ms_p50'] / grpc['busqueda_ms_p50']:.2f}")
+
+    salida = args.salida or f"benchmark_transporte_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump({"fecha": datetime.now().isoformat(), "url": args.url, "resultados": resultados}, f, indent=2)
+    print(f"\nResultados guardados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,17 @@ from langchain.schema import Document
 import html
 import re
 import time
+from itertools import islice
+from ingesta_qdrant import MotorIngesta, DeltaColeccion, firma_archivo, hash_contenido, id_punto_determinista, iterar_registros_json, memoria_pico_mb
+from fragmentacion import Fragmentador
+
+# Raíz del proyecto en el path para reutilizar módulos de la app que no dependen de su configuración
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.embeddings_cache import envolver_embeddings
+from app.services.embeddings_local import crear_embeddings, dimension_embeddings
+from app.services.qdrant_conexion import obtener_parametros_cliente_qdrant
+from functools import lru_cache
+from versiones_qdrant import nombre_version, resolver_alias, apuntar_alias, podar_versiones, version_anterior, version_pendiente, es_version_de
 
 # Función para encontrar y cargar el archivo config.ini
 def cargar_configuracion():
@@ -49,6 +60,19 @@ def parsear_argumentos():
     parser.add_argument('--qdrant-path', type=str, help='Ruta alternativa para el almacenamiento de Qdrant (ej: D:/qdrant)')
     parser.add_argument('--comprobar-espacio', action='store_true', help='Verificar espacio disponible antes de iniciar la carga')
     parser.add_argument('--no-borrar', action='store_true', help='No borrar la colección existente (añadir a la existente)')
+    parser.add_argument('--grpc', action='store_true', help='Usar transporte gRPC para Qdrant (ignora qdrant_prefer_grpc del config.ini)')
+    parser.add_argument('--http', action='store_true', help='Forzar transporte HTTP/JSON para Qdrant')
+    parser.add_argument('--lote-embeddings', type=int, default=None, help='Documentos por request de embeddings (por defecto: tamano_lote_embeddings del config.ini o 100)')
+    parser.add_argument('--paralelo', type=int, default=None, help='Requests de embeddings en paralelo (por defecto: max_paralelo_embeddings del config.ini o 4)')
+    parser.add_argument('--checkpoint', type=str, default=None, help='Archivo de checkpoint (por defecto: checkpoint_carga_<coleccion>.json)')
+    parser.add_argument('--reanudar', action='store_true', help='Reanudar una carga fallida desde el último lote confirmado (no borra la colección)')
+    parser.add_argument('--incremental', action='store_true', help='Carga incremental: re-embebe sólo registros nuevos o modificados (por ID_SUB + hash) y borra los que desaparecieron')
+    parser.add_argument('--sin-alias', action='store_true', help='Recrear la colección en el lugar (borrar y cargar) en vez de cargar una versión nueva y reapuntar el alias')
+    parser.add_argument('--rollback', action='store_true', help='No cargar nada: reapuntar el alias a la versión anterior de la colección')
+    parser.add_argument('--cache-embeddings', type=str, default=None, help='Directorio del cache de embeddings en disco (por defecto: embeddings_cache_dir del config.ini o cache_embeddings)')
+    parser.add_argument('--modo-cache', choices=['off', 'grabar', 'reproducir'], default=None, help='Cache de embeddings: grabar (usa y completa el cache) o reproducir (sólo cache, sin llamar a OpenAI)')
+    parser.add_argument('--embeddings-backend', choices=['openai', 'local'], default=None, help='Backend de embeddings: openai (1536 dim) o local con sentence-transformers (por defecto: embeddings_backend del config.ini o openai)')
+    parser.add_argument('--versiones-conservar', type=int, default=None, help='Versiones anteriores a conservar para rollback (por defecto: versiones_conservar del config.ini o 2)')
     return parser.parse_args()
 
 # Cargar la configuración desde config.ini
@@ -78,6 +102,40 @@ try:
     max_context_tokens = int(config['SERVICIOS_SIMAP_Q'].get('max_context_tokens', 80))
     collection_name_fragmento = config['SERVICIOS_SIMAP_Q'].get('collection_name_fragmento', 'fragment_store')
     
+    # Transporte de Qdrant (HTTP por defecto, gRPC opcional)
+    qdrant_prefer_grpc = config['SERVICIOS_SIMAP_Q'].get('qdrant_prefer_grpc', 'false').strip().lower() in ('1', 'true', 'si', 'sí', 'yes')
+    if args.grpc:
+        qdrant_prefer_grpc = True
+    elif args.http:
+        qdrant_prefer_grpc = False
+    qdrant_grpc_port = int(config['SERVICIOS_SIMAP_Q'].get('qdrant_grpc_port', 6334))
+    qdrant_timeout = int(config['SERVICIOS_SIMAP_Q'].get('qdrant_timeout', 60))
+    qdrant_grpc_keepalive_ms = int(config['SERVICIOS_SIMAP_Q'].get('qdrant_grpc_keepalive_ms', 30000))
+    qdrant_batch_upsert = int(config['SERVICIOS_SIMAP_Q'].get('qdrant_batch_upsert', 64))
+    
+    # Parámetros del motor de ingesta (lotes de embeddings y concurrencia)
+    tamano_lote_embeddings = args.lote_embeddings or int(config['SERVICIOS_SIMAP_Q'].get('tamano_lote_embeddings', 100))
+    max_paralelo_embeddings = args.paralelo or int(config['SERVICIOS_SIMAP_Q'].get('max_paralelo_embeddings', 4))
+    
+    # Carga incremental (delta por ID_SUB + hash de contenido) activable también desde config.ini
+    modo_incremental = args.incremental or config['SERVICIOS_SIMAP_Q'].get('modo_incremental', 'false').strip().lower() in ('1', 'true', 'si', 'sí', 'yes')
+    
+    # Cache de embeddings en disco (grabar / reproducir)
+    embeddings_cache_modo = args.modo_cache or config['SERVICIOS_SIMAP_Q'].get('embeddings_cache_modo', 'off').strip().lower()
+    embeddings_cache_dir = args.cache_embeddings or config['SERVICIOS_SIMAP_Q'].get('embeddings_cache_dir', 'cache_embeddings')
+    
+    # Backend de embeddings (la dimensión de la colección depende de él)
+    embeddings_backend = (args.embeddings_backend or config['SERVICIOS_SIMAP_Q'].get('embeddings_backend', 'openai')).strip().lower()
+    embeddings_modelo_local = config['SERVICIOS_SIMAP_Q'].get('embeddings_modelo_local', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+    embeddings_hilos_local = int(config['SERVICIOS_SIMAP_Q'].get('embeddings_hilos_local', 4))
+    embeddings_lote_local = int(config['SERVICIOS_SIMAP_Q'].get('embeddings_lote_local', 64))
+    
+    # Carga blue/green: versión nueva "<coleccion>_<timestamp>" + alias reapuntado al validar
+    usar_alias = not args.sin_alias and config['SERVICIOS_SIMAP_Q'].get('usar_alias', 'true').strip().lower() in ('1', 'true', 'si', 'sí', 'yes')
+    versiones_conservar = args.versiones_conservar if args.versiones_conservar is not None else int(config['SERVICIOS_SIMAP_Q'].get('versiones_conservar', 2))
+    # Consultas de validación antes de publicar una versión (separadas por "|"); si no hay, se usan servicios del JSON
+    consultas_validacion = [c.strip() for c in config['SERVICIOS_SIMAP_Q'].get('consultas_validacion', '').split('|') if c.strip()]
+    
     # Fechas (si son relevantes)
     fecha_desde = config['SERVICIOS_SIMAP_Q'].get('fecha_desde', '2024-01-01')
     fecha_hasta = config['SERVICIOS_SIMAP_Q'].get('fecha_hasta', '2024-12-31')
@@ -130,6 +188,33 @@ except KeyError as e:
     print(f"Error: Falta la clave de configuración: {e}")
     sys.exit(1)
 
+# Función para crear el cliente de Qdrant con el transporte configurado
+def crear_cliente_qdrant(url, prefer_grpc=None):
+    """
+    Crea un QdrantClient reutilizable. En modo gRPC los vectores viajan en binario
+    (protobuf) en lugar de JSON, lo que acelera los upserts masivos.
+    """
+    prefer_grpc = qdrant_prefer_grpc if prefer_grpc is None else prefer_grpc
+    return QdrantClient(**obtener_parametros_cliente_qdrant(
+        url, qdrant_timeout, prefer_grpc=prefer_grpc, grpc_port=qdrant_grpc_port, keepalive_ms=qdrant_grpc_keepalive_ms
+    ))
+
+# Función para crear el proveedor de embeddings de la carga (una sola instancia por proceso)
+@lru_cache(maxsize=1)
+def crear_embeddings_carga():
+    """
+    Crea el proveedor de embeddings según embeddings_backend. OpenAI va sin reintentos internos:
+    el motor de ingesta maneja el backoff ante rate limits y pausa a todos los workers.
+    """
+    if embeddings_backend == 'local':
+        embeddings = crear_embeddings('local', modelo_local=embeddings_modelo_local, hilos=embeddings_hilos_local, tamano_lote=embeddings_lote_local)
+    else:
+        embeddings = crear_embeddings('openai', api_key=openai_api_key, max_retries=0)
+    if embeddings_cache_modo != 'off':
+        print(f"Cache de embeddings: modo {embeddings_cache_modo} en {embeddings_cache_dir}")
+        embeddings = envolver_embeddings(embeddings, embeddings_cache_modo, embeddings_cache_dir)
+    return embeddings
+
 # Función para normalizar texto
 def normalizar_texto(texto):
     if texto is None:
@@ -175,7 +260,7 @@ def crear_coleccion_vacia(client, collection_name, vector_size=1536):
         client.create_collection(
             collection_name=collection_name,
             vectors_config=models.VectorParams(
-                size=vector_size,  # Para OpenAI embeddings
+                size=vector_size,  # 1536 para OpenAI; la del modelo para el backend local
                 distance=models.Distance.COSINE
             )
         )
@@ -195,8 +280,34 @@ def obtener_estadisticas_coleccion(client, collection_name):
         return None
 
 # Función principal para cargar JSON en la base de datos vectorial Qdrant
-def cargar_json_a_qdrant(ruta_archivo_json, openai_api_key, url_qdrant, nombre_bdvectorial, collection_name=None, limite_registros=0, borrar_existente=True):
+def cargar_json_a_qdrant(ruta_archivo_json, openai_api_key, url_qdrant, nombre_bdvectorial, collection_name=None, limite_registros=0, borrar_existente=True, archivo_checkpoint=None, reanudar=False, incremental=False, blue_green=False):
     collection_name = collection_name or nombre_bdvectorial
+    archivo_checkpoint = archivo_checkpoint or f"checkpoint_carga_{collection_name}.json"
+    
+    # Inicializar el cliente Qdrant (se reutiliza para crear la colección y para los upserts)
+    client = crear_cliente_qdrant(url_qdrant)
+    
+    # En modo blue/green collection_name es el alias que consulta la app: una recarga completa
+    # escribe en una versión nueva y la colección en servicio no se toca hasta publicar
+    coleccion_destino = collection_name
+    if blue_green and not incremental:
+        if reanudar:
+            coleccion_destino = version_pendiente(client, collection_name) or collection_name
+        elif borrar_existente:
+            # Una versión a medio cargar de una ejecución fallida no debe quedar como destino de rollback
+            pendiente = version_pendiente(client, collection_name)
+            if pendiente:
+                print(f"Descartando versión incompleta de una carga anterior: {pendiente} (use --reanudar para continuarla)")
+                borrar_coleccion(client, pendiente)
+            coleccion_destino = nombre_version(collection_name)
+            borrar_existente = False
+    elif borrar_existente and resolver_alias(client, collection_name):
+        print(f"Error: {collection_name} es un alias; no se puede recrear en el lugar. Ejecute sin --sin-alias.")
+        return None, {"documentos_procesados": 0, "error": "alias existente"}
+    
+    # Al reanudar (o en modo incremental) se conserva la colección existente
+    if reanudar or incremental:
+        borrar_existente = False
     
     print(f"\n{'='*80}")
     print(f"CARGA DE DATOS A QDRANT")
@@ -204,30 +315,52 @@ def cargar_json_a_qdrant(ruta_archivo_json, openai_api_key, url_qdrant, nombre_b
     print(f"Fecha y hora: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Archivo de origen: {ruta_archivo_json}")
     print(f"URL de Qdrant: {url_qdrant}")
-    print(f"Colección destino: {collection_name}")
+    print(f"Colección destino: {coleccion_destino}" + (f" (alias: {collection_name})" if coleccion_destino != collection_name else ""))
+    print(f"Modo de carga: {'INCREMENTAL' if incremental else ('RECREAR' if borrar_existente else ('VERSIÓN NUEVA' if coleccion_destino != collection_name else 'AÑADIR'))}")
+    print(f"Transporte Qdrant: {'gRPC (puerto ' + str(qdrant_grpc_port) + ')' if qdrant_prefer_grpc else 'HTTP'}")
     
-    # Inicializar el cliente Qdrant
-    client = QdrantClient(url=url_qdrant)
+    # Proveedor de embeddings: define la dimensión de los vectores de la colección
+    embeddings = crear_embeddings_carga()
+    dimension = dimension_embeddings(embeddings)
+    print(f"Embeddings: {embeddings_backend}" + (f" ({embeddings_modelo_local})" if embeddings_backend == 'local' else "") + f" - dimensión {dimension}")
     
     # Métricas de carga iniciales
     metricas = {
         "documentos_procesados": 0,
+        "fragmentos_generados": 0,
         "documentos_cargados": 0,
         "tiempo_inicio": time.time(),
         "tiempo_fin": None,
         "coleccion_anterior_borrada": False,
-        "coleccion_creada": False
+        "coleccion_creada": False,
+        "ingesta": {},
+        "delta": {},
+        "alias": collection_name,
+        "coleccion_destino": coleccion_destino,
+        "consultas_muestra": [],
+        "embeddings_backend": embeddings_backend,
+        "dimension": dimension
     }
     
     # 1. Borrar la colección existente si se indica
     if borrar_existente:
-        metricas["coleccion_anterior_borrada"] = borrar_coleccion(client, collection_name)
-    else:
+        metricas["coleccion_anterior_borrada"] = borrar_coleccion(client, coleccion_destino)
+    elif coleccion_destino == collection_name:
         print(f"Manteniendo colección existente: {collection_name}")
     
     # 2. Crear una nueva colección vacía
-    if borrar_existente or not collection_exists(client, collection_name):
-        metricas["coleccion_creada"] = crear_coleccion_vacia(client, collection_name)
+    if borrar_existente or not collection_exists(client, coleccion_destino):
+        metricas["coleccion_creada"] = crear_coleccion_vacia(client, coleccion_destino, vector_size=dimension)
+    else:
+        # Añadir a una colección existente sólo es posible con la misma dimensión de vectores
+        try:
+            dimension_existente = obtener_estadisticas_coleccion(client, coleccion_destino).config.params.vectors.size
+        except AttributeError:
+            dimension_existente = None
+        if dimension_existente and dimension_existente != dimension:
+            print(f"Error: la colección {coleccion_destino} tiene vectores de {dimension_existente} dimensiones y el backend '{embeddings_backend}' genera {dimension}. Use una recarga completa.")
+            metricas["error"] = "dimensión de vectores distinta"
+            return None, metricas
     
     # Verificar si el archivo existe
     if not os.path.exists(ruta_archivo_json):
@@ -249,118 +382,167 @@ def cargar_json_a_qdrant(ruta_archivo_json, openai_api_key, url_qdrant, nombre_b
             print("No se pudo encontrar el archivo JSON. Por favor, verifica la ruta en config.ini.")
             return None, metricas
     
-    # Cargar el archivo JSON
-    print(f"\nCargando datos desde: {ruta_archivo_json}")
-    with open(ruta_archivo_json, 'r', encoding='utf-8') as archivo:
-        data = json.load(archivo)
-
-    documentos = []
-    registros = data.get("RECORDS", [])
-    
-    total_registros = len(registros)
-    print(f"Total de registros encontrados en el JSON: {total_registros}")
+    # Leer el archivo JSON en streaming: los registros se normalizan y convierten en documentos
+    # a medida que el motor de ingesta los consume, sin armar listas completas en memoria
+    print(f"\nLeyendo datos en streaming desde: {ruta_archivo_json}")
+    registros = iterar_registros_json(ruta_archivo_json)
     
-    # Si se especifica un límite de registros, recortar la lista
-    if limite_registros > 0 and limite_registros < total_registros:
+    # Si se especifica un límite de registros, cortar el stream
+    if limite_registros > 0:
         print(f"MODO PRUEBA: Limitando a {limite_registros} registros")
-        registros = registros[:limite_registros]
+        registros = islice(registros, limite_registros)
     
-    # Contador para seguimiento del progreso
-    contador = 0
-    total = len(registros)
-    
-    # Inicio de procesamiento de registros
-    print(f"\nIniciando procesamiento de {total} registros...")
     start_time_process = time.time()
     
-    # Procesar cada registro como un chunk individual
-    for item in registros:
-        # Actualizar y mostrar progreso
-        contador += 1
-        if contador % 10 == 0 or contador == 1 or contador == total:
-            tiempo_transcurrido = time.time() - start_time_process
-            velocidad = contador / tiempo_transcurrido if tiempo_transcurrido > 0 else 0
-            tiempo_estimado = (total - contador) / velocidad if velocidad > 0 else 0
-            print(f"Procesando registro {contador}/{total} ({contador/total*100:.1f}%) - {velocidad:.1f} reg/s - Tiempo restante est.: {tiempo_estimado/60:.1f} min")
-        
-        servicio = normalizar_texto(item.get("SERVICIO", ""))
-        tipo = normalizar_texto(item.get("TIPO", ""))
-        subtipo = normalizar_texto(item.get("SUBTIPO", ""))
-        id_sub = item.get("ID_SUB", "")
-
-        # Concatenar los campos de interés en un solo texto
-        texto_chunk = "\n".join([
-            f"COPETE: {normalizar_texto(item.get('COPETE', ''))}",
-            f"CONSISTE: {normalizar_texto(item.get('CONSISTE', ''))}",
-            f"REQUISITOS: {normalizar_texto(item.get('REQUISITOS', ''))}",
-            f"PAUTAS: {normalizar_texto(item.get('PAUTAS', ''))}",
-            f"QUIEN_PUEDE: {normalizar_texto(item.get('QUIEN_PUEDE', ''))}",
-            f"QUIENES_PUEDEN: {normalizar_texto(item.get('QUIENES_PUEDEN', ''))}",
-            f"COMO_LO_HACEN: {normalizar_texto(item.get('COMO_LO_HACEN', ''))}"
-        ])
+    # Fragmentación por tokens (tamano_chunk / overlap_chunk del config.ini)
+    fragmentador = Fragmentador(tamano_chunk=tamano_chunk, overlap_chunk=overlap_chunk)
+    print(f"Fragmentación: chunks de hasta {tamano_chunk} tokens con {overlap_chunk} tokens de solapamiento")
+    
+    def generar_documentos(registros):
+        """Generador: registro JSON -> Documents normalizados (uno por chunk del registro)"""
+        for item in registros:
+            servicio = normalizar_texto(item.get("SERVICIO", ""))
+            tipo = normalizar_texto(item.get("TIPO", ""))
+            subtipo = normalizar_texto(item.get("SUBTIPO", ""))
+            id_sub = item.get("ID_SUB", "")
 
-        # Crear el documento con metadata
-        documento = Document(
-            page_content=texto_chunk,
-            metadata={
-                "servicio": servicio,
-                "tipo": tipo,
-                "subtipo": subtipo,
-                "id_sub": id_sub,
-                "fecha_carga": datetime.datetime.now().isoformat()
-            }
-        )
-        documentos.append(documento)
-        metricas["documentos_procesados"] += 1
-
-    print(f"Procesados {len(documentos)} documentos para vectorización")
-    
-    # Inicializar el objeto de embeddings
-    embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
-    
-    # 3. Cargar los documentos en la colección
-    print(f"\nCargando {len(documentos)} documentos en Qdrant...")
-    start_time_upload = time.time()
+            # Campos de interés, en el orden en que se presentan al modelo
+            campos = [
+                (campo, normalizar_texto(item.get(campo, '')))
+                for campo in ("COPETE", "CONSISTE", "REQUISITOS", "PAUTAS", "QUIEN_PUEDE", "QUIENES_PUEDEN", "COMO_LO_HACEN")
+            ]
+            chunks = fragmentador.fragmentar(campos)
+            
+            metricas["documentos_procesados"] += 1
+            metricas["fragmentos_generados"] += len(chunks)
+            contador = metricas["documentos_procesados"]
+            if contador % 100 == 0 or contador == 1:
+                tiempo_transcurrido = time.time() - start_time_process
+                velocidad = contador / tiempo_transcurrido if tiempo_transcurrido > 0 else 0
+                print(f"Registros leídos: {contador} ({metricas['fragmentos_generados']} chunks) - {velocidad:.1f} reg/s - Memoria pico: {memoria_pico_mb()} MB")
+            
+            # Algunos servicios sirven como consultas de validación de la versión cargada
+            if servicio and len(metricas["consultas_muestra"]) < 3 and servicio not in metricas["consultas_muestra"]:
+                metricas["consultas_muestra"].append(servicio)
+            
+            for indice, (texto_chunk, overlap_chars) in enumerate(chunks):
+                # Hash del contenido embebido + metadatos visibles: si no cambia, no hace falta re-embeber
+                hash_chunk = hash_contenido(texto_chunk, servicio, tipo, subtipo, indice, len(chunks))
+                
+                # ID de punto determinista: ID_SUB + índice de chunk (o el hash si el registro no trae ID_SUB)
+                clave_punto = f"id_sub:{id_sub}:chunk:{indice}" if id_sub not in (None, "") else f"hash:{hash_chunk}"
+                
+                # Crear el documento con metadata
+                yield Document(
+                    page_content=texto_chunk,
+                    metadata={
+                        "servicio": servicio,
+                        "tipo": tipo,
+                        "subtipo": subtipo,
+                        "id_sub": id_sub,
+                        "chunk_index": indice,
+                        "total_chunks": len(chunks),
+                        "overlap_chars": overlap_chars,
+                        "hash_contenido": hash_chunk,
+                        "id_punto": id_punto_determinista(clave_punto),
+                        "fecha_carga": datetime.datetime.now().isoformat()
+                    }
+                )
+    
+    documentos = generar_documentos(registros)
+    
+    
+    # 3. Cargar los documentos en la colección (lectura, embeddings y upsert en un mismo pipeline)
+    print("\nCargando documentos en Qdrant...")
+    print(f"Lotes de embeddings: {tamano_lote_embeddings} docs - Paralelismo: {max_paralelo_embeddings} - Lote upsert: {qdrant_batch_upsert}")
+    if not reanudar and os.path.exists(archivo_checkpoint):
+        print(f"Descartando checkpoint previo {archivo_checkpoint} (use --reanudar para continuar una carga fallida)")
+        os.remove(archivo_checkpoint)
+    
+    # Modo incremental: comparar contra lo que ya está en la colección
+    delta = None
+    documentos_a_cargar = documentos
+    if incremental:
+        delta = DeltaColeccion(client, coleccion_destino)
+        delta.cargar_existentes()
+        documentos_a_cargar = delta.filtrar(documentos)
+        # Re-ejecutar la carga incremental ya es una reanudación: no se usa checkpoint
+        archivo_checkpoint = None
+    
+    motor = MotorIngesta(
+        client=client,
+        collection_name=coleccion_destino,
+        embeddings=embeddings,
+        tamano_lote_embeddings=tamano_lote_embeddings,
+        max_paralelo=max_paralelo_embeddings,
+        tamano_lote_upsert=qdrant_batch_upsert,
+        archivo_checkpoint=archivo_checkpoint,
+        # La fragmentación decide qué chunks caen en cada lote: si cambia, el checkpoint no sirve
+        firma_checkpoint=firma_archivo(ruta_archivo_json, coleccion_destino, limite_registros, tamano_lote_embeddings,
+                                       fragmentador.tamano_chunk, fragmentador.overlap_chunk, fragmentador.encoding.name),
+    )
     
     try:
-        # Crear o conectar a la colección de Qdrant usando LangChain
-        vector_db = Qdrant.from_documents(
-            documents=documentos,
-            embedding=embeddings,
-            url=url_qdrant,
-            collection_name=collection_name,
-            prefer_grpc=False,  # Usar HTTP en lugar de gRPC
+        metricas["ingesta"] = motor.ingestar(documentos_a_cargar)
+        if hasattr(embeddings, "guardar"):
+            embeddings.guardar()
+            metricas["cache_embeddings"] = embeddings.metricas
+            print(f"Cache de embeddings: {embeddings.metricas}")
+        
+        if delta is not None:
+            print(f"Delta: {delta.metricas['nuevos']} nuevos, {delta.metricas['modificados']} modificados, "
+                  f"{delta.metricas['sin_cambios']} sin cambios, {len(delta.ids_desaparecidos())} desaparecidos")
+            if limite_registros > 0:
+                print("Carga incremental con límite de registros: no se borran los puntos desaparecidos.")
+            else:
+                borrados = delta.borrar_desaparecidos()
+                print(f"Puntos borrados (registros que ya no existen en el origen): {borrados}")
+            metricas["delta"] = delta.metricas
+        
+        # Objeto Qdrant sobre la colección cargada, reutilizando el mismo cliente (HTTP o gRPC)
+        vector_db = Qdrant(
+            client=client,
+            collection_name=coleccion_destino,
+            embeddings=embeddings,
         )
         
-        metricas["documentos_cargados"] = len(documentos)
+        metricas["documentos_cargados"] = metricas["fragmentos_generados"]
         metricas["tiempo_fin"] = time.time()
+        metricas["memoria_pico_mb"] = memoria_pico_mb()
         
         # Obtener estadísticas finales de la colección
         try:
-            stats = obtener_estadisticas_coleccion(client, collection_name)
+            stats = obtener_estadisticas_coleccion(client, coleccion_destino)
         except Exception as e:
             print(f"Advertencia: No se pudieron obtener estadísticas de la colección: {str(e)}")
             stats = None
         
         # Mostrar resumen de carga
         tiempo_total = metricas["tiempo_fin"] - metricas["tiempo_inicio"]
-        tiempo_proceso = start_time_upload - start_time_process
-        tiempo_carga = metricas["tiempo_fin"] - start_time_upload
+        tiempo_carga = metricas["tiempo_fin"] - start_time_process
         
         print(f"\n{'='*80}")
         print(f"RESUMEN DE CARGA COMPLETADA")
         print(f"{'='*80}")
         print(f"Fecha y hora fin: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"Registros procesados: {metricas['documentos_procesados']}")
-        print(f"Documentos cargados: {metricas['documentos_cargados']}")
+        if metricas["delta"]:
+            print(f"Registros re-embebidos: {metricas['delta']['nuevos'] + metricas['delta']['modificados']} "
+                  f"(nuevos: {metricas['delta']['nuevos']}, modificados: {metricas['delta']['modificados']}, "
+                  f"sin cambios: {metricas['delta']['sin_cambios']}, borrados: {metricas['delta']['borrados']})")
+        print(f"Chunks cargados: {metricas['documentos_cargados']} ({metricas['documentos_cargados'] / max(1, metricas['documentos_procesados']):.1f} por registro)")
         print(f"Colección borrada previamente: {'Sí' if metricas['coleccion_anterior_borrada'] else 'No'}")
         print(f"Nueva colección creada: {'Sí' if metricas['coleccion_creada'] else 'No'}")
         print(f"Tiempo total: {tiempo_total:.2f} segundos ({tiempo_total/60:.2f} minutos)")
-        print(f"  - Tiempo de procesamiento: {tiempo_proceso:.2f} segundos")
-        print(f"  - Tiempo de carga en Qdrant: {tiempo_carga:.2f} segundos")
+        print(f"  - Tiempo de lectura + carga en Qdrant: {tiempo_carga:.2f} segundos")
+        print(f"  - Memoria pico (RSS): {metricas['memoria_pico_mb']} MB")
+        print(f"  - Throughput: {metricas['ingesta'].get('docs_por_segundo', 0)} docs/s")
+        print(f"  - Reintentos por rate limit: {metricas['ingesta'].get('reintentos_rate_limit', 0)}")
+        if metricas['ingesta'].get('lotes_omitidos_checkpoint'):
+            print(f"  - Lotes omitidos (ya confirmados en checkpoint): {metricas['ingesta']['lotes_omitidos_checkpoint']}")
         
         if stats:
-            print(f"\nEstadísticas de la colección {collection_name}:")
+            print(f"\nEstadísticas de la colección {coleccion_destino}:")
             print(f"  - Vectores: {stats.vectors_count}")
             try:
                 vector_size = stats.config.params.size
@@ -381,17 +563,23 @@ def cargar_json_a_qdrant(ruta_archivo_json, openai_api_key, url_qdrant, nombre_b
         
     except Exception as e:
         print(f"Error durante la carga a Qdrant: {str(e)}")
+        if archivo_checkpoint:
+            print(f"Progreso guardado en {archivo_checkpoint}. Ejecute nuevamente con --reanudar para continuar.")
+        else:
+            print("Ejecute nuevamente con --incremental: se cargará el delta que falta.")
         metricas["tiempo_fin"] = time.time()
         metricas["error"] = str(e)
+        metricas["ingesta"] = motor.metricas
+        metricas["memoria_pico_mb"] = memoria_pico_mb()
         return None, metricas
 
 # Función para verificar si una colección existe
 def collection_exists(client, collection_name):
-    """Verifica si una colección existe en Qdrant"""
+    """Verifica si una colección (o un alias a una colección) existe en Qdrant"""
     try:
         collections = client.get_collections().collections
         collection_names = [collection.name for collection in collections]
-        return collection_name in collection_names
+        return collection_name in collection_names or resolver_alias(client, collection_name) is not None
     except Exception:
         return False
 
@@ -411,7 +599,7 @@ def buscar_en_qdrant(query, openai_api_key, url_qdrant, collection_name, max_res
         list: Lista de documentos similares con sus metadatos.
     """
     # Inicializar cliente y embeddings
-    client = QdrantClient(url=url_qdrant)
+    client = crear_cliente_qdrant(url_qdrant)
     embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
     
     try:
@@ -460,7 +648,7 @@ def conectar_a_qdrant(openai_api_key, url_qdrant, collection_name):
         Qdrant: Objeto Qdrant para interactuar con la colección.
     """
     # Inicializar cliente y embeddings
-    client = QdrantClient(url=url_qdrant)
+    client = crear_cliente_qdrant(url_qdrant)
     embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
     
     try:
@@ -480,8 +668,40 @@ def conectar_a_qdrant(openai_api_key, url_qdrant, collection_name):
     
     return qdrant
 
+# Función para verificar que una colección responde búsquedas
+def verificar_consultas_muestra(client, collection_name, embeddings, consultas, k=3):
+    """Ejecuta consultas de muestra contra la colección y exige al menos un resultado por consulta"""
+    for consulta in consultas:
+        try:
+            respuesta = client.query_points(
+                collection_name=collection_name,
+                query=embeddings.embed_query(consulta),
+                limit=k,
+                with_payload=["metadata.servicio"],
+            )
+        except Exception as e:
+            print(f"Error en la consulta de muestra '{consulta}': {str(e)}")
+            return False
+        if not respuesta.points:
+            print(f"La consulta de muestra '{consulta}' no devolvió resultados en {collection_name}.")
+            return False
+        servicios = [(p.payload or {}).get("metadata", {}).get("servicio", "") for p in respuesta.points]
+        print(f"Consulta de muestra '{consulta}': {len(respuesta.points)} resultados (top: {servicios[0]}, score {respuesta.points[0].score:.3f})")
+    return True
+
 # Función para verificar la carga exitosa
-def verificar_carga_exitosa(client, collection_name, expected_count):
+def verificar_carga_exitosa(client, collection_name, expected_count, consultas_muestra=None, embeddings=None):
+    """
+    Verifica que la colección existe y contiene el número esperado de documentos.
+    Si se indican consultas de muestra (y embeddings), también verifica que la colección las responda.
+    """
+    if not verificar_conteo_coleccion(client, collection_name, expected_count):
+        return False
+    if consultas_muestra and embeddings is not None:
+        return verificar_consultas_muestra(client, collection_name, embeddings, consultas_muestra)
+    return True
+
+def verificar_conteo_coleccion(client, collection_name, expected_count):
     """Verifica que la colección existe y contiene el número esperado de documentos"""
     try:
         # Verificar que la colección existe
@@ -489,8 +709,7 @@ def verificar_carga_exitosa(client, collection_name, expected_count):
         
         if info.vectors_count is None:
             # Si no podemos obtener el conteo, verificamos de otra manera que la colección exista
-            colecciones = client.get_collections().collections
-            existe = any(col.name == collection_name for col in colecciones)
+            existe = collection_exists(client, collection_name)
             if existe:
                 print(f"La colección {collection_name} existe, pero no se pudo verificar el conteo de vectores.")
                 return True
@@ -514,6 +733,17 @@ def verificar_carga_exitosa(client, collection_name, expected_count):
         return False
 
 if __name__ == "__main__":
+    # Rollback: reapuntar el alias a la versión anterior sin cargar nada
+    if args.rollback:
+        cliente = crear_cliente_qdrant(url_qdrant)
+        destino = version_anterior(cliente, collection_name_fragmento)
+        if destino is None:
+            print(f"No hay una versión anterior de {collection_name_fragmento} a la que volver.")
+            sys.exit(1)
+        apuntar_alias(cliente, collection_name_fragmento, destino)
+        print(f"Rollback completado: {collection_name_fragmento} -> {destino}")
+        sys.exit(0)
+    
     print("Iniciando carga de datos a Qdrant...")
     
     # Determinar el límite de registros
@@ -527,8 +757,14 @@ if __name__ == "__main__":
     
     # Determinar si se debe borrar la colección existente
     borrar_existente = not args.no_borrar
-    if args.no_borrar:
+    if modo_incremental:
+        print("Modo INCREMENTAL: Sólo se re-embeben registros nuevos o modificados; la colección no se borra")
+    elif args.reanudar:
+        print("Modo REANUDAR: Se continuará la carga desde el último lote confirmado")
+    elif args.no_borrar:
         print("Modo NO-BORRAR: Se añadirán documentos a la colección existente")
+    elif usar_alias:
+        print(f"Modo VERSIÓN NUEVA: Se cargará una colección nueva y el alias {collection_name_fragmento} se reapuntará al validarla (se conservan {versiones_conservar} versiones anteriores)")
     else:
         print("Modo RECREAR: Se borrará la colección existente antes de cargar los nuevos documentos")
     
@@ -540,21 +776,40 @@ if __name__ == "__main__":
         nombre_bdvectorial=nombre_bdvectorial,
         collection_name=collection_name_fragmento,
         limite_registros=limite_registros,
-        borrar_existente=borrar_existente
+        borrar_existente=borrar_existente,
+        archivo_checkpoint=args.checkpoint,
+        reanudar=args.reanudar,
+        incremental=modo_incremental,
+        blue_green=usar_alias
     )
     
     # Verificar que la carga fue exitosa
-    cliente = QdrantClient(url=url_qdrant)
+    cliente = crear_cliente_qdrant(url_qdrant)
     verificacion_exitosa = False
+    coleccion_destino = metricas.get("coleccion_destino", collection_name_fragmento)
+    es_version_nueva = coleccion_destino != collection_name_fragmento
     
     if vector_db is not None:
-        # Verificar que la colección existe y tiene el número esperado de documentos
+        # Verificar que la colección existe, tiene el número esperado de documentos y responde búsquedas
         verificacion_exitosa = verificar_carga_exitosa(
             cliente, 
-            collection_name_fragmento, 
-            metricas["documentos_procesados"]
+            coleccion_destino, 
+            metricas.get("fragmentos_generados") or metricas["documentos_procesados"],
+            consultas_muestra=consultas_validacion or metricas.get("consultas_muestra"),
+            embeddings=crear_embeddings_carga()
         )
     
+    # Publicar la versión nueva: el alias se reapunta de forma atómica sólo si la validación pasó
+    if es_version_nueva:
+        if verificacion_exitosa:
+            metricas["alias_anterior"] = apuntar_alias(cliente, collection_name_fragmento, coleccion_destino)
+            metricas["versiones_borradas"] = podar_versiones(cliente, collection_name_fragmento, versiones_conservar)
+        elif vector_db is not None and es_version_de(collection_name_fragmento, coleccion_destino):
+            print(f"La versión {coleccion_destino} no pasó la validación: se descarta y {collection_name_fragmento} sigue apuntando a la versión en servicio.")
+            borrar_coleccion(cliente, coleccion_destino)
+        else:
+            print(f"Carga incompleta en {coleccion_destino}: la versión en servicio no se modificó. Use --reanudar para continuarla.")
+    
     if verificacion_exitosa:
         print("Proceso completado correctamente.")
         # Guardar métricas en un archivo para análisis posterior
@@ -564,9 +819,23 @@ if __name__ == "__main__":
                     "fecha": datetime.datetime.now().isoformat(),
                     "documentos_procesados": metricas["documentos_procesados"],
                     "documentos_cargados": metricas["documentos_cargados"],
+                    "fragmentos_generados": metricas["fragmentos_generados"],
+                    "tamano_chunk": tamano_chunk,
+                    "overlap_chunk": overlap_chunk,
                     "tiempo_total_segundos": metricas["tiempo_fin"] - metricas["tiempo_inicio"],
                     "coleccion_borrada": metricas["coleccion_anterior_borrada"],
-                    "coleccion_creada": metricas["coleccion_creada"]
+                    "coleccion_creada": metricas["coleccion_creada"],
+                    "transporte_qdrant": "grpc" if qdrant_prefer_grpc else "http",
+                    "embeddings_backend": embeddings_backend,
+                    "dimension": metricas.get("dimension"),
+                    "docs_por_segundo": metricas["ingesta"].get("docs_por_segundo"),
+                    "memoria_pico_mb": metricas.get("memoria_pico_mb"),
+                    "ingesta": metricas["ingesta"],
+                    "delta": metricas["delta"],
+                    "alias": collection_name_fragmento,
+                    "coleccion_destino": coleccion_destino,
+                    "alias_anterior": metricas.get("alias_anterior"),
+                    "versiones_borradas": metricas.get("versiones_borradas", [])
                 }, f)
                 print(f"Métricas guardadas en archivo.")
         except Exception as e:
@@ -13,6 +13,9 @@ from qdrant_client import QdrantClient
 from langchain_qdrant import Qdrant # LangChainDeprecationWarning: Qdrant -> QdrantVectorStore
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.embeddings_cache import envolver_desde_entorno
+
 # --- Carga de Configuración a Nivel de Módulo ---
 _DOTENV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
 
@@ -115,7 +118,8 @@ def main():
         return
     
     try:
-        embeddings = OpenAIEmbeddings(api_key=OPENAI_API_KEY) # Aquí se usa la OPENAI_API_KEY
+        # Con EMBEDDINGS_CACHE_MODO=grabar|reproducir los vectores se graban / reproducen desde disco
+        embeddings = envolver_desde_entorno(OpenAIEmbeddings(api_key=OPENAI_API_KEY)) # Aquí se usa la OPENAI_API_KEY
     except Exception as e:
         print(f"Error al inicializar OpenAIEmbeddings: {str(e)}")
         print("Verifica que la OPENAI_API_KEY sea correcta (debe ser una Clave Secreta sk-...) y que tengas conexión a internet.")
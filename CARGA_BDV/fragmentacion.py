@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fragmentación por tokens de los registros SIMAP.
+
+Cada registro se arma como líneas "CAMPO: texto" (COPETE, CONSISTE, REQUISITOS, ...).
+Los campos se agrupan enteros mientras entren en el tamaño de chunk; un campo que por sí solo
+lo excede se parte con semchunk (límites de oración / cláusula / palabra) y cada parte conserva
+el prefijo del campo. Entre chunks consecutivos se repite un solapamiento de tokens al inicio
+del chunk siguiente; su largo en caracteres queda en el payload ("overlap_chars") para que
+la app pueda unir fragmentos adyacentes sin duplicar texto (anterior + "\n" + chunk[overlap_chars:]).
+"""
+
+import semchunk
+import tiktoken
+
+
+class Fragmentador:
+    """Parte registros en chunks de hasta `tamano_chunk` tokens con `overlap_chunk` tokens de solapamiento"""
+
+    def __init__(self, tamano_chunk=300, overlap_chunk=50, codificacion="cl100k_base"):
+        if overlap_chunk >= tamano_chunk:
+            raise ValueError("overlap_chunk debe ser menor que tamano_chunk")
+        self.tamano_chunk = tamano_chunk
+        self.overlap_chunk = overlap_chunk
+        self.encoding = tiktoken.get_encoding(codificacion)
+        # El solapamiento se antepone al chunk: el cuerpo debe dejarle lugar
+        self.tamano_cuerpo = tamano_chunk - overlap_chunk
+
+    def contar_tokens(self, texto):
+        return len(self.encoding.encode(texto, disallowed_special=()))
+
+    def _partes_de_campo(self, nombre, texto):
+        """Divide un campo largo en partes que entran en el cuerpo del chunk, con el prefijo del campo"""
+        prefijo = f"{nombre}: "
+        disponible = max(1, self.tamano_cuerpo - self.contar_tokens(prefijo))
+        return [prefijo + parte for parte in semchunk.chunk(texto, chunk_size=disponible, token_counter=self.contar_tokens)]
+
+    def _cola(self, texto):
+        """Últimos `overlap_chunk` tokens del texto, empezando en un límite de palabra"""
+        tokens = self.encoding.encode(texto, disallowed_special=())
+        if len(tokens) <= self.overlap_chunk:
+            return texto
+        cola = self.encoding.decode(tokens[-self.overlap_chunk:])
+        espacio = cola.find(" ")
+        return cola[espacio + 1:] if 0 <= espacio < len(cola) - 1 else cola
+
+    def fragmentar(self, campos):
+        """
+        Fragmenta un registro dado como lista de (nombre_campo, texto). Los campos vacíos se omiten.
+        Devuelve una lista de (texto_chunk, overlap_chars).
+        """
+        lineas = []
+        for nombre, texto in campos:
+            if not texto:
+                continue
+            linea = f"{nombre}: {texto}"
+            if self.contar_tokens(linea) <= self.tamano_cuerpo:
+                lineas.append(linea)
+            else:
+                lineas.extend(self._partes_de_campo(nombre, texto))
+
+        # Agrupar líneas enteras mientras entren en el cuerpo del chunk
+        cuerpos = []
+        actual = []
+        tokens_actual = 0
+        for linea in lineas:
+            tokens_linea = self.contar_tokens(linea) + 1  # +1 por el salto de línea
+            if actual and tokens_actual + tokens_linea > self.tamano_cuerpo:
+                cuerpos.append("\n".join(actual))
+                actual = []
+                tokens_actual = 0
+            actual.append(linea)
+            tokens_actual += tokens_linea
+        if actual:
+            cuerpos.append("\n".join(actual))
+
+        if not cuerpos:
+            return []
+
+        # Anteponer a cada chunk la cola del anterior; overlap_chars cubre la cola y el salto de línea,
+        # de modo que anterior + "\n" + chunk[overlap_chars:] reconstruye el texto sin duplicados
+        chunks = [(cuerpos[0], 0)]
+        for anterior, cuerpo in zip(cuerpos, cuerpos[1:]):
+            if self.overlap_chunk <= 0:
+                chunks.append((cuerpo, 0))
+                continue
+            cola = self._cola(anterior)
+            chunks.append((cola + "\n" + cuerpo, len(cola) + 1))
+        return chunks
@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+
+"""
+Motor de ingesta por lotes para Qdrant.
+
+Reemplaza la carga "todo de una vez" de Qdrant.from_documents por un pipeline controlado:
+  1. Agrupa los documentos en lotes de embeddings de tamaño configurable.
+  2. Calcula los embeddings de varios lotes en paralelo (concurrencia acotada).
+  3. Ante un 429 de OpenAI respeta el Retry-After y pausa a todos los workers.
+  4. Sube los puntos a Qdrant en sub-lotes (upsert idempotente con IDs deterministas).
+  5. Guarda un checkpoint con el último lote confirmado para reanudar una carga fallida.
+
+Los documentos se consumen como iterable: con iterar_registros_json el export se lee en
+streaming y sólo quedan en memoria los lotes en vuelo.
+"""
+
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from qdrant_client.http import models
+from tenacity import Retrying, stop_after_attempt, retry_if_exception_type, wait_exponential
+from openai import RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+
+# Parser JSON iterativo (opcional): sin él se vuelve a json.load del archivo completo
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Namespace fijo para derivar IDs de punto deterministas (uuid5)
+NAMESPACE_PUNTOS = uuid.UUID("6f1c3e0a-6b7d-4a51-9a8e-3c2f5d1b7e90")
+
+ERRORES_REINTENTABLES = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+def id_punto_determinista(clave):
+    """Deriva un ID de punto estable (UUID) a partir de una clave de texto"""
+    return str(uuid.uuid5(NAMESPACE_PUNTOS, str(clave)))
+
+
+def _segundos_retry_after(excepcion):
+    """Extrae la espera sugerida por OpenAI (Retry-After) de un error de la API, si existe"""
+    respuesta = getattr(excepcion, "response", None)
+    if respuesta is None:
+        return None
+    cabeceras = getattr(respuesta, "headers", {}) or {}
+    for cabecera in ("retry-after-ms", "retry-after"):
+        valor = cabeceras.get(cabecera)
+        if valor:
+            try:
+                segundos = float(valor)
+                return segundos / 1000.0 if cabecera.endswith("-ms") else segundos
+            except ValueError:
+                continue
+    return None
+
+
+class MotorIngesta:
+    """Pipeline de embeddings por lotes + upsert en Qdrant con checkpoint"""
+
+    def __init__(self, client, collection_name, embeddings, tamano_lote_embeddings=100,
+                 max_paralelo=4, tamano_lote_upsert=64, archivo_checkpoint=None,
+                 firma_checkpoint=None, max_reintentos=6):
+        self.client = client
+        self.collection_name = collection_name
+        self.embeddings = embeddings
+        self.tamano_lote_embeddings = max(1, int(tamano_lote_embeddings))
+        self.max_paralelo = max(1, int(max_paralelo))
+        self.tamano_lote_upsert = max(1, int(tamano_lote_upsert))
+        self.archivo_checkpoint = archivo_checkpoint
+        self.firma_checkpoint = firma_checkpoint
+        self.max_reintentos = max_reintentos
+
+        # Pausa global: cuando un worker recibe un 429, todos esperan hasta este instante
+        self._pausa_hasta = 0.0
+        self._lock_pausa = threading.Lock()
+
+        self.metricas = {
+            "lotes_totales": 0,
+            "lotes_omitidos_checkpoint": 0,
+            "lotes_confirmados": 0,
+            "documentos_embebidos": 0,
+            "puntos_subidos": 0,
+            "reintentos_rate_limit": 0,
+            "tiempo_embeddings_segundos": 0.0,
+            "tiempo_upsert_segundos": 0.0,
+        }
+        self._lock_metricas = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Checkpoint
+    # ------------------------------------------------------------------
+    def cargar_checkpoint(self):
+        """Devuelve el índice del último lote confirmado (-1 si no hay checkpoint válido)"""
+        if not self.archivo_checkpoint or not os.path.exists(self.archivo_checkpoint):
+            return -1
+        try:
+            with open(self.archivo_checkpoint, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Advertencia: checkpoint ilegible ({e}). Se inicia desde el principio.")
+            return -1
+        if datos.get("firma") != self.firma_checkpoint:
+            print("Advertencia: el checkpoint corresponde a otra carga (firma distinta). Se ignora.")
+            return -1
+        return int(datos.get("ultimo_lote_confirmado", -1))
+
+    def guardar_checkpoint(self, ultimo_lote):
+        if not self.archivo_checkpoint:
+            return
+        temporal = f"{self.archivo_checkpoint}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({
+                "firma": self.firma_checkpoint,
+                "coleccion": self.collection_name,
+                "ultimo_lote_confirmado": ultimo_lote,
+                "tamano_lote_embeddings": self.tamano_lote_embeddings,
+                "actualizado": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }, f)
+        os.replace(temporal, self.archivo_checkpoint)
+
+    def borrar_checkpoint(self):
+        if self.archivo_checkpoint and os.path.exists(self.archivo_checkpoint):
+            os.remove(self.archivo_checkpoint)
+
+    # ------------------------------------------------------------------
+    # Embeddings con backoff consciente de rate limits
+    # ------------------------------------------------------------------
+    def _esperar_pausa_global(self):
+        espera = self._pausa_hasta - time.time()
+        if espera > 0:
+            time.sleep(espera)
+
+    def _espera_reintento(self, retry_state):
+        excepcion = retry_state.outcome.exception()
+        espera = wait_exponential(multiplier=1, min=2, max=60)(retry_state)
+        if isinstance(excepcion, RateLimitError):
+            sugerida = _segundos_retry_after(excepcion)
+            if sugerida:
+                espera = max(espera, sugerida)
+            with self._lock_pausa:
+                self._pausa_hasta = max(self._pausa_hasta, time.time() + espera)
+            with self._lock_metricas:
+                self.metricas["reintentos_rate_limit"] += 1
+            print(f"Rate limit de OpenAI: pausando workers {espera:.1f}s (intento {retry_state.attempt_number})")
+        # Jitter para que los workers no reintenten todos a la vez
+        return espera + random.uniform(0, 1)
+
+    def _embeber_lote(self, textos):
+        for intento in Retrying(
+            retry=retry_if_exception_type(ERRORES_REINTENTABLES),
+            stop=stop_after_attempt(self.max_reintentos),
+            wait=self._espera_reintento,
+            reraise=True,
+        ):
+            with intento:
+                self._esperar_pausa_global()
+                return self.embeddings.embed_documents(textos)
+
+    # ------------------------------------------------------------------
+    # Procesamiento de un lote: embeddings + upsert
+    # ------------------------------------------------------------------
+    def _procesar_lote(self, indice_lote, documentos):
+        inicio = time.perf_counter()
+        vectores = self._embeber_lote([doc.page_content for doc in documentos])
+        tiempo_embeddings = time.perf_counter() - inicio
+
+        puntos = []
+        for posicion, (doc, vector) in enumerate(zip(documentos, vectores)):
+            id_punto = doc.metadata.get("id_punto") or id_punto_determinista(
+                f"{self.collection_name}:{indice_lote * self.tamano_lote_embeddings + posicion}"
+            )
+            metadata = {k: v for k, v in doc.metadata.items() if k != "id_punto"}
+            puntos.append(models.PointStruct(
+                id=id_punto,
+                vector=vector,
+                payload={"page_content": doc.page_content, "metadata": metadata},
+            ))
+
+        inicio = time.perf_counter()
+        for desde in range(0, len(puntos), self.tamano_lote_upsert):
+            self.client.upsert(
+                collection_name=self.collection_name,
+                points=puntos[desde:desde + self.tamano_lote_upsert],
+                wait=True,
+            )
+        tiempo_upsert = time.perf_counter() - inicio
+
+        with self._lock_metricas:
+            self.metricas["documentos_embebidos"] += len(documentos)
+            self.metricas["puntos_subidos"] += len(puntos)
+            self.metricas["tiempo_embeddings_segundos"] += tiempo_embeddings
+            self.metricas["tiempo_upsert_segundos"] += tiempo_upsert
+        return len(puntos)
+
+    def _lotes(self, documentos):
+        lote = []
+        indice = 0
+        for doc in documentos:
+            lote.append(doc)
+            if len(lote) >= self.tamano_lote_embeddings:
+                yield indice, lote
+                indice += 1
+                lote = []
+        if lote:
+            yield indice, lote
+
+    def ingestar(self, documentos):
+        """
+        Ingesta un iterable de Document. Devuelve las métricas de la carga.
+        Lanza la excepción del primer lote que falle tras agotar los reintentos; el checkpoint
+        queda en el último lote contiguo confirmado para poder reanudar.
+        """
+        ultimo_confirmado = self.cargar_checkpoint()
+        if ultimo_confirmado >= 0:
+            print(f"Reanudando carga desde el lote {ultimo_confirmado + 1} (checkpoint: {self.archivo_checkpoint})")
+
+        inicio = time.time()
+        completados = set()
+        siguiente_a_confirmar = ultimo_confirmado + 1
+        en_vuelo = {}
+        error = None
+        # Máximo de lotes en memoria: los que se procesan + uno de margen por worker
+        max_en_vuelo = self.max_paralelo * 2
+
+        with ThreadPoolExecutor(max_workers=self.max_paralelo, thread_name_prefix="ingesta") as executor:
+            def recoger(bloquear):
+                nonlocal siguiente_a_confirmar, error
+                if not en_vuelo:
+                    return
+                hechos, _ = wait(list(en_vuelo), return_when=FIRST_COMPLETED, timeout=None if bloquear else 0)
+                for futuro in hechos:
+                    indice = en_vuelo.pop(futuro)
+                    try:
+                        futuro.result()
+                        completados.add(indice)
+                    except Exception as e:
+                        if error is None:
+                            error = e
+                            print(f"Error en el lote {indice}: {e}")
+                # Avanzar el checkpoint sólo por el prefijo contiguo de lotes confirmados
+                avance = False
+                while siguiente_a_confirmar in completados:
+                    completados.discard(siguiente_a_confirmar)
+                    siguiente_a_confirmar += 1
+                    avance = True
+                if avance:
+                    self.metricas["lotes_confirmados"] = siguiente_a_confirmar
+                    self.guardar_checkpoint(siguiente_a_confirmar - 1)
+                    transcurrido = time.time() - inicio
+                    docs = self.metricas["documentos_embebidos"]
+                    print(f"Lotes confirmados: {siguiente_a_confirmar} - {docs} docs - {docs / transcurrido if transcurrido > 0 else 0:.1f} docs/s")
+
+            for indice, lote in self._lotes(documentos):
+                self.metricas["lotes_totales"] += 1
+                if indice <= ultimo_confirmado:
+                    self.metricas["lotes_omitidos_checkpoint"] += 1
+                    continue
+                if error is not None:
+                    break
+                while len(en_vuelo) >= max_en_vuelo:
+                    recoger(bloquear=True)
+                en_vuelo[executor.submit(self._procesar_lote, indice, lote)] = indice
+                recoger(bloquear=False)
+
+            while en_vuelo:
+                recoger(bloquear=True)
+
+        tiempo_total = time.time() - inicio
+        self.metricas["tiempo_total_segundos"] = round(tiempo_total, 3)
+        self.metricas["docs_por_segundo"] = round(self.metricas["documentos_embebidos"] / tiempo_total, 2) if tiempo_total > 0 else 0.0
+        self.metricas["tiempo_embeddings_segundos"] = round(self.metricas["tiempo_embeddings_segundos"], 3)
+        self.metricas["tiempo_upsert_segundos"] = round(self.metricas["tiempo_upsert_segundos"], 3)
+
+        if error is not None:
+            raise error
+
+        self.borrar_checkpoint()
+        return self.metricas
+
+
+def firma_archivo(ruta, *extras):
+    """Firma de una carga: archivo de origen (ruta, tamaño, fecha de modificación) + parámetros"""
+    try:
+        estado = os.stat(ruta)
+        base = f"{os.path.abspath(ruta)}|{estado.st_size}|{int(estado.st_mtime)}"
+    except OSError:
+        base = os.path.abspath(ruta)
+    base += "|" + "|".join(str(extra) for extra in extras)
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()[:16]
+
+
+def iterar_registros_json(ruta, prefijo="RECORDS.item"):
+    """
+    Generador de los registros del export SIMAP ({"RECORDS": [...]}) leídos en streaming.
+    Con ijson la memoria no depende del tamaño del archivo; sin ijson se carga el JSON completo.
+    """
+    if ijson is None:
+        print("Advertencia: ijson no está instalado, se carga el JSON completo en memoria (pip install ijson)")
+        with open(ruta, "r", encoding="utf-8") as archivo:
+            data = json.load(archivo)
+        claves = prefijo.split(".")[:-1]
+        for clave in claves:
+            data = data.get(clave, []) if isinstance(data, dict) else []
+        yield from data
+        return
+
+    with open(ruta, "rb") as archivo:
+        # use_float: los números llegan como float/int (no Decimal) y el payload sigue siendo serializable
+        yield from ijson.items(archivo, prefijo, use_float=True)
+
+
+def memoria_pico_mb():
+    """Pico de memoria residente (RSS) del proceso en MB, o None si no se puede medir"""
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux informa KB, macOS bytes
+        return round(pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memoria = psutil.Process().memory_info()
+        # En Windows peak_wset es el pico del working set; en otros sistemas sólo hay RSS actual
+        return round(getattr(memoria, "peak_wset", memoria.rss) / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+
+def hash_contenido(*partes):
+    """Hash estable del contenido que se embebe/guarda, para detectar registros modificados"""
+    return hashlib.sha256("\x1f".join(str(p) for p in partes).encode("utf-8")).hexdigest()
+
+
+class DeltaColeccion:
+    """
+    Calcula la diferencia entre los documentos de una carga y lo que ya está en la colección.
+
+    Los puntos se identifican por un ID determinista (derivado de ID_SUB) y guardan en el payload
+    el hash de su contenido. Sólo se re-embeben los documentos nuevos o cuyo hash cambió; los
+    puntos que ya no aparecen en el origen se borran al final.
+    """
+
+    def __init__(self, client, collection_name, tamano_pagina=1000):
+        self.client = client
+        self.collection_name = collection_name
+        self.tamano_pagina = tamano_pagina
+        self.existentes = {}
+        self.vistos = set()
+        self.metricas = {"nuevos": 0, "modificados": 0, "sin_cambios": 0, "borrados": 0}
+
+    def cargar_existentes(self):
+        """Recorre la colección (sin vectores) y arma el índice id_punto -> hash_contenido"""
+        offset = None
+        while True:
+            puntos, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=self.tamano_pagina,
+                offset=offset,
+                with_payload=["metadata.hash_contenido"],
+                with_vectors=False,
+            )
+            for punto in puntos:
+                metadata = (punto.payload or {}).get("metadata") or {}
+                self.existentes[str(punto.id)] = metadata.get("hash_contenido")
+            if offset is None:
+                break
+        print(f"Puntos existentes en {self.collection_name}: {len(self.existentes)}")
+        return self.existentes
+
+    def filtrar(self, documentos):
+        """Generador: deja pasar sólo los documentos nuevos o modificados"""
+        for doc in documentos:
+            id_punto = str(doc.metadata["id_punto"])
+            self.vistos.add(id_punto)
+            hash_actual = self.existentes.get(id_punto)
+            if hash_actual is None and id_punto not in self.existentes:
+                self.metricas["nuevos"] += 1
+                yield doc
+            elif hash_actual != doc.metadata.get("hash_contenido"):
+                self.metricas["modificados"] += 1
+                yield doc
+            else:
+                self.metricas["sin_cambios"] += 1
+
+    def ids_desaparecidos(self):
+        return [id_punto for id_punto in self.existentes if id_punto not in self.vistos]
+
+    def borrar_desaparecidos(self, tamano_lote=256):
+        """Borra de la colección los puntos cuyo registro ya no existe en el origen"""
+        ids = self.ids_desaparecidos()
+        for desde in range(0, len(ids), tamano_lote):
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(points=ids[desde:desde + tamano_lote]),
+                wait=True,
+            )
+        self.metricas["borrados"] = len(ids)
+        return len(ids)
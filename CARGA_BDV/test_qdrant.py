@@ -13,6 +13,9 @@ from langchain_openai import OpenAIEmbeddings
 from qdrant_client import QdrantClient
 from langchain_qdrant import Qdrant
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.embeddings_cache import envolver_desde_entorno
+
 def init_config():
     """Inicializa la configuración desde variables de entorno"""
     # Cargar variables de entorno
@@ -38,7 +41,7 @@ def buscar_en_qdrant_modificado(query, openai_api_key, url_qdrant, collection_na
     """
     # Inicializar cliente y embeddings
     client = QdrantClient(url=url_qdrant)
-    embeddings = OpenAIEmbeddings(api_key=openai_api_key)
+    embeddings = envolver_desde_entorno(OpenAIEmbeddings(api_key=openai_api_key))
     
     try:
         # Verificar que la colección existe
@@ -89,7 +92,7 @@ def main():
     print(f"Conectando a Qdrant en {config['QDRANT_URL']}, colección {config['COLLECTION_NAME']}...")
     
     # Inicializar embeddings
-    embeddings = OpenAIEmbeddings(api_key=config['OPENAI_API_KEY'])
+    embeddings = envolver_desde_entorno(OpenAIEmbeddings(api_key=config['OPENAI_API_KEY']))
     
     try:
         # Inicializar cliente
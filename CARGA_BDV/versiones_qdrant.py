@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Versionado blue/green de colecciones Qdrant mediante aliases.
+
+La app consulta siempre el nombre lógico (collection_name_fragmento, p. ej. "fragment_store"),
+que en Qdrant es un alias. Cada recarga completa construye una colección nueva
+"fragment_store_<AAAAMMDD_HHMMSS>", se valida y recién entonces el alias se reapunta en una
+sola operación atómica (update_collection_aliases). Las versiones anteriores se conservan
+para poder volver atrás al instante (rollback) y las más viejas se podan.
+"""
+
+import datetime
+import os
+import re
+import sys
+
+from qdrant_client.http import models
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.qdrant_conexion import resolver_alias  # compartida con la API
+
+FORMATO_VERSION = "%Y%m%d_%H%M%S"
+
+
+def nombre_version(alias, fecha=None):
+    """Nombre de la colección física para una nueva versión del alias"""
+    fecha = fecha or datetime.datetime.now()
+    return f"{alias}_{fecha.strftime(FORMATO_VERSION)}"
+
+
+def es_version_de(alias, nombre_coleccion):
+    """Indica si la colección es una versión (alias_<timestamp>) del alias"""
+    return re.fullmatch(re.escape(alias) + r"_\d{8}_\d{6}", nombre_coleccion) is not None
+
+
+def existe_coleccion_real(client, nombre):
+    """Indica si existe una colección física (no un alias) con ese nombre"""
+    return any(c.name == nombre for c in client.get_collections().collections)
+
+
+def listar_versiones(client, alias):
+    """Versiones del alias ordenadas de la más vieja a la más nueva"""
+    nombres = [c.name for c in client.get_collections().collections]
+    return sorted(n for n in nombres if es_version_de(alias, n))
+
+
+def apuntar_alias(client, alias, coleccion):
+    """
+    Reapunta el alias a la colección indicada en una única operación atómica.
+    Si todavía existe una colección física con el nombre del alias (primera migración desde
+    el esquema sin aliases), se borra justo antes de crear el alias: es la única ventana
+    en la que el nombre no resuelve y dura lo que tarda una llamada a Qdrant.
+    Devuelve la colección a la que apuntaba antes (o None).
+    """
+    anterior = resolver_alias(client, alias)
+
+    if anterior is None and existe_coleccion_real(client, alias):
+        print(f"Migrando '{alias}' de colección física a alias (se borra la colección física)")
+        client.delete_collection(collection_name=alias)
+
+    operaciones = []
+    if anterior is not None:
+        operaciones.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)))
+    operaciones.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=coleccion, alias_name=alias)
+    ))
+    client.update_collection_aliases(change_aliases_operations=operaciones)
+
+    print(f"Alias '{alias}' -> '{coleccion}' (antes: {anterior or 'ninguna'})")
+    return anterior
+
+
+def podar_versiones(client, alias, conservar):
+    """
+    Borra las versiones viejas conservando la activa y las `conservar` anteriores a ella.
+    Las versiones más nuevas que la activa (cargas en curso o a reanudar) no se tocan.
+    Devuelve la lista de colecciones borradas.
+    """
+    activa = resolver_alias(client, alias)
+    versiones = listar_versiones(client, alias)
+    if activa not in versiones:
+        return []
+
+    anteriores = versiones[:versiones.index(activa)]
+    a_borrar = anteriores[:max(0, len(anteriores) - conservar)]
+    for nombre in a_borrar:
+        print(f"Borrando versión antigua: {nombre}")
+        client.delete_collection(collection_name=nombre)
+    return a_borrar
+
+
+def version_anterior(client, alias):
+    """Versión inmediatamente anterior a la activa (destino de un rollback), o None"""
+    activa = resolver_alias(client, alias)
+    versiones = listar_versiones(client, alias)
+    if activa not in versiones:
+        return None
+    posicion = versiones.index(activa)
+    return versiones[posicion - 1] if posicion > 0 else None
+
+
+def version_pendiente(client, alias):
+    """Versión más nueva que la activa (carga interrumpida que se puede reanudar), o None"""
+    activa = resolver_alias(client, alias)
+    versiones = listar_versiones(client, alias)
+    if not versiones:
+        return None
+    if activa in versiones and versiones[-1] == activa:
+        return None
+    return versiones[-1]
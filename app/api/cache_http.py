@@ -0,0 +1,54 @@
+# app/api/cache_http.py
+"""
+Respuestas JSON con ETag y Cache-Control, y 304 Not Modified cuando el navegador ya tiene la
+versión vigente (cabecera If-None-Match).
+"""
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+
+def etag_coincide(request: Request, etag: str) -> bool:
+    """True si alguna de las etiquetas de If-None-Match corresponde a `etag` (comparación débil)"""
+    cabecera = request.headers.get("if-none-match")
+    if not cabecera or not etag:
+        return False
+    if cabecera.strip() == "*":
+        return True
+    objetivo = etag[2:] if etag.startswith("W/") else etag
+    for etiqueta in cabecera.split(","):
+        etiqueta = etiqueta.strip()
+        if etiqueta.startswith("W/"):
+            etiqueta = etiqueta[2:]
+        if etiqueta == objetivo:
+            return True
+    return False
+
+
+def cabeceras_cache(etag: str, max_age: int = 0) -> dict:
+    """
+    Con max_age > 0 el navegador reutiliza la respuesta sin preguntar durante ese tiempo; con 0
+    la revalida siempre (sólo viaja el 304 si no cambió).
+    """
+    return {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={max_age}" if max_age > 0 else "private, no-cache",
+    }
+
+
+def no_modificado(request: Request, etag: str, max_age: int = 0):
+    """Respuesta 304 si el cliente ya tiene la versión `etag`; None si hay que generar el contenido"""
+    if etag and etag_coincide(request, etag):
+        return Response(status_code=304, headers=cabeceras_cache(etag, max_age))
+    return None
+
+
+def responder_con_etag(request: Request, contenido, etag: str, max_age: int = 0, cabeceras=None) -> Response:
+    """JSONResponse con ETag (si hay) y cabeceras adicionales; 304 sin cuerpo si el cliente ya tiene esa versión"""
+    if not etag:
+        return JSONResponse(content=jsonable_encoder(contenido), headers=cabeceras)
+    respuesta_304 = no_modificado(request, etag, max_age)
+    if respuesta_304 is not None:
+        return respuesta_304
+    return JSONResponse(content=jsonable_encoder(contenido), headers={**(cabeceras or {}), **cabeceras_cache(etag, max_age)})
@@ -1,12 +1,24 @@
 # app/api/endpoints.py
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from app.models.schemas import QuestionRequest, AnswerResponse, CompleteAnalysisRequest, CompleteAnalysisResponse
 from app.services.process_question import process_question, retrieve_stats
 from app.services.token_utils import contar_tokens, count_words, validar_palabras, reducir_contenido_por_palabras
-from app.services.db_service import persistir_consulta
+from BD_RELA.create_tables import aplicar_perfil_sqlite
+from app.services.db_service import persistir_consulta, actualizar_feedback, actualizar_feedback_lote, actualizar_comentario, obtener_engine
 from app.services.prompt_service import get_system_prompt  # Nueva importación
+from app.services.fragmentos import unir_fragmentos_adyacentes
+from app.services.single_flight import SingleFlight, normalizar_pregunta
+from app.services import rollup_service
+from app.services.cache_ttl import CacheTTL
+from app.services.registro_ugl import registro_ugl
+from app.services import version_datos
+from app.services import exportacion
+from app.api.cache_http import responder_con_etag, no_modificado
 # Importar funciones de health check
 from app.api.health_check import health_check_endpoint, health_check_json
+import base64
 import json
 import os
 import configparser
@@ -20,9 +32,12 @@ from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langgraph.graph import MessagesState, StateGraph
 from langgraph.prebuilt import ToolNode
 from langchain_core.messages import SystemMessage, HumanMessage
-from app.core.config import model_name, collection_name_fragmento, qdrant_url, max_results, openai_api_key
+from app.core.config import model_name, collection_name_fragmento, qdrant_url, max_results, openai_api_key, admin_pagina_defecto, admin_pagina_maxima, usar_rollup_estadisticas, estadisticas_cache_ttl, ugls_max_age, admin_cache_max_age, exportacion_lote, feedback_lote_maximo, plazo_request_segundos
 from app.core.logging_config import log_message, get_logger
-from app.core.dependencies import get_embeddings, get_qdrant_client, get_vector_store_endpoint, get_llm
+from app.core.dependencies import get_embeddings, get_qdrant_client, get_vector_store_endpoint, get_llm, invocar_llm, buscar_similares, limitador_llm, limitador_embeddings, circuitos
+from app.services.limitador import LimiteExcedido
+from app.services.plazo import PlazoAgotado, RESPUESTA_DEGRADADA, tiempo_restante, verificar_plazo
+import asyncio
 import sqlite3
 import pymysql
 from dotenv import load_dotenv
@@ -144,6 +159,301 @@ def log_token_summary(tokens_entrada, tokens_salida, modelo):
     
     return resumen_json
 
+# Requests idénticos en vuelo (misma pregunta normalizada y misma versión del prompt) comparten un solo cálculo
+analisis_en_vuelo = SingleFlight("complete_analysis", plazo=plazo_request_segundos)
+
+def ejecutar_grafo_analisis(pregunta, prompt_base, vector_store, llm):
+    """
+    Ejecuta el grafo LangGraph (query_or_respond -> retrieve -> generate) para una pregunta.
+    Es la parte compartida entre requests coalescidos: no persiste nada ni depende del usuario.
+
+    Returns:
+        dict: response_content, tokens_entrada, tokens_salida, document_count y question_with_context
+    """
+    estado_retrieve = {"document_count": 0}
+
+    # Función de retrieve adaptada para Qdrant
+    def retrieve(query: str):
+        """Recuperar información relacionada con la consulta usando Qdrant."""
+        log_message(f"########### RETRIEVE (Qdrant) --------#####################")
+
+        # Contamos tokens de la consulta
+        tokens_consulta = contar_tokens(query, model_name)
+        log_message(f"Tokens de entrada en retrieve (consulta): {tokens_consulta}")
+
+        # Usar valor del config.ini, ignorando el del request
+        k_value = max_results
+        log_message(f"Buscando documentos relevantes con k={k_value} (valor del config.ini)")
+
+        # Realizar búsqueda en Qdrant
+        try:
+            retrieved_docs = buscar_similares(vector_store, query, k_value)
+            cantidad_fragmentos = len(retrieved_docs)
+            # Unir chunks contiguos de un mismo registro (sin repetir el solapamiento)
+            retrieved_docs = unir_fragmentos_adyacentes(retrieved_docs)
+            documentos_relevantes = [doc for doc, score in retrieved_docs]
+            log_message(f"Fragmentos tras unir chunks adyacentes: {len(documentos_relevantes)}")
+
+            # Guardamos la cantidad de fragmentos
+            estado_retrieve["document_count"] = cantidad_fragmentos
+            retrieve_stats.document_count = cantidad_fragmentos
+
+            if not documentos_relevantes:
+                log_message("No se encontró información suficiente para responder la pregunta.")
+                return "Lo siento, no tengo información suficiente para responder esa pregunta."
+
+            # Formato detallado para el log
+            formatted_docs = "\n\n".join(
+                (f"FRAGMENTO #{i+1}: {doc.page_content}\nMETADATA: {doc.metadata}\nSCORE: {score}")
+                for i, (doc, score) in enumerate(retrieved_docs)
+            )
+            log_message(f"Documentos recuperados:\n{formatted_docs}")
+
+            serialized = "\n\n".join(
+                (f"fFRAGMENTO{doc.page_content}\nMETADATA{doc.metadata}") for doc in documentos_relevantes
+            )
+
+            # Contamos tokens de la respuesta de retrieve
+            tokens_respuesta_retrieve = contar_tokens(serialized, model_name)
+            log_message(f"Fragmentos recuperados de Qdrant: {cantidad_fragmentos}")
+            log_message(f"Tokens de salida en retrieve: {tokens_respuesta_retrieve}")
+            log_message(f"Total tokens en retrieve: {tokens_consulta + tokens_respuesta_retrieve}")
+
+            # Log del contenido completo recuperado (como en versión Chroma)
+            log_message(f"WEB-RETREIVE----> :\n {serialized} \n----------END-WEB-RETRIEBE <")
+
+            return serialized
+        except (LimiteExcedido, PlazoAgotado):
+            raise
+        except Exception as e:
+            verificar_plazo("busqueda_qdrant")
+            error_msg = f"Error al realizar la búsqueda en Qdrant: {str(e)}"
+            log_message(error_msg, level='ERROR')
+            log_message(traceback.format_exc(), level='ERROR')
+            return "Error al buscar en la base de datos: no se pudo recuperar información relevante."
+
+    # Nodo 1: Generar consulta o responder directamente
+    def query_or_respond(state: MessagesState):
+        """Genera una consulta para la herramienta de recuperación o responde directamente."""
+        log_message(f"########### QUERY OR RESPOND ---------#####################")
+
+        # Contamos tokens de entrada
+        prompt_text = "\n".join([msg.content for msg in state["messages"]])
+        tokens_entrada_qor = contar_tokens(prompt_text, model_name)
+        log_message(f"Tokens de entrada en query_or_respond: {tokens_entrada_qor}")
+
+        # Log del mensaje completo
+        log_message(f"Estado de mensajes entrante: {state}")
+
+        llm_with_tools = llm.bind_tools([retrieve])
+        response = invocar_llm(llm_with_tools, state["messages"])
+
+        # Contamos tokens de salida
+        tokens_salida_qor = contar_tokens(response.content, model_name)
+        log_message(f"Tokens de salida en query_or_respond: {tokens_salida_qor}")
+        log_message(f"Total tokens en query_or_respond: {tokens_entrada_qor + tokens_salida_qor}")
+
+        # Log de la respuesta completa
+        log_message(f"Respuesta de query_or_respond: {response.content}")
+
+        return {"messages": [response]}
+
+    # Nodo 2: Ejecutar la herramienta de recuperación
+    # handle_tool_errors=False: retrieve ya maneja sus errores, sólo propaga LimiteExcedido
+    tools = ToolNode([retrieve], handle_tool_errors=False)
+
+    # Nodo 3: Generar la respuesta final
+    def generate(state: MessagesState):
+        """Genera la respuesta final usando los documentos recuperados."""
+        log_message(f"###########WEB-generate---------#####################")
+
+        # Extraer mensajes de herramienta recientes
+        recent_tool_messages = [msg for msg in reversed(state["messages"]) if msg.type == "tool"]
+        log_message(f"Mensajes de herramienta encontrados: {len(recent_tool_messages)}")
+
+        docs_content = "\n\n".join(doc.content for doc in recent_tool_messages[::-1])
+
+        # Log del contenido de documentos
+        log_message(f"Contenido de documentos compilados:\n{docs_content[:1000]}... (truncado)")
+
+        # Validar si los documentos contienen términos clave de la pregunta
+        user_question = state["messages"][0].content.lower()
+        terms = user_question.split()
+
+        log_message(f"Términos de búsqueda de la pregunta: {terms}")
+
+        if not any(term in docs_content.lower() for term in terms):
+            log_message("No se encontraron términos de la pregunta en los documentos, enviando respuesta genérica.")
+            return {"messages": [{"role": "assistant", "content": "Lo siento, no tengo información suficiente para responder esa pregunta."}]}
+
+        system_message_content = prompt_base + docs_content
+
+        # Validar si excede el límite de palabras
+        es_valido, num_palabras = validar_palabras(system_message_content)
+        log_message(f"Sistema message contiene {num_palabras} palabras. Válido: {es_valido}")
+
+        if not es_valido:
+            # Reducir el contenido si es necesario
+            system_message_content = reducir_contenido_por_palabras(prompt_base + docs_content) # Asegurarse que se usa la base + docs para reducir
+            log_message(f"Se ha reducido el contenido a {count_words(system_message_content)} palabras.")
+            log_message(f"WEB-CONTEXTO_QUEDO RESUMIDO ASI (system_message_content\n): {system_message_content[:1000]}... (truncado)")
+
+        prompt = [SystemMessage(content=system_message_content)] + [
+            msg for msg in state["messages"] if msg.type in ("human", "system")
+        ]
+
+        # Log del prompt completo
+        log_message(f"WEB-PROMPT PROMPT ------>\n {prompt}--<")
+
+        # Contamos tokens del prompt de entrada
+        prompt_text = system_message_content + "\n" + "\n".join([msg.content for msg in state["messages"] if msg.type in ("human", "system")])
+        tokens_entrada = contar_tokens(prompt_text, model_name)
+        log_message(f"Tokens de entrada (prompt): {tokens_entrada}")
+
+        # Realizamos la inferencia
+        log_message(f"Generando respuesta final con modelo {model_name}")
+        response = invocar_llm(llm, prompt)
+
+        # Contamos tokens de la respuesta
+        tokens_salida = contar_tokens(response.content, model_name)
+        log_message(f"Tokens de entrada (respuesta) DE PREGUNTA:: {tokens_entrada}")
+        log_message(f"Tokens de salida (respuesta) DE PREGUNTA:: {tokens_salida}")
+        log_message(f"Total tokens consumidos DE PREGUNTA: {tokens_entrada + tokens_salida}")
+
+        # Añadimos un resumen del conteo de tokens
+        log_token_summary(tokens_entrada, tokens_salida, model_name)
+
+        # Log de la respuesta completa
+        log_message(f"WEB-PROMPT RESPONSE ------>\n {response}--<")
+
+        return {"messages": [response]}
+
+    # Construcción del gráfico de conversación
+    graph_builder = StateGraph(MessagesState)
+    graph_builder.add_node(query_or_respond)
+    graph_builder.add_node(tools)
+    graph_builder.add_node(generate)
+    graph_builder.set_entry_point("query_or_respond")
+    graph_builder.add_edge("query_or_respond", "tools")
+    graph_builder.add_edge("tools", "generate")
+    graph = graph_builder.compile()
+
+    # Procesar la pregunta
+    log_message(f"##############-------PROCESANDO COMPLETE_ANALYSIS (Qdrant)----------#####################")
+
+    # Preparar el mensaje con la pregunta y contexto - Usar valores del config.ini
+    question_with_context = f"""
+Pregunta: {pregunta}
+"""
+
+    # Registramos tokens de la pregunta inicial
+    tokens_pregunta = contar_tokens(question_with_context, model_name)
+    log_message(f"Tokens de la pregunta inicial: {tokens_pregunta}")
+    log_message(f"Pregunta con contexto: {question_with_context}")
+
+    # Preparar el mensaje para el grafo
+    human_message = HumanMessage(content=question_with_context)
+
+    # Iniciar el streaming del grafo
+    response_content = None
+
+    log_message(f"Iniciando ejecución del grafo LangGraph...")
+
+    last_step = None
+    step_count = 0
+    for step in graph.stream(
+        {"messages": [human_message]},
+        stream_mode="values",
+        config={"configurable": {"thread_id": "user_question"}}
+    ):
+        step_count += 1
+        last_step = step
+        log_message(f"Ejecutando paso {step_count} del grafo...")
+
+        # Si hay mensajes y el último es del asistente, extraemos la respuesta
+        if "messages" in step and step["messages"]:
+            assistant_messages = [msg for msg in step["messages"]
+                                if hasattr(msg, 'type') and msg.type == "ai" or
+                                    hasattr(msg, 'role') and msg.role == "assistant"]
+
+            if assistant_messages:
+                latest_assistant_msg = assistant_messages[-1]
+                if hasattr(latest_assistant_msg, 'content'):
+                    response_content = latest_assistant_msg.content
+                    log_message(f"Respuesta parcial actualizada en paso {step_count}")
+
+    log_message(f"Grafo completado con {step_count} pasos.")
+
+    # Si no tenemos respuesta pero tenemos último paso
+    if response_content is None and last_step and "messages" in last_step:
+        log_message("No se encontró respuesta en el streaming, buscando en el último paso...")
+        for msg in reversed(last_step["messages"]):
+            if (hasattr(msg, 'type') and msg.type == "ai") or \
+            (hasattr(msg, 'role') and msg.role == "assistant"):
+                response_content = msg.content
+                log_message("Respuesta encontrada en el último paso")
+                break
+
+    # Si aún no hay respuesta
+    if response_content is None:
+        log_message("No se pudo extraer ninguna respuesta del grafo. Usando respuesta genérica.")
+        response_content = "Lo siento, no se pudo generar una respuesta."
+
+    # Registrar resultado
+    log_message(f"Respuesta final generada, longitud: {len(response_content)}")
+
+    # CÁLCULO ÚNICO DE TOKENS - Hacerlo una sola vez aquí
+    # 1. Tokens de la pregunta del usuario
+    tokens_pregunta_usuario = contar_tokens(question_with_context, model_name)
+    log_message(f"Tokens de la pregunta del usuario (question_with_context): {tokens_pregunta_usuario}")
+
+    # 2. Tokens del prompt base del sistema
+    tokens_prompt_sistema_base = contar_tokens(prompt_base, model_name)
+    log_message(f"Tokens del prompt base del sistema (get_sistema_prompt_base): {tokens_prompt_sistema_base}")
+
+    # 3. Tokens del contexto recuperado (docs_content)
+    # Extraer docs_content del último estado del grafo (last_step)
+    # Replicamos la lógica de cómo se construye docs_content en el nodo 'generate'
+    docs_content_final = ""
+    if last_step and "messages" in last_step:
+        tool_messages = [msg for msg in reversed(last_step["messages"]) if hasattr(msg, 'type') and msg.type == "tool"]
+        if tool_messages:
+            docs_content_final = "\n\n".join(doc.content for doc in tool_messages[::-1])
+            log_message(f"docs_content_final extraído del last_step, longitud: {len(docs_content_final)}")
+        else:
+            log_message("No se encontraron mensajes de herramienta en el last_step para extraer docs_content_final.")
+    else:
+        log_message("last_step no disponible o no contiene mensajes para extraer docs_content_final.")
+
+    tokens_documentos_contexto = contar_tokens(docs_content_final, model_name)
+    log_message(f"Tokens del contexto recuperado (docs_content_final): {tokens_documentos_contexto}")
+
+    # Suma total de tokens de entrada
+    tokens_entrada = tokens_pregunta_usuario + tokens_prompt_sistema_base + tokens_documentos_contexto
+
+    # Calcular tokens de salida (esto parece correcto)
+    tokens_salida = contar_tokens(response_content, model_name)
+
+    # Usar estos valores para logs y base de datos
+    log_message(f"CÁLCULO ÚNICO DE TOKENS (REVISADO):")
+    log_message(f"Tokens de pregunta usuario: {tokens_pregunta_usuario}")
+    log_message(f"Tokens de prompt sistema base: {tokens_prompt_sistema_base}")
+    log_message(f"Tokens de documentos (contexto): {tokens_documentos_contexto}")
+    log_message(f"Tokens de entrada (total): {tokens_entrada}")
+    log_message(f"Tokens de salida (respuesta): {tokens_salida}")
+    log_message(f"Total tokens consumidos: {tokens_entrada + tokens_salida}")
+
+    # Generar resumen de tokens para los logs
+    log_token_summary(tokens_entrada, tokens_salida, model_name)
+
+    return {
+        "response_content": response_content,
+        "tokens_entrada": tokens_entrada,
+        "tokens_salida": tokens_salida,
+        "document_count": estado_retrieve["document_count"],
+        "question_with_context": question_with_context,
+    }
+
 # Endpoint actualizado para el análisis completo con Qdrant
 @router.post("/complete_analysis", response_model=CompleteAnalysisResponse)
 async def handle_complete_analysis(
@@ -155,349 +465,75 @@ async def handle_complete_analysis(
 ):
     """
     Endpoint que integra todo el proceso de análisis de texto completo
-    usando Qdrant como base de datos vectorial
+    usando Qdrant como base de datos vectorial.
+    Los requests simultáneos con la misma pregunta (normalizada) y la misma versión del prompt
+    comparten una sola ejecución del grafo; cada uno persiste su propia consulta.
     """
     # Línea divisoria para mejor visualización en logs
     log_message("="*80)
     log_message(f"##############-------INICIO COMPLETE_ANALYSIS (Qdrant)----------#####################")
     log_message(f"[DEBUG-COMPLETE] Recibida solicitud completa con datos: {request}")
-    
+
     try:
-        # Iniciamos el procesamiento y marcamos la hora de inicio
-        start_time = datetime.datetime.now()
-        
         # Obtener identificadores si están disponibles como parámetros
         id_usuario = getattr(request, 'id_usuario', None)
         ugel_origen = getattr(request, 'ugel_origen', None)
-        
+
         # Marcar esto como consulta proveniente de API
         log_message(f"CLIENTE_API: Recibida consulta para análisis completo con Qdrant.")
         log_message(f"ID Usuario: {id_usuario if id_usuario else 'No especificado'}")
         log_message(f"UGL Origen: {ugel_origen if ugel_origen else 'No especificada'}")
-        
-        # Vamos a eliminar las inicializaciones de conteo de tokens que se calculan al final
-        # y usar solo un punto de cálculo
-        
-        # Diccionario para registrar tokens por cada nodo (solo para análisis detallado)
-        tokens_por_nodo = {
-            "query_or_respond": {"entrada": 0, "salida": 0},
-            "tools": {"entrada": 0, "salida": 0},
-            "generate": {"entrada": 0, "salida": 0}
-        }
-        
-        log_message(f"Iniciando ejecución del grafo LangGraph...")
-        
-        # Función de retrieve adaptada para Qdrant
-        def retrieve(query: str):
-            """Recuperar información relacionada con la consulta usando Qdrant."""
-            log_message(f"########### RETRIEVE (Qdrant) --------#####################")
-            
-            # Contamos tokens de la consulta
-            tokens_consulta = contar_tokens(query, model_name)
-            log_message(f"Tokens de entrada en retrieve (consulta): {tokens_consulta}")
-            
-            # Usar valor del config.ini, ignorando el del request
-            k_value = max_results
-            log_message(f"Buscando documentos relevantes con k={k_value} (valor del config.ini)")
-            
-            # Realizar búsqueda en Qdrant
-            try:
-                retrieved_docs = vector_store.similarity_search_with_score(query, k=k_value)
-                documentos_relevantes = [doc for doc, score in retrieved_docs]
-                cantidad_fragmentos = len(documentos_relevantes)
-                
-                # Guardamos la cantidad de fragmentos
-                retrieve_stats.document_count = cantidad_fragmentos
-                
-                if not documentos_relevantes:
-                    log_message("No se encontró información suficiente para responder la pregunta.")
-                    return "Lo siento, no tengo información suficiente para responder esa pregunta."
-                
-                # Formato detallado para el log
-                formatted_docs = "\n\n".join(
-                    (f"FRAGMENTO #{i+1}: {doc.page_content}\nMETADATA: {doc.metadata}\nSCORE: {score}")
-                    for i, (doc, score) in enumerate(retrieved_docs)
-                )
-                log_message(f"Documentos recuperados:\n{formatted_docs}")
-                
-                serialized = "\n\n".join(
-                    (f"fFRAGMENTO{doc.page_content}\nMETADATA{doc.metadata}") for doc in documentos_relevantes
-                )
-                
-                # Contamos tokens de la respuesta de retrieve
-                tokens_respuesta_retrieve = contar_tokens(serialized, model_name)
-                log_message(f"Fragmentos recuperados de Qdrant: {cantidad_fragmentos}")
-                log_message(f"Tokens de salida en retrieve: {tokens_respuesta_retrieve}")
-                log_message(f"Total tokens en retrieve: {tokens_consulta + tokens_respuesta_retrieve}")
-                
-                # Log del contenido completo recuperado (como en versión Chroma)
-                log_message(f"WEB-RETREIVE----> :\n {serialized} \n----------END-WEB-RETRIEBE <")
-                
-                return serialized
-            except Exception as e:
-                error_msg = f"Error al realizar la búsqueda en Qdrant: {str(e)}"
-                log_message(error_msg, level='ERROR')
-                log_message(traceback.format_exc(), level='ERROR')
-                return "Error al buscar en la base de datos: no se pudo recuperar información relevante."
-        
-        # Nodo 1: Generar consulta o responder directamente
-        def query_or_respond(state: MessagesState):
-            """Genera una consulta para la herramienta de recuperación o responde directamente."""
-            log_message(f"########### QUERY OR RESPOND ---------#####################")
-            
-            # Contamos tokens de entrada
-            prompt_text = "\n".join([msg.content for msg in state["messages"]])
-            tokens_entrada_qor = contar_tokens(prompt_text, model_name)
-            log_message(f"Tokens de entrada en query_or_respond: {tokens_entrada_qor}")
-            
-            # Log del mensaje completo
-            log_message(f"Estado de mensajes entrante: {state}")
-            
-            llm_with_tools = llm.bind_tools([retrieve])
-            response = llm_with_tools.invoke(state["messages"])
-            
-            # Contamos tokens de salida
-            tokens_salida_qor = contar_tokens(response.content, model_name)
-            log_message(f"Tokens de salida en query_or_respond: {tokens_salida_qor}")
-            log_message(f"Total tokens en query_or_respond: {tokens_entrada_qor + tokens_salida_qor}")
-            
-            # Log de la respuesta completa
-            log_message(f"Respuesta de query_or_respond: {response.content}")
-            
-            return {"messages": [response]}
-        
-        # Nodo 2: Ejecutar la herramienta de recuperación
-        tools = ToolNode([retrieve])
-        
-        # Nodo 3: Generar la respuesta final
-        def generate(state: MessagesState):
-            """Genera la respuesta final usando los documentos recuperados."""
-            log_message(f"###########WEB-generate---------#####################")
-            
-            # Extraer mensajes de herramienta recientes
-            recent_tool_messages = [msg for msg in reversed(state["messages"]) if msg.type == "tool"]
-            log_message(f"Mensajes de herramienta encontrados: {len(recent_tool_messages)}")
-            
-            docs_content = "\n\n".join(doc.content for doc in recent_tool_messages[::-1])
-            
-            # Log del contenido de documentos
-            log_message(f"Contenido de documentos compilados:\n{docs_content[:1000]}... (truncado)")
-            
-            # Validar si los documentos contienen términos clave de la pregunta
-            user_question = state["messages"][0].content.lower()
-            terms = user_question.split()
-            
-            log_message(f"Términos de búsqueda de la pregunta: {terms}")
-            
-            if not any(term in docs_content.lower() for term in terms):
-                log_message("No se encontraron términos de la pregunta en los documentos, enviando respuesta genérica.")
-                return {"messages": [{"role": "assistant", "content": "Lo siento, no tengo información suficiente para responder esa pregunta."}]}
-            
-            system_message_content = get_sistema_prompt_base()[0] + docs_content
-       
-            # Validar si excede el límite de palabras
-            es_valido, num_palabras = validar_palabras(system_message_content)
-            log_message(f"Sistema message contiene {num_palabras} palabras. Válido: {es_valido}")
-            
-            if not es_valido:
-                # Reducir el contenido si es necesario
-                system_message_content = reducir_contenido_por_palabras(get_sistema_prompt_base()[0] + docs_content) # Asegurarse que se usa la base + docs para reducir
-                log_message(f"Se ha reducido el contenido a {count_words(system_message_content)} palabras.")
-                log_message(f"WEB-CONTEXTO_QUEDO RESUMIDO ASI (system_message_content\n): {system_message_content[:1000]}... (truncado)")
-            
-            prompt = [SystemMessage(content=system_message_content)] + [
-                msg for msg in state["messages"] if msg.type in ("human", "system")
-            ]
-            
-            # Log del prompt completo
-            log_message(f"WEB-PROMPT PROMPT ------>\n {prompt}--<")
-            
-            # Contamos tokens del prompt de entrada
-            prompt_text = system_message_content + "\n" + "\n".join([msg.content for msg in state["messages"] if msg.type in ("human", "system")])
-            tokens_entrada = contar_tokens(prompt_text, model_name)
-            log_message(f"Tokens de entrada (prompt): {tokens_entrada}")
-            
-            # Realizamos la inferencia
-            log_message(f"Generando respuesta final con modelo {model_name}")
-            response = llm.invoke(prompt)
-            
-            # Contamos tokens de la respuesta
-            tokens_salida = contar_tokens(response.content, model_name)
-            log_message(f"Tokens de entrada (respuesta) DE PREGUNTA:: {tokens_entrada}")
-            log_message(f"Tokens de salida (respuesta) DE PREGUNTA:: {tokens_salida}")
-            log_message(f"Total tokens consumidos DE PREGUNTA: {tokens_entrada + tokens_salida}")
-            
-            # Añadimos un resumen del conteo de tokens
-            token_summary = log_token_summary(tokens_entrada, tokens_salida, model_name)
-            
-            # Log de la respuesta completa
-            log_message(f"WEB-PROMPT RESPONSE ------>\n {response}--<")
-            
-            return {"messages": [response]}
-        
-        # Construcción del gráfico de conversación
-        graph_builder = StateGraph(MessagesState)
-        graph_builder.add_node(query_or_respond)
-        graph_builder.add_node(tools)
-        graph_builder.add_node(generate)
-        graph_builder.set_entry_point("query_or_respond")
-        graph_builder.add_edge("query_or_respond", "tools")
-        graph_builder.add_edge("tools", "generate")
-        graph = graph_builder.compile()
-        
-        # Procesar la pregunta
-        log_message(f"##############-------PROCESANDO COMPLETE_ANALYSIS (Qdrant)----------#####################")
-        
-        # Preparar el mensaje con la pregunta y contexto - Usar valores del config.ini
-        question_with_context = f"""
-Pregunta: {request.question_input}
-"""
-        
+
         # Agregar información del usuario y UGL al contexto si están disponibles
         if id_usuario and ugel_origen:
             log_message(f"Agregando información de usuario (ID: {id_usuario}) y UGL ({ugel_origen}) al contexto")
-            
-        # Registramos tokens de la pregunta inicial
-        tokens_pregunta = contar_tokens(question_with_context, model_name)
-        log_message(f"Tokens de la pregunta inicial: {tokens_pregunta}")
-        log_message(f"Pregunta con contexto: {question_with_context}")
-        
-        # Preparar el mensaje para el grafo
-        human_message = HumanMessage(content=question_with_context)
-        
-        # Iniciar el streaming del grafo
-        response_content = None
-        
+
+        question_with_context = f"""
+Pregunta: {request.question_input}
+"""
+
         try:
             # Iniciamos el procesamiento y marcamos la hora de inicio
             start_time = datetime.datetime.now()
-            
-            # Obtener identificadores si están disponibles como parámetros
-            id_usuario = getattr(request, 'id_usuario', None)
-            ugel_origen = getattr(request, 'ugel_origen', None)
-            
-            # Marcar esto como consulta proveniente de API
-            log_message(f"CLIENTE_API: Recibida consulta para análisis completo con Qdrant.")
-            log_message(f"ID Usuario: {id_usuario if id_usuario else 'No especificado'}")
-            log_message(f"UGL Origen: {ugel_origen if ugel_origen else 'No especificada'}")
-            
-            # Vamos a eliminar las inicializaciones de conteo de tokens que se calculan al final
-            # y usar solo un punto de cálculo
-            
-            # Diccionario para registrar tokens por cada nodo (solo para análisis detallado)
-            tokens_por_nodo = {
-                "query_or_respond": {"entrada": 0, "salida": 0},
-                "tools": {"entrada": 0, "salida": 0},
-                "generate": {"entrada": 0, "salida": 0}
-            }
-            
-            log_message(f"Iniciando ejecución del grafo LangGraph...")
-            
-            last_step = None
-            step_count = 0
-            for step in graph.stream(
-                {"messages": [human_message]},
-                stream_mode="values",
-                config={"configurable": {"thread_id": "user_question"}}
-            ):
-                step_count += 1
-                last_step = step
-                log_message(f"Ejecutando paso {step_count} del grafo...")
-                
-                # Si hay mensajes y el último es del asistente, extraemos la respuesta
-                if "messages" in step and step["messages"]:
-                    assistant_messages = [msg for msg in step["messages"] 
-                                        if hasattr(msg, 'type') and msg.type == "ai" or
-                                            hasattr(msg, 'role') and msg.role == "assistant"]
-                    
-                    if assistant_messages:
-                        latest_assistant_msg = assistant_messages[-1]
-                        if hasattr(latest_assistant_msg, 'content'):
-                            response_content = latest_assistant_msg.content
-                            log_message(f"Respuesta parcial actualizada en paso {step_count}")
-            
-            log_message(f"Grafo completado con {step_count} pasos.")
-            
-            # Si no tenemos respuesta pero tenemos último paso
-            if response_content is None and last_step and "messages" in last_step:
-                log_message("No se encontró respuesta en el streaming, buscando en el último paso...")
-                for msg in reversed(last_step["messages"]):
-                    if (hasattr(msg, 'type') and msg.type == "ai") or \
-                    (hasattr(msg, 'role') and msg.role == "assistant"):
-                        response_content = msg.content
-                        log_message("Respuesta encontrada en el último paso")
-                        break
-            
-            # Si aún no hay respuesta
-            if response_content is None:
-                log_message("No se pudo extraer ninguna respuesta del grafo. Usando respuesta genérica.")
-                response_content = "Lo siento, no se pudo generar una respuesta."
-            
-            # Registrar resultado
-            log_message(f"Respuesta final generada, longitud: {len(response_content)}")
-            
-            # Calcular tiempo total
+
+            # El prompt se resuelve una vez por request: su versión forma parte de la clave de coalescencia
+            prompt_base, prompt_id = await run_in_threadpool(get_sistema_prompt_base)
+            clave = (normalizar_pregunta(request.question_input), prompt_id)
+
+            # Un request coalescido espera el cálculo compartido sólo mientras le dure su propio plazo
+            try:
+                resultado, compartido = await analisis_en_vuelo.ejecutar(
+                    clave, ejecutar_grafo_analisis, request.question_input, prompt_base, vector_store, llm,
+                    espera_maxima=tiempo_restante()
+                )
+            except asyncio.TimeoutError:
+                raise PlazoAgotado("espera del cálculo compartido")
+            if compartido:
+                log_message(f"SINGLE_FLIGHT: respuesta compartida con un request idéntico en vuelo (prompt {prompt_id})")
+
+            response_content = resultado["response_content"]
+            tokens_entrada = resultado["tokens_entrada"]
+            tokens_salida = resultado["tokens_salida"]
+
+            # Calcular tiempo total (el de este request, incluida la espera si fue coalescido)
             end_time = datetime.datetime.now()
             processing_time = (end_time - start_time).total_seconds()
             tiempo_respuesta_ms = int(processing_time * 1000)
             log_message(f"TIEMPO RESPUESTA: {processing_time:.2f} segundos ({tiempo_respuesta_ms} ms)")
-            
-            # CÁLCULO ÚNICO DE TOKENS - Hacerlo una sola vez aquí
-            # 1. Tokens de la pregunta del usuario
-            tokens_pregunta_usuario = contar_tokens(question_with_context, model_name)
-            log_message(f"Tokens de la pregunta del usuario (question_with_context): {tokens_pregunta_usuario}")
-
-            # 2. Tokens del prompt base del sistema
-            tokens_prompt_sistema_base = contar_tokens(get_sistema_prompt_base()[0], model_name)
-            log_message(f"Tokens del prompt base del sistema (get_sistema_prompt_base): {tokens_prompt_sistema_base}")
-
-            # 3. Tokens del contexto recuperado (docs_content)
-            # Extraer docs_content del último estado del grafo (last_step)
-            # Replicamos la lógica de cómo se construye docs_content en el nodo 'generate'
-            docs_content_final = ""
-            if last_step and "messages" in last_step:
-                tool_messages = [msg for msg in reversed(last_step["messages"]) if hasattr(msg, 'type') and msg.type == "tool"]
-                if tool_messages:
-                    docs_content_final = "\n\n".join(doc.content for doc in tool_messages[::-1])
-                    log_message(f"docs_content_final extraído del last_step, longitud: {len(docs_content_final)}")
-                else:
-                    log_message("No se encontraron mensajes de herramienta en el last_step para extraer docs_content_final.")
-            else:
-                log_message("last_step no disponible o no contiene mensajes para extraer docs_content_final.")
 
-            tokens_documentos_contexto = contar_tokens(docs_content_final, model_name)
-            log_message(f"Tokens del contexto recuperado (docs_content_final): {tokens_documentos_contexto}")
-
-            # Suma total de tokens de entrada
-            tokens_entrada = tokens_pregunta_usuario + tokens_prompt_sistema_base + tokens_documentos_contexto
-            
-            # Calcular tokens de salida (esto parece correcto)
-            tokens_salida = contar_tokens(response_content, model_name)
-            
-            # Usar estos valores para logs y base de datos
-            log_message(f"CÁLCULO ÚNICO DE TOKENS (REVISADO):")
-            log_message(f"Tokens de pregunta usuario: {tokens_pregunta_usuario}")
-            log_message(f"Tokens de prompt sistema base: {tokens_prompt_sistema_base}")
-            log_message(f"Tokens de documentos (contexto): {tokens_documentos_contexto}")
-            log_message(f"Tokens de entrada (total): {tokens_entrada}")
-            log_message(f"Tokens de salida (respuesta): {tokens_salida}")
-            log_message(f"Total tokens consumidos: {tokens_entrada + tokens_salida}")
-            
-            # Generar resumen de tokens para los logs
-            token_summary = log_token_summary(tokens_entrada, tokens_salida, model_name)
-            
             log_message(f"##############-------FIN COMPLETE_ANALYSIS (Qdrant)----------#####################")
             log_message("="*80)
-            
+
             # Agregar versión del prompt al final de la respuesta
-            if current_prompt_id:
-                response_content += f"\nvp:{current_prompt_id}"
-                log_message(f"Versión del prompt agregada a la respuesta: {current_prompt_id}")
-            
+            if prompt_id:
+                response_content += f"\nvp:{prompt_id}"
+                log_message(f"Versión del prompt agregada a la respuesta: {prompt_id}")
+
             # Persistir en base de datos con los mismos valores calculados
             try:
                 # Parámetros para la función persistir_consulta
-                id_nueva_consulta = persistir_consulta(
+                id_nueva_consulta = await run_in_threadpool(
+                    persistir_consulta,
                     pregunta_usuario=request.question_input,
                     respuesta_asistente=response_content,
                     id_usuario=id_usuario if id_usuario else 321,  # Valor por defecto según las reglas
@@ -505,7 +541,7 @@ Pregunta: {request.question_input}
                     tokens_input=tokens_entrada,  # Usar el valor calculado
                     tokens_output=tokens_salida,  # Usar el valor calculado
                     tiempo_respuesta_ms=tiempo_respuesta_ms,
-                    id_prompt_usado=current_prompt_id,  # Usar ID del prompt en lugar de versión
+                    id_prompt_usado=prompt_id,  # Usar ID del prompt en lugar de versión
                     comentario=None,  # Por ahora sin comentario
                     error_detectado=False,
                     modelo_llm_usado=model_name
@@ -516,48 +552,59 @@ Pregunta: {request.question_input}
                     log_message(f"Error al persistir consulta en base de datos (no se obtuvo ID).", level="ERROR")
             except Exception as e:
                 log_message(f"Error al persistir consulta en base de datos: {str(e)}", level="ERROR")
-            
+
             # Retornar la respuesta a la API
             return {
                 "answer": response_content,
                 "metadata": {
-                    "document_count": retrieve_stats.document_count,
+                    "document_count": resultado["document_count"],
                     "model": model_name,
                     "processing_time_ms": tiempo_respuesta_ms,
                     "input_tokens": tokens_entrada,
                     "output_tokens": tokens_salida,
                     "total_tokens": tokens_entrada + tokens_salida,
+                    "coalesced": compartido,
                     "id_usuario": id_usuario if id_usuario is not None else 321,
                     "ugel_origen": ugel_origen if ugel_origen is not None else "Formosa",
                     "id_consulta": id_nueva_consulta if 'id_nueva_consulta' in locals() and id_nueva_consulta is not None else None
                 }
             }
-            
+
+        except LimiteExcedido:
+            # Contrapresión: sin lugar en el limitador de OpenAI se responde 429/503 sin persistir la consulta
+            raise
         except Exception as e:
             log_message(f"[ERROR-GENERAL] Error inesperado: {str(e)}", level="ERROR")
             log_message(traceback.format_exc(), level="ERROR")
-            
+
             # Calcular tiempo de procesamiento
             end_time = datetime.datetime.now()
             processing_time = (end_time - start_time).total_seconds() if 'start_time' in locals() else 0
             tiempo_respuesta_ms = int(processing_time * 1000)
             log_message(f"TIEMPO RESPUESTA (ERROR): {processing_time:.2f} segundos ({tiempo_respuesta_ms} ms)")
-            
-            # Preparar mensaje de error
+
+            # Preparar mensaje de error (plazo agotado = respuesta degradada, no error del servidor)
+            degradada = isinstance(e, PlazoAgotado)
             error_message = f"Lo siento, ocurrió un error al procesar tu solicitud: {str(e)}"
-            response_content = "Lo siento, ocurrió un error en el servidor. Por favor, intenta nuevamente más tarde."
-            
+            if degradada:
+                response_content = RESPUESTA_DEGRADADA
+            else:
+                response_content = "Lo siento, ocurrió un error en el servidor. Por favor, intenta nuevamente más tarde."
+
+            if 'prompt_id' not in locals():
+                prompt_base, prompt_id = get_sistema_prompt_base()
+
             # Agregar versión del prompt al final de la respuesta de error
-            if current_prompt_id:
-                response_content += f"\nvp:{current_prompt_id}"
-                log_message(f"Versión del prompt agregada a la respuesta de error: {current_prompt_id}")
-            
+            if prompt_id:
+                response_content += f"\nvp:{prompt_id}"
+                log_message(f"Versión del prompt agregada a la respuesta de error: {prompt_id}")
+
             # CÁLCULO ÚNICO DE TOKENS EN CASO DE ERROR (también necesita revisión)
             tokens_entrada_error = 0 # Renombrar para evitar colisión con el caso exitoso
             tokens_salida_error = 0  # Renombrar para evitar colisión
 
             # Si ya teníamos la pregunta, calculamos sus tokens
-            if 'question_with_context' in locals() and question_with_context:
+            if question_with_context:
                 tokens_pregunta_usuario_error = contar_tokens(question_with_context, model_name)
                 tokens_entrada_error += tokens_pregunta_usuario_error
                 log_message(f"Tokens de entrada (pregunta) en error: {tokens_pregunta_usuario_error}")
@@ -567,25 +614,23 @@ Pregunta: {request.question_input}
             # Por simplicidad y consistencia con la idea de que el LLM no procesó el contexto completo,
             # podríamos omitir los tokens del sistema y del contexto para el cálculo de tokens_entrada en caso de error,
             # o solo incluir la pregunta. Para este ejemplo, seremos conservadores.
-            # Si el error ocurre antes del nodo 'generate', get_sistema_prompt_base() y docs_content_final no se habrían usado.
+            # Si el error ocurre antes del nodo 'generate', el prompt base y docs_content_final no se habrían usado.
             # El `token_summary` ya usa los tokens que se le pasan, así que el log será coherente.
 
-            # Se usa get_sistema_prompt_base()[0] para el cálculo en caso de error
-            tokens_prompt_sistema_base_error = contar_tokens(get_sistema_prompt_base()[0], model_name)
-
             # No intentaremos extraer docs_content_final en caso de error general, ya que el grafo pudo no completarse.
 
             # Tokens de la respuesta de error
             tokens_salida_error = contar_tokens(response_content, model_name) # response_content es el mensaje de error
             log_message(f"Tokens de salida (respuesta de error): {tokens_salida_error}")
-            
+
             # Registrar resumen de tokens incluso en caso de error
             # Usamos tokens_entrada_error y tokens_salida_error
             token_summary_error = log_token_summary(tokens_entrada_error, tokens_salida_error, model_name)
-            
+
             # Persistir error en base de datos con los mismos valores calculados
             try:
-                id_consulta_error = persistir_consulta(
+                id_consulta_error = await run_in_threadpool(
+                    persistir_consulta,
                     pregunta_usuario=request.question_input,
                     respuesta_asistente=response_content,
                     id_usuario=id_usuario if id_usuario else 321,
@@ -593,10 +638,10 @@ Pregunta: {request.question_input}
                     tokens_input=tokens_entrada_error, # Usar tokens_entrada_error
                     tokens_output=tokens_salida_error,  # Usar tokens_salida_error
                     tiempo_respuesta_ms=tiempo_respuesta_ms,
-                    id_prompt_usado=current_prompt_id,  # Usar ID del prompt en lugar de versión
+                    id_prompt_usado=prompt_id,  # Usar ID del prompt en lugar de versión
                     comentario=None,  # Por ahora sin comentario
                     error_detectado=True,
-                    tipo_error="Error en procesamiento",
+                    tipo_error="Plazo agotado" if degradada else "Error en procesamiento",
                     mensaje_error=str(e),
                     modelo_llm_usado=model_name
                 )
@@ -607,12 +652,13 @@ Pregunta: {request.question_input}
 
             except Exception as db_error:
                 log_message(f"Error al persistir el error en base de datos: {str(db_error)}", level="ERROR")
-            
+
             # Retornar respuesta de error con los mismos valores de tokens
             return {
                 "answer": response_content,
                 "metadata": {
                     "error": True,
+                    "degraded": degradada,
                     "error_message": str(e),
                     "model": model_name,
                     "processing_time_ms": tiempo_respuesta_ms,
@@ -624,7 +670,9 @@ Pregunta: {request.question_input}
                     "id_consulta": id_consulta_error if 'id_consulta_error' in locals() and id_consulta_error is not None else None
                 }
             }
-    
+
+    except LimiteExcedido:
+        raise
     except Exception as e:
         log_message(f"[ERROR-GENERAL] Error inesperado: {str(e)}", level="ERROR")
         log_message(traceback.format_exc(), level="ERROR")
@@ -645,15 +693,23 @@ class FeedbackRequest(BaseModel):
     id_consulta: int
     feedback_value: str # Esperamos "me_gusta" o "no_me_gusta"
 
-# Modelo Pydantic para la respuesta de cada consulta
+# Ítem de /api/feedback/batch: feedback y, opcionalmente, comentario de una consulta
+class FeedbackLoteItem(BaseModel):
+    id_consulta: int
+    feedback_value: str # "me_gusta" o "no_me_gusta"
+    comentario: Optional[str] = None
+
+# Modelo Pydantic para la respuesta de cada consulta.
+# El listado trae sólo el inicio de pregunta y respuesta (truncado en SQL); los textos completos
+# quedan en None y se piden por fila a /api/admin/consultas/{id_consulta}.
 class ConsultaAdminItem(BaseModel):
     id_consulta: int
     timestamp: datetime.datetime # FastAPI manejará la serialización a string ISO
     id_usuario: int
-    ugel_origen: str
-    pregunta_usuario_completa: str # Nombre cambiado para claridad
+    ugel_origen: Optional[str] = None
+    pregunta_usuario_completa: Optional[str] = None # Nombre cambiado para claridad
     pregunta_usuario_truncada: str
-    respuesta_asistente_completa: str # Nombre cambiado para claridad
+    respuesta_asistente_completa: Optional[str] = None # Nombre cambiado para claridad
     respuesta_asistente_truncada: str
     respuesta_es_vacia: bool
     respuesta_util: str # Cambiado de bool a str para soportar "si", "no", "nada"
@@ -661,6 +717,15 @@ class ConsultaAdminItem(BaseModel):
     tokens_output: int
     tiempo_respuesta_ms: int
 
+# Detalle de una consulta para la vista "Ver" del panel de administración
+class ConsultaAdminDetalle(ConsultaAdminItem):
+    comentario: Optional[str] = None
+    id_prompt_usado: Optional[str] = None
+    modelo_llm_usado: Optional[str] = None
+    error_detectado: bool = False
+    tipo_error: Optional[str] = None
+    mensaje_error: Optional[str] = None
+
 # Modelo Pydantic para la solicitud de comentarios
 class CommentRequest(BaseModel):
     id_consulta: int
@@ -669,7 +734,6 @@ class CommentRequest(BaseModel):
 @router.post("/comentario", summary="Registrar comentario para una consulta")
 async def handle_comentario(request: CommentRequest):
     logger.info("--- INICIO Endpoint /api/comentario ---")
-    logger.info(f"Recibida solicitud de comentario RAW: {request}")
 
     id_consulta = request.id_consulta
     comentario_texto = request.comentario.strip()
@@ -683,130 +747,56 @@ async def handle_comentario(request: CommentRequest):
         logger.warning(f"Comentario muy largo para id_consulta: {id_consulta} (longitud: {len(comentario_texto)})")
         raise HTTPException(status_code=400, detail="El comentario no puede exceder 255 caracteres.")
 
-    conn = None 
+    # Un único UPDATE en el engine compartido; rowcount 0 = la consulta no existe
     try:
-        logger.info(f"Intentando obtener conexión a la BD para comentario (id_consulta: {id_consulta})")
-        conn = get_admin_db_connection() 
-        if not conn:
-            logger.error(f"Fallo al conectar a la BD para comentario (id_consulta: {id_consulta})")
-            raise HTTPException(status_code=503, detail="Error de conexión a la base de datos.")
-
-        logger.info(f"Conexión a BD exitosa para comentario (id_consulta: {id_consulta})")
-        cursor = conn.cursor()
-        
-        # Detectar el tipo de BD real
-        db_type_real = "sqlite"  # Por defecto SQLite
-        try:
-            if hasattr(conn, 'server_version'):  # Atributo específico de pymysql
-                db_type_real = "mysql"
-            elif str(type(conn)).find('sqlite') != -1:  # Verificar si es SQLite
-                db_type_real = "sqlite"
-        except:
-            db_type_real = "sqlite"  # Fallback a SQLite
-            
-        logger.info(f"Tipo de BD real detectado: {db_type_real}")
-
-        # Primero verificar si existe la consulta
-        if db_type_real == 'mysql':
-            check_query = "SELECT id_consulta FROM consultas WHERE id_consulta = %s"
-            cursor.execute(check_query, (id_consulta,))
-        else:  # sqlite
-            check_query = "SELECT id_consulta FROM consultas WHERE id_consulta = ?"
-            cursor.execute(check_query, (id_consulta,))
-        
-        existing_record = cursor.fetchone()
-        if not existing_record:
-            logger.warning(f"No se encontró consulta con id_consulta={id_consulta}")
-            raise HTTPException(status_code=404, detail=f"No se encontró la consulta con ID {id_consulta}.")
-
-        logger.info(f"Consulta {id_consulta} encontrada, procediendo con el update de comentario")
-
-        # Realizar el UPDATE
-        if db_type_real == 'mysql':
-            sql_update_query = """
-                UPDATE consultas
-                SET comentario = %s
-                WHERE id_consulta = %s
-            """
-            params_tuple = (comentario_texto, id_consulta)
-        else:  # sqlite
-            sql_update_query = """
-                UPDATE consultas
-                SET comentario = ?
-                WHERE id_consulta = ?
-            """
-            params_tuple = (comentario_texto, id_consulta)
-        
-        logger.info(f"Ejecutando UPDATE para comentario (id_consulta: {id_consulta}): Query: {sql_update_query.strip()} con Params: {params_tuple}")
-        cursor.execute(sql_update_query, params_tuple)
-        
-        rows_affected = cursor.rowcount if hasattr(cursor, 'rowcount') else 1
-        logger.info(f"Filas afectadas por el UPDATE: {rows_affected}")
-        
-        conn.commit()
-        logger.info(f"Commit de la transacción realizado para comentario (id_consulta: {id_consulta})")
-
-        # Verificar que el update fue exitoso
-        if db_type_real == 'mysql':
-            verify_query = "SELECT comentario FROM consultas WHERE id_consulta = %s"
-            cursor.execute(verify_query, (id_consulta,))
-        else:  # sqlite
-            verify_query = "SELECT comentario FROM consultas WHERE id_consulta = ?"
-            cursor.execute(verify_query, (id_consulta,))
-        
-        updated_record = cursor.fetchone()
-        if updated_record:
-            if isinstance(updated_record, dict):  # MySQL
-                actual_value = updated_record['comentario']
-            else:  # SQLite
-                actual_value = updated_record[0]
-            
-            logger.info(f"Verificación: comentario actualizado para id_consulta: {id_consulta}")
-            
-            if actual_value == comentario_texto:
-                logger.info(f"Comentario actualizado correctamente para id_consulta: {id_consulta}")
-                return {
-                    "status": "success", 
-                    "message": "Comentario guardado correctamente", 
-                    "id_consulta": id_consulta, 
-                    "comentario_guardado": comentario_texto
-                }
-            else:
-                logger.error(f"Error: el comentario no se actualizó correctamente para id_consulta: {id_consulta}")
-                raise HTTPException(status_code=500, detail="Error al actualizar el comentario en la base de datos.")
-        else:
-            logger.error(f"Error: no se pudo verificar la actualización del comentario para id_consulta: {id_consulta}")
-            raise HTTPException(status_code=500, detail="Error al verificar la actualización del comentario.")
-
-    except HTTPException as http_exc:
-        logger.error(f"HTTPException en /api/comentario (id_consulta: {id_consulta}): {http_exc.detail}")
-        raise http_exc 
+        actualizada = await run_in_threadpool(actualizar_comentario, id_consulta, comentario_texto)
     except Exception as e:
-        if conn:
-            logger.info(f"Realizando rollback debido a excepción en /api/comentario (id_consulta: {id_consulta})")
-            try:
-                conn.rollback()
-            except Exception as rollback_error:
-                logger.error(f"Error durante rollback: {rollback_error}")
-        
         logger.error(f"Error EXCEPCIÓN GENERAL al actualizar comentario para id_consulta {id_consulta}: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Error interno del servidor al procesar comentario.")
-    finally:
-        if conn:
-            try:
-                cursor.close()
-            except Exception as close_error:
-                logger.error(f"Error al cerrar cursor: {close_error}")
+
+    if not actualizada:
+        logger.warning(f"No se encontró consulta con id_consulta={id_consulta}")
+        raise HTTPException(status_code=404, detail=f"No se encontró la consulta con ID {id_consulta}.")
+
+    logger.info(f"Comentario actualizado correctamente para id_consulta: {id_consulta}")
+    return {
+        "status": "success",
+        "message": "Comentario guardado correctamente",
+        "id_consulta": id_consulta,
+        "comentario_guardado": comentario_texto
+    }
+
+# --- Filtros de fecha de los endpoints de administración ---
+# Rango semiabierto [desde 00:00:00, hasta + 1 día 00:00:00): se compara la columna timestamp tal
+# cual (sin DATE() ni otra función encima) para que el motor pueda usar los índices que empiezan por
+# timestamp, y no se pierden los registros del último segundo del día (23:59:59.5).
+def inicio_rango_fecha(fecha):
+    """'YYYY-MM-DD' -> 'YYYY-MM-DD 00:00:00' (límite inferior inclusivo); ValueError si el formato es inválido"""
+    return datetime.datetime.strptime(fecha, '%Y-%m-%d').strftime('%Y-%m-%d 00:00:00')
+
+def fin_rango_fecha(fecha):
+    """'YYYY-MM-DD' -> inicio del día siguiente (límite superior exclusivo); ValueError si el formato es inválido"""
+    dia_siguiente = datetime.datetime.strptime(fecha, '%Y-%m-%d') + datetime.timedelta(days=1)
+    return dia_siguiente.strftime('%Y-%m-%d 00:00:00')
+
+def validar_fechas_filtro(fecha_desde, fecha_hasta):
+    """Valida el formato YYYY-MM-DD de los filtros de fecha (HTTP 400 si no lo cumplen)"""
+    for nombre, valor in (("fecha_desde", fecha_desde), ("fecha_hasta", fecha_hasta)):
+        if valor:
             try:
-                conn.close()
-            except Exception as close_error:
-                logger.error(f"Error al cerrar conexión: {close_error}")
-            logger.info(f"Conexión a BD (comentario) cerrada para id_consulta: {id_consulta}")
-        logger.info("--- FIN Endpoint /api/comentario ---")
+                datetime.datetime.strptime(valor, '%Y-%m-%d')
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Formato de {nombre} inválido. Usar YYYY-MM-DD.")
+    return fecha_desde, fecha_hasta
 
 # --- Función de conexión a la BD (similar a la anterior, pero sin ser parte de Flask) ---
-def get_admin_db_connection():
+def get_admin_db_connection(multihilo=False):
+    """
+    Conexión a la BD relacional para los endpoints de administración (MySQL o SQLite).
+    Con multihilo=True la conexión SQLite puede usarse desde distintos threads, siempre de a uno
+    (p. ej. un StreamingResponse, que avanza el generador en threads del pool).
+    """
     conn = None
     db_type_admin = os.getenv('DB_TYPE', 'sqlite') # Usar una variable diferente o la misma si la config es igual
     
@@ -870,9 +860,9 @@ def get_admin_db_connection():
                     logger.info(f"Found SQLite database at alternate location: {sqlite_path_admin}")
                     break
         
-        conn = sqlite3.connect(sqlite_path_admin)
+        conn = sqlite3.connect(sqlite_path_admin, check_same_thread=not multihilo)
         conn.row_factory = sqlite3.Row # Para acceder a columnas por nombre
-        conn.execute("PRAGMA foreign_keys = ON")
+        aplicar_perfil_sqlite(conn)  # WAL, busy_timeout, caches y foreign_keys (BD_RELA/create_tables.py)
         
         # Verificar la conexión
         cursor = conn.cursor()
@@ -889,21 +879,118 @@ def get_admin_db_connection():
         logger.error(traceback.format_exc())
         return None
 
-# Nuevo endpoint para la interfaz de administración de consultas
+# Caracteres de pregunta/respuesta que se muestran en la tabla del panel de administración
+LARGO_TRUNCADO_ADMIN = 50
+
+# Columnas del listado: el texto se corta en la BD (un carácter de más para saber si hay que poner "...")
+COLUMNAS_LISTADO_ADMIN = f"""
+                id_consulta,
+                timestamp,
+                id_usuario,
+                ugel_origen,
+                SUBSTR(pregunta_usuario, 1, {LARGO_TRUNCADO_ADMIN + 1}) AS pregunta_usuario,
+                SUBSTR(respuesta_asistente, 1, {LARGO_TRUNCADO_ADMIN + 1}) AS respuesta_asistente,
+                respuesta_es_vacia,
+                respuesta_util,
+                tokens_input,
+                tokens_output,
+                tiempo_respuesta_ms
+"""
+
+def _truncar_texto(texto):
+    texto = texto or ""
+    return texto[:LARGO_TRUNCADO_ADMIN] + "..." if len(texto) > LARGO_TRUNCADO_ADMIN else texto
+
+def _fila_a_consulta_admin(row, completa=False):
+    """Convierte una fila (dict de pymysql o sqlite3.Row) en el dict de ConsultaAdminItem/ConsultaAdminDetalle"""
+    pregunta = row['pregunta_usuario'] or ""
+    respuesta = row['respuesta_asistente'] or ""
+    result = {
+        "id_consulta": row['id_consulta'],
+        "timestamp": row['timestamp'],
+        "id_usuario": row['id_usuario'],
+        "ugel_origen": row['ugel_origen'],
+        "pregunta_usuario_truncada": _truncar_texto(pregunta),
+        "respuesta_asistente_truncada": _truncar_texto(respuesta),
+        "respuesta_es_vacia": bool(row['respuesta_es_vacia']),
+        "respuesta_util": row['respuesta_util'] if row['respuesta_util'] is not None else "nada",
+        "tokens_input": row['tokens_input'] if row['tokens_input'] is not None else 0,
+        "tokens_output": row['tokens_output'] if row['tokens_output'] is not None else 0,
+        "tiempo_respuesta_ms": row['tiempo_respuesta_ms'] if row['tiempo_respuesta_ms'] is not None else 0
+    }
+    if completa:
+        result.update({
+            "pregunta_usuario_completa": pregunta,
+            "respuesta_asistente_completa": respuesta,
+            "comentario": row['comentario'],
+            "id_prompt_usado": row['id_prompt_usado'],
+            "modelo_llm_usado": row['modelo_llm_usado'],
+            "error_detectado": bool(row['error_detectado']),
+            "tipo_error": row['tipo_error'],
+            "mensaje_error": row['mensaje_error']
+        })
+    return result
+
+def _codificar_cursor(timestamp, id_consulta):
+    """Cursor opaco con la posición (timestamp, id_consulta) de la última fila entregada"""
+    crudo = json.dumps([str(timestamp), id_consulta]).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii")
+
+def _decodificar_cursor(cursor):
+    try:
+        timestamp, id_consulta = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(timestamp), int(id_consulta)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido.")
+
+def _filtros_consultas_admin(placeholder, fecha_desde, fecha_hasta, respuesta_es_vacia, respuesta_util):
+    """Condiciones WHERE y parámetros de los filtros del listado de administración (los comparte la exportación)"""
+    conditions = []
+    current_params = []
+    try:
+        if fecha_desde:
+            conditions.append(f"timestamp >= {placeholder}")
+            current_params.append(inicio_rango_fecha(fecha_desde))
+
+        if fecha_hasta:
+            conditions.append(f"timestamp < {placeholder}")
+            current_params.append(fin_rango_fecha(fecha_hasta))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Usar YYYY-MM-DD.")
+
+    if respuesta_es_vacia is not None:
+        conditions.append(f"respuesta_es_vacia = {placeholder}")
+        current_params.append(respuesta_es_vacia)
+
+    # Asegurarse que el filtro respuesta_util solo se aplique si tiene un valor relevante
+    if respuesta_util is not None and respuesta_util != "":
+        conditions.append(f"respuesta_util = {placeholder}")
+        current_params.append(respuesta_util)
+    return conditions, current_params
+
+# Nuevo endpoint para la interfaz de administración de consultas.
+# Paginación por cursor (keyset) sobre (timestamp, id_consulta), de la más reciente a la más antigua:
+# cada página es un rango del índice y no un OFFSET que recorre todo lo anterior. Si hay más filas,
+# el header X-Next-Cursor trae el cursor para pedir la página siguiente.
+# Cada página lleva un ETag con la versión de los datos: si no cambió se responde 304 sin consultarla.
 @router.get("/admin/consultas_filtradas", response_model=List[ConsultaAdminItem])
 async def obtener_consultas_filtradas_admin(
+    request: Request,
     fecha_desde: Optional[str] = Query(None, description="Fecha desde (YYYY-MM-DD)"),
     fecha_hasta: Optional[str] = Query(None, description="Fecha hasta (YYYY-MM-DD)"),
     respuesta_es_vacia: Optional[int] = Query(None, description="Filtrar por respuesta vacía (1 para Sí, 0 para No)"),
-    respuesta_util: Optional[str] = Query(None, description="Filtrar por respuesta útil ('si', 'no', 'nada')")
+    respuesta_util: Optional[str] = Query(None, description="Filtrar por respuesta útil ('si', 'no', 'nada')"),
+    limite: int = Query(admin_pagina_defecto, ge=1, le=admin_pagina_maxima, description="Filas por página"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor por la página anterior")
 ):
+    conn = None
     try:
         conn = get_admin_db_connection()
         if not conn:
             logger.error("OBTENER_CONSULTAS_FILTRADAS: No se pudo obtener conexión a la BD.")
             raise HTTPException(status_code=503, detail="Error de conexión a la base de datos.")
             
-        cursor = conn.cursor()
+        db_cursor = conn.cursor()
 
         # Determinar el tipo de base de datos activa para esta conexión
         db_type_actual = 'sqlite'  # Valor por defecto
@@ -913,117 +1000,170 @@ async def obtener_consultas_filtradas_admin(
         logger.info(f"OBTENER_CONSULTAS_FILTRADAS: Tipo de BD detectado para construcción de query: {db_type_actual}")
         placeholder = '?' if db_type_actual == 'sqlite' else '%s'
 
-        # Construir la consulta SQL base
-        base_query_select_part = """
-            SELECT 
-                id_consulta,
-                timestamp,
-                id_usuario,
-                ugel_origen,
-                pregunta_usuario,
-                respuesta_asistente,
-                respuesta_es_vacia,
-                respuesta_util,
-                tokens_input,
-                tokens_output,
-                tiempo_respuesta_ms
-            FROM consultas
-        """
-        
-        conditions = []
-        current_params = []
-
         # Agregar filtros según los parámetros recibidos
-        if fecha_desde:
-            conditions.append(f"DATE(timestamp) >= {placeholder}")
-            current_params.append(fecha_desde)
-        
-        if fecha_hasta:
-            conditions.append(f"DATE(timestamp) <= {placeholder}")
-            current_params.append(fecha_hasta)
-        
-        if respuesta_es_vacia is not None:
-            conditions.append(f"respuesta_es_vacia = {placeholder}")
-            current_params.append(respuesta_es_vacia)
-        
-        # Asegurarse que el filtro respuesta_util solo se aplique si tiene un valor relevante
-        if respuesta_util is not None and respuesta_util != "": 
-            conditions.append(f"respuesta_util = {placeholder}")
-            current_params.append(respuesta_util)
+        conditions, current_params = _filtros_consultas_admin(placeholder, fecha_desde, fecha_hasta,
+                                                              respuesta_es_vacia, respuesta_util)
+
+        # Continuar después de la última fila de la página anterior
+        if cursor:
+            cursor_timestamp, cursor_id = _decodificar_cursor(cursor)
+            conditions.append(f"(timestamp < {placeholder} OR (timestamp = {placeholder} AND id_consulta < {placeholder}))")
+            current_params.extend([cursor_timestamp, cursor_timestamp, cursor_id])
 
+        etag = version_datos.etag_version("consultas", version_datos.version_consultas(db_cursor, db_type_actual))
+        respuesta_304 = no_modificado(request, etag, admin_cache_max_age)
+        if respuesta_304 is not None:
+            return respuesta_304
+
+        final_query = f"SELECT {COLUMNAS_LISTADO_ADMIN} FROM consultas"
         if conditions:
-            final_query = base_query_select_part + " WHERE " + " AND ".join(conditions)
-        else:
-            # Si no hay condiciones, se seleccionan todos los registros
-            final_query = base_query_select_part
-            
-        final_query += " ORDER BY timestamp DESC"
+            final_query += " WHERE " + " AND ".join(conditions)
+        # Se pide una fila de más para saber si existe una página siguiente
+        final_query += f" ORDER BY timestamp DESC, id_consulta DESC LIMIT {limite + 1}"
 
         logger.info(f"OBTENER_CONSULTAS_FILTRADAS: Query final: {final_query}")
         logger.info(f"OBTENER_CONSULTAS_FILTRADAS: Parámetros: {tuple(current_params)}")
 
-        cursor.execute(final_query, tuple(current_params))
-        rows = cursor.fetchall()
-        
-        # Procesar los resultados
-        results = []
-        for row in rows:
-            # Determinar si estamos trabajando con un diccionario (MySQL) o una tupla/Row (SQLite)
-            if isinstance(row, dict):
-                # MySQL con DictCursor
-                pregunta_completa = row['pregunta_usuario'] or ""
-                respuesta_completa = row['respuesta_asistente'] or ""
-                result = {
-                    "id_consulta": row['id_consulta'],
-                    "timestamp": row['timestamp'],
-                    "id_usuario": row['id_usuario'],
-                    "ugel_origen": row['ugel_origen'],
-                    "pregunta_usuario_completa": pregunta_completa,
-                    "pregunta_usuario_truncada": pregunta_completa[:50] + "..." if len(pregunta_completa) > 50 else pregunta_completa,
-                    "respuesta_asistente_completa": respuesta_completa,
-                    "respuesta_asistente_truncada": respuesta_completa[:50] + "..." if len(respuesta_completa) > 50 else respuesta_completa,
-                    "respuesta_es_vacia": bool(row['respuesta_es_vacia']),
-                    "respuesta_util": row['respuesta_util'] if row['respuesta_util'] is not None else "nada",
-                    "tokens_input": row['tokens_input'] if row['tokens_input'] is not None else 0,
-                    "tokens_output": row['tokens_output'] if row['tokens_output'] is not None else 0,
-                    "tiempo_respuesta_ms": row['tiempo_respuesta_ms'] if row['tiempo_respuesta_ms'] is not None else 0
-                }
-            else:
-                # SQLite con Row o tupla
-                pregunta_completa = row[4] if row[4] is not None else ""
-                respuesta_completa = row[5] if row[5] is not None else ""
-                result = {
-                    "id_consulta": row[0],
-                    "timestamp": row[1],
-                    "id_usuario": row[2],
-                    "ugel_origen": row[3],
-                    "pregunta_usuario_completa": pregunta_completa,
-                    "pregunta_usuario_truncada": pregunta_completa[:50] + "..." if len(pregunta_completa) > 50 else pregunta_completa,
-                    "respuesta_asistente_completa": respuesta_completa,
-                    "respuesta_asistente_truncada": respuesta_completa[:50] + "..." if len(respuesta_completa) > 50 else respuesta_completa,
-                    "respuesta_es_vacia": bool(row[6]),
-                    "respuesta_util": row[7] if row[7] is not None else "nada",
-                    "tokens_input": row[8] if row[8] is not None else 0,
-                    "tokens_output": row[9] if row[9] is not None else 0,
-                    "tiempo_respuesta_ms": row[10] if row[10] is not None else 0
-                }
-            
-            results.append(result)
-        
-        cursor.close()
-        conn.close()
-        
-        return results
+        db_cursor.execute(final_query, tuple(current_params))
+        rows = db_cursor.fetchall()
+        db_cursor.close()
+
+        hay_mas = len(rows) > limite
+        rows = rows[:limite]
+        cabeceras = {}
+        if hay_mas:
+            ultima = rows[-1]
+            cabeceras["X-Next-Cursor"] = _codificar_cursor(ultima['timestamp'], ultima['id_consulta'])
+
+        return responder_con_etag(request, [_fila_a_consulta_admin(row) for row in rows], etag,
+                                  admin_cache_max_age, cabeceras)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error al obtener consultas filtradas: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            conn.close()
+
+@router.get("/admin/consultas/{id_consulta}", response_model=ConsultaAdminDetalle, summary="Detalle de una consulta")
+async def obtener_consulta_admin(id_consulta: int):
+    """Pregunta y respuesta completas de una consulta (el listado sólo trae el inicio de cada texto)"""
+    conn = None
+    try:
+        conn = get_admin_db_connection()
+        if not conn:
+            logger.error("OBTENER_CONSULTA_ADMIN: No se pudo obtener conexión a la BD.")
+            raise HTTPException(status_code=503, detail="Error de conexión a la base de datos.")
+
+        placeholder = '%s' if hasattr(conn, 'server_version') else '?'
+        db_cursor = conn.cursor()
+        db_cursor.execute(f"""
+            SELECT id_consulta, timestamp, id_usuario, ugel_origen, pregunta_usuario, respuesta_asistente,
+                   respuesta_es_vacia, respuesta_util, tokens_input, tokens_output, tiempo_respuesta_ms,
+                   comentario, id_prompt_usado, modelo_llm_usado, error_detectado, tipo_error, mensaje_error
+            FROM consultas
+            WHERE id_consulta = {placeholder}
+        """, (id_consulta,))
+        row = db_cursor.fetchone()
+        db_cursor.close()
+
+        if not row:
+            raise HTTPException(status_code=404, detail=f"No se encontró la consulta con ID {id_consulta}.")
+        return _fila_a_consulta_admin(row, completa=True)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error al obtener la consulta {id_consulta}: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            conn.close()
+
+def _abrir_exportacion(fecha_desde, fecha_hasta, respuesta_es_vacia, respuesta_util, since_id):
+    """Abre la conexión y ejecuta la consulta de exportación con un cursor de servidor; devuelve (conn, cursor, último id)"""
+    conn = get_admin_db_connection(multihilo=True)
+    if not conn:
+        raise HTTPException(status_code=503, detail="Error de conexión a la base de datos.")
+    try:
+        dialecto = rollup_service.dialecto_de_conexion(conn)
+        placeholder = '%s' if dialecto == 'mysql' else '?'
+        conditions, params = _filtros_consultas_admin(placeholder, fecha_desde, fecha_hasta,
+                                                      respuesta_es_vacia, respuesta_util)
+
+        # Se exporta hasta el último id actual: lo que se inserte mientras tanto queda para el próximo since_id
+        db_cursor = conn.cursor()
+        db_cursor.execute("SELECT MAX(id_consulta) AS ultimo_id FROM consultas")
+        ultimo_id = int(db_cursor.fetchone()['ultimo_id'] or 0)
+        db_cursor.close()
+        conditions.append(f"id_consulta <= {placeholder}")
+        params.append(ultimo_id)
+        if since_id is not None:
+            conditions.append(f"id_consulta > {placeholder}")
+            params.append(since_id)
+
+        query = (f"SELECT {', '.join(exportacion.COLUMNAS_EXPORTACION)} FROM consultas"
+                 f" WHERE {' AND '.join(conditions)} ORDER BY id_consulta")
+        # pymysql: cursor sin buffer (SSDictCursor) para no traer todo el resultado a memoria
+        db_cursor = conn.cursor(pymysql.cursors.SSDictCursor) if dialecto == 'mysql' else conn.cursor()
+        db_cursor.execute(query, tuple(params))
+        return conn, db_cursor, ultimo_id
+    except Exception:
+        conn.close()
+        raise
+
+def _generar_exportacion(conn, db_cursor, formato):
+    """Bloques del archivo exportado; cierra la conexión al terminar o si el cliente corta la descarga"""
+    try:
+        yield from exportacion.generar(formato, db_cursor, exportacion_lote)
+    finally:
+        conn.close()
+        logger.info(f"EXPORTAR_CONSULTAS: exportación {formato} finalizada, conexión cerrada.")
+
+# Exportación para análisis: las filas se leen y se envían de a lotes (memoria constante), con los
+# mismos filtros que el listado. El header X-Ultimo-Id trae el id_consulta hasta el que se exportó:
+# una extracción incremental (p. ej. nocturna) lo pasa como since_id en la siguiente.
+@router.get("/admin/exportar_consultas", summary="Exportar consultas (CSV o Parquet)")
+async def exportar_consultas_admin(
+    formato: str = Query("csv", pattern="^(csv|parquet)$", description="csv o parquet (parquet requiere pyarrow)"),
+    fecha_desde: Optional[str] = Query(None, description="Fecha desde (YYYY-MM-DD)"),
+    fecha_hasta: Optional[str] = Query(None, description="Fecha hasta (YYYY-MM-DD)"),
+    respuesta_es_vacia: Optional[int] = Query(None, description="Filtrar por respuesta vacía (1 para Sí, 0 para No)"),
+    respuesta_util: Optional[str] = Query(None, description="Filtrar por respuesta útil ('si', 'no', 'nada')"),
+    since_id: Optional[int] = Query(None, ge=0, description="Sólo consultas con id_consulta mayor (extracción incremental)")
+):
+    if formato == "parquet" and not exportacion.parquet_disponible():
+        raise HTTPException(status_code=501, detail="Exportación Parquet no disponible: falta instalar pyarrow.")
+
+    try:
+        conn, db_cursor, ultimo_id = await run_in_threadpool(
+            _abrir_exportacion, fecha_desde, fecha_hasta, respuesta_es_vacia, respuesta_util, since_id
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error al iniciar la exportación de consultas: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+    logger.info(f"EXPORTAR_CONSULTAS: formato={formato}, since_id={since_id}, hasta id_consulta={ultimo_id}")
+    nombre_archivo = f"consultas_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    return StreamingResponse(
+        _generar_exportacion(conn, db_cursor, formato),
+        media_type=exportacion.TIPOS_MEDIA[formato],
+        headers={
+            "Content-Disposition": f'attachment; filename="{nombre_archivo}"',
+            "X-Ultimo-Id": str(ultimo_id),
+        },
+    )
 
 @router.post("/feedback", summary="Registrar feedback para una consulta")
 async def handle_feedback(request: FeedbackRequest):
     logger.info("--- INICIO Endpoint /api/feedback ---")
-    logger.info(f"Recibida solicitud de feedback RAW: {request}")
 
     id_consulta = request.id_consulta
     feedback_str = request.feedback_value
@@ -1035,160 +1175,93 @@ async def handle_feedback(request: FeedbackRequest):
 
     # Mapear "me_gusta" a "si" y "no_me_gusta" a "no"
     respuesta_util_valor = "si" if feedback_str == "me_gusta" else "no"
-    logger.info(f"Mapeado a respuesta_util (string): {respuesta_util_valor}")
 
-    conn = None 
+    # Un único UPDATE en el engine compartido (con el rollup diario y el contador de versión en la
+    # misma transacción); rowcount 0 = la consulta no existe
     try:
-        logger.info(f"Intentando obtener conexión a la BD para feedback (id_consulta: {id_consulta})")
-        conn = get_admin_db_connection() 
-        if not conn:
-            logger.error(f"Fallo al conectar a la BD para feedback (id_consulta: {id_consulta})")
-            raise HTTPException(status_code=503, detail="Error de conexión a la base de datos.")
-
-        logger.info(f"Conexión a BD exitosa para feedback (id_consulta: {id_consulta})")
-        
-        # Detectar el tipo de BD real basándose en la conexión, no en la variable de entorno
-        # Esto es importante porque DB_TYPE puede ser 'mysql' pero usar SQLite como fallback
-        db_type_real = "sqlite"  # Por defecto SQLite
-        try:
-            # Método más robusto para detectar el tipo de conexión
-            if hasattr(conn, 'server_version'):  # Atributo específico de pymysql
-                db_type_real = "mysql"
-                logger.info(f"Detectado MySQL con server_version: {conn.server_version}")
-            elif str(type(conn)).find('sqlite') != -1:  # Verificar si es SQLite
-                db_type_real = "sqlite"
-                logger.info(f"Detectado SQLite: {type(conn)}")
-            elif hasattr(conn, 'get_server_info'):  # Método alternativo para MySQL
-                db_type_real = "mysql"
-                logger.info(f"Detectado MySQL con get_server_info: {conn.get_server_info()}")
-        except Exception as detect_error:
-            logger.warning(f"Error al detectar tipo de BD, usando SQLite por defecto: {detect_error}")
-            db_type_real = "sqlite"  # Fallback a SQLite
-            
-        logger.info(f"Tipo de BD real detectado: {db_type_real}")
-
-        cursor = conn.cursor()
+        actualizada = await run_in_threadpool(actualizar_feedback, id_consulta, respuesta_util_valor)
+    except Exception as e:
+        logger.error(f"Error EXCEPCIÓN GENERAL al actualizar feedback para id_consulta {id_consulta}: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor al procesar feedback: {str(e)}")
 
-        # Primero verificar si existe la consulta
-        if db_type_real == 'mysql':
-            check_query = "SELECT id_consulta FROM consultas WHERE id_consulta = %s"
-            logger.info(f"Ejecutando query de verificación MySQL: {check_query} con parámetro: {id_consulta}")
-            cursor.execute(check_query, (id_consulta,))
-        else:  # sqlite
-            check_query = "SELECT id_consulta FROM consultas WHERE id_consulta = ?"
-            logger.info(f"Ejecutando query de verificación SQLite: {check_query} con parámetro: {id_consulta}")
-            cursor.execute(check_query, (id_consulta,))
-        
-        existing_record = cursor.fetchone()
-        logger.info(f"Resultado de verificación: {existing_record}")
-        
-        if not existing_record:
-            logger.warning(f"No se encontró consulta con id_consulta={id_consulta}")
-            raise HTTPException(status_code=404, detail=f"No se encontró la consulta con ID {id_consulta}.")
+    if not actualizada:
+        logger.warning(f"No se encontró consulta con id_consulta={id_consulta}")
+        raise HTTPException(status_code=404, detail=f"No se encontró la consulta con ID {id_consulta}.")
 
-        logger.info(f"Consulta {id_consulta} encontrada, procediendo con el update")
+    # Las estadísticas memoizadas en este proceso ya no corresponden a los datos
+    cache_estadisticas.invalidar()
 
-        # Realizar el UPDATE
-        if db_type_real == 'mysql':
-            sql_update_query = """
-                UPDATE consultas
-                SET respuesta_util = %s
-                WHERE id_consulta = %s
-            """
-            params_tuple = (respuesta_util_valor, id_consulta)
-        else:  # sqlite
-            sql_update_query = """
-                UPDATE consultas
-                SET respuesta_util = ?
-                WHERE id_consulta = ?
-            """
-            params_tuple = (respuesta_util_valor, id_consulta)
-        
-        logger.info(f"Ejecutando UPDATE para feedback (id_consulta: {id_consulta}): Query: {sql_update_query.strip()} con Params: {params_tuple}")
-        
-        try:
-            cursor.execute(sql_update_query, params_tuple)
-            rows_affected = cursor.rowcount if hasattr(cursor, 'rowcount') else 1
-            logger.info(f"Filas afectadas por el UPDATE: {rows_affected}")
-            
-            # Commit de la transacción
-            conn.commit()
-            logger.info(f"Commit de la transacción realizado para feedback (id_consulta: {id_consulta})")
-            
-        except Exception as update_error:
-            logger.error(f"Error durante el UPDATE: {update_error}")
-            logger.error(traceback.format_exc())
-            raise
+    logger.info(f"Feedback actualizado correctamente para id_consulta: {id_consulta} ({respuesta_util_valor})")
+    return {
+        "status": "success",
+        "message": "Gracias por tu opinión!",
+        "id_consulta": id_consulta,
+        "respuesta_util_actualizada": respuesta_util_valor,
+        "db_type": obtener_engine().dialect.name
+    }
 
-        # Verificar que el update fue exitoso consultando el registro actualizado
-        if db_type_real == 'mysql':
-            verify_query = "SELECT respuesta_util FROM consultas WHERE id_consulta = %s"
-            logger.info(f"Ejecutando query de verificación MySQL: {verify_query} con parámetro: {id_consulta}")
-            cursor.execute(verify_query, (id_consulta,))
-        else:  # sqlite
-            verify_query = "SELECT respuesta_util FROM consultas WHERE id_consulta = ?"
-            logger.info(f"Ejecutando query de verificación SQLite: {verify_query} con parámetro: {id_consulta}")
-            cursor.execute(verify_query, (id_consulta,))
-        
-        updated_record = cursor.fetchone()
-        logger.info(f"Resultado de verificación después del update: {updated_record}")
-        
-        if updated_record:
-            if isinstance(updated_record, dict):  # MySQL
-                actual_value = updated_record['respuesta_util']
-                logger.info(f"Valor extraído de dict (MySQL): {actual_value}")
-            else:  # SQLite
-                actual_value = updated_record[0] if isinstance(updated_record, tuple) else updated_record['respuesta_util']
-                logger.info(f"Valor extraído de row (SQLite): {actual_value}")
-            
-            logger.info(f"Verificación: respuesta_util actualizada a '{actual_value}' para id_consulta: {id_consulta}")
-            
-            if actual_value == respuesta_util_valor:
-                logger.info(f"Feedback actualizado correctamente para id_consulta: {id_consulta}")
-                return {
-                    "status": "success", 
-                    "message": "Gracias por tu opinión!", 
-                    "id_consulta": id_consulta, 
-                    "respuesta_util_actualizada": respuesta_util_valor,
-                    "db_type": db_type_real  # Agregar para debugging
-                }
-            else:
-                logger.error(f"Error: el valor no se actualizó correctamente. Esperado: {respuesta_util_valor}, Actual: {actual_value}")
-                raise HTTPException(status_code=500, detail="Error al actualizar el feedback en la base de datos.")
+# Feedback de muchas consultas a la vez (revisión de fin de turno, encuestas): una transacción con
+# un executemany del UPDATE. Los ítems inválidos, repetidos o inexistentes no frenan al resto: cada
+# uno recibe su resultado, en el orden en que llegó.
+@router.post("/feedback/batch", summary="Registrar feedback de varias consultas")
+async def handle_feedback_lote(items: List[FeedbackLoteItem]):
+    logger.info(f"--- INICIO Endpoint /api/feedback/batch ({len(items)} ítems) ---")
+
+    if not items:
+        raise HTTPException(status_code=400, detail="El lote de feedback está vacío.")
+    if len(items) > feedback_lote_maximo:
+        raise HTTPException(status_code=400, detail=f"El lote no puede superar {feedback_lote_maximo} ítems.")
+
+    resultados = [None] * len(items)
+    validos = {}  # id_consulta -> posición del último ítem válido con ese id
+    for posicion, item in enumerate(items):
+        comentario = (item.comentario or "").strip() or None
+        if item.feedback_value not in ["me_gusta", "no_me_gusta"]:
+            resultados[posicion] = {"id_consulta": item.id_consulta, "estado": "invalido",
+                                    "detalle": "Valor de feedback no válido. Use 'me_gusta' o 'no_me_gusta'."}
+        elif comentario and len(comentario) > 255:
+            resultados[posicion] = {"id_consulta": item.id_consulta, "estado": "invalido",
+                                    "detalle": "El comentario no puede exceder 255 caracteres."}
         else:
-            logger.error(f"Error: no se pudo verificar la actualización para id_consulta: {id_consulta}")
-            raise HTTPException(status_code=500, detail="Error al verificar la actualización del feedback.")
-
-    except HTTPException as http_exc:
-        logger.error(f"HTTPException en /api/feedback (id_consulta: {id_consulta}): {http_exc.detail}")
-        raise http_exc 
+            if item.id_consulta in validos:
+                anterior = validos[item.id_consulta]
+                resultados[anterior] = {"id_consulta": item.id_consulta, "estado": "duplicado",
+                                        "detalle": "id_consulta repetido en el lote: se aplica el último."}
+            validos[item.id_consulta] = posicion
+            resultados[posicion] = {"id_consulta": item.id_consulta, "estado": "pendiente",
+                                    "respuesta_util": "si" if item.feedback_value == "me_gusta" else "no",
+                                    "comentario": comentario}
+
+    pendientes = [resultados[posicion] for posicion in validos.values()]
+    try:
+        actualizadas = await run_in_threadpool(
+            actualizar_feedback_lote,
+            [(r["id_consulta"], r["respuesta_util"], r["comentario"]) for r in pendientes]
+        )
     except Exception as e:
-        if conn:
-            logger.info(f"Realizando rollback debido a excepción en /api/feedback (id_consulta: {id_consulta})")
-            try:
-                conn.rollback()
-                logger.info("Rollback completado")
-            except Exception as rollback_error:
-                logger.error(f"Error durante rollback: {rollback_error}")
-        
-        logger.error(f"Error EXCEPCIÓN GENERAL al actualizar feedback para id_consulta {id_consulta}: {str(e)}")
+        logger.error(f"Error EXCEPCIÓN GENERAL al actualizar el lote de feedback: {str(e)}")
         logger.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Error interno del servidor al procesar feedback: {str(e)}")
-    finally:
-        if conn:
-            try:
-                if hasattr(conn, 'cursor') and cursor:
-                    cursor.close()
-                    logger.info("Cursor cerrado")
-            except Exception as close_error:
-                logger.error(f"Error al cerrar cursor: {close_error}")
-            try:
-                conn.close()
-                logger.info("Conexión cerrada")
-            except Exception as close_error:
-                logger.error(f"Error al cerrar conexión: {close_error}")
-            logger.info(f"Conexión a BD (feedback) cerrada para id_consulta: {id_consulta}")
-        logger.info("--- FIN Endpoint /api/feedback ---")
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor al procesar el lote de feedback: {str(e)}")
+
+    for resultado in pendientes:
+        del resultado["comentario"]
+        if resultado["id_consulta"] in actualizadas:
+            resultado["estado"] = "actualizado"
+        else:
+            resultado["estado"] = "no_encontrado"
+            resultado["detalle"] = f"No se encontró la consulta con ID {resultado['id_consulta']}."
+
+    if actualizadas:
+        # Las estadísticas memoizadas en este proceso ya no corresponden a los datos
+        cache_estadisticas.invalidar()
+
+    logger.info(f"Lote de feedback: {len(actualizadas)} de {len(items)} ítems actualizados")
+    return {
+        "status": "success",
+        "actualizadas": len(actualizadas),
+        "resultados": resultados
+    }
 
 # Clase para el formato de datos de estadísticas
 class EstadisticasResponse(BaseModel):
@@ -1205,10 +1278,10 @@ class RespuestaUtilChartResponse(BaseModel):
     values: List[int]
 
 # Endpoint para obtener las UGELs disponibles
-@router.get("/admin/ugels_disponibles", response_model=List[str], summary="Obtener UGELs Disponibles")
-async def obtener_ugels_disponibles():
+def cargar_ugls_disponibles():
     """
-    Obtiene la lista de UGELs únicas registradas en la base de datos
+    UGL de los usuarios y de las consultas registradas. Lee consultas_diarias si existe (mucho
+    más chica que consultas); si no, el DISTINCT sobre consultas usa el índice (ugel_origen, timestamp).
     """
     conn = get_admin_db_connection()
     if not conn:
@@ -1216,49 +1289,57 @@ async def obtener_ugels_disponibles():
 
     try:
         cursor = conn.cursor()
-        
-        query = """
-            SELECT DISTINCT ugel_origen 
-            FROM consultas 
-            WHERE ugel_origen IS NOT NULL AND ugel_origen != ''
-            ORDER BY ugel_origen
-        """
-        
-        cursor.execute(query)
-        ugels_raw = cursor.fetchall()
-        
-        # Extraer los valores de UGEL del resultado
-        ugels_list = []
-        for row in ugels_raw:
-            if isinstance(row, dict):  # Para MySQL (DictCursor)
-                ugel = row.get('ugel_origen')
-            else:  # Para SQLite (Row)
-                ugel = row['ugel_origen']
-                
-            if ugel and ugel not in ugels_list:
-                ugels_list.append(ugel)
-                
-        return ugels_list
-        
+        dialecto = rollup_service.dialecto_de_conexion(conn)
+        if rollup_service.rollup_disponible(cursor, dialecto):
+            origen_consultas = f"SELECT DISTINCT ugel_origen FROM consultas_diarias WHERE ugel_origen != '{rollup_service.SIN_UGEL}'"
+        else:
+            origen_consultas = "SELECT DISTINCT ugel_origen FROM consultas WHERE ugel_origen IS NOT NULL AND ugel_origen != ''"
+
+        cursor.execute(f"""
+            SELECT ugel_origen FROM usuarios WHERE ugel_origen IS NOT NULL AND ugel_origen != ''
+            UNION
+            {origen_consultas}
+        """)
+        ugels = []
+        for row in cursor.fetchall():
+            ugel = row.get('ugel_origen') if isinstance(row, dict) else row['ugel_origen']
+            if ugel:
+                ugels.append(ugel)
+        return ugels
+    finally:
+        conn.close()
+        logger.info("Conexión a BD (admin) cerrada.")
+
+
+@router.get("/admin/ugels_disponibles", response_model=List[str], summary="Obtener UGELs Disponibles")
+async def obtener_ugels_disponibles(request: Request):
+    """
+    Obtiene la lista de UGELs conocidas (usuarios y consultas registradas).
+    Se sirve desde el registro en memoria con ETag y Cache-Control: el navegador la reutiliza
+    durante UGLS_MAX_AGE segundos y luego sólo recibe un 304 si no cambió.
+    """
+    try:
+        ugels_list, etag = await run_in_threadpool(registro_ugl.obtener, cargar_ugls_disponibles)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error al obtener UGELs disponibles: {e}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
-            logger.info("Conexión a BD (admin) cerrada.")
+
+    return responder_con_etag(request, ugels_list, etag, max_age=ugls_max_age)
 
 # Endpoint para obtener estadísticas de respuesta_util para el gráfico
 @router.get("/admin/stats/respuesta_util_por_fecha", response_model=RespuestaUtilChartResponse, summary="Estadísticas de Utilidad de Respuesta por Fecha")
 async def obtener_stats_respuesta_util(
+    request: Request,
     fecha_desde: Optional[str] = Query(None, description="Fecha desde (YYYY-MM-DD)"),
     fecha_hasta: Optional[str] = Query(None, description="Fecha hasta (YYYY-MM-DD)")
 ):
     """
     Obtiene la cuenta de cada valor en `respuesta_util` para un rango de fechas.
     Diseñado para ser consumido por un gráfico de barras en el frontend.
-    Devuelve los datos agrupados listos para Chart.js.
+    Devuelve los datos agrupados listos para Chart.js, con ETag (304 si los datos no cambiaron).
     """
     conn = get_admin_db_connection()
     if not conn:
@@ -1267,35 +1348,38 @@ async def obtener_stats_respuesta_util(
 
     try:
         cursor = conn.cursor()
-        db_type_admin = os.getenv('DB_TYPE', 'sqlite')
-        logger.info(f"STATS_RESPUESTA_UTIL: Iniciando consulta. DB_TYPE: {db_type_admin}")
+
+        dialecto = rollup_service.dialecto_de_conexion(conn)
+        validar_fechas_filtro(fecha_desde, fecha_hasta)
+        etag = version_datos.etag_version("utilidad", version_datos.version_consultas(cursor, dialecto))
+        respuesta_304 = no_modificado(request, etag, admin_cache_max_age)
+        if respuesta_304 is not None:
+            return respuesta_304
+
+        # Con la tabla de agregados diarios se responde sin recorrer consultas
+        if usar_rollup_estadisticas and rollup_service.rollup_disponible(cursor, dialecto):
+            labels, values = rollup_service.conteo_utilidad(cursor, dialecto, fecha_desde, fecha_hasta)
+            return responder_con_etag(request, RespuestaUtilChartResponse(labels=labels, values=values), etag, admin_cache_max_age)
+
+        # Marcador según la conexión abierta (puede ser SQLite de respaldo aunque DB_TYPE sea mysql)
+        placeholder = '%s' if dialecto == 'mysql' else '?'
+        logger.info(f"STATS_RESPUESTA_UTIL: Iniciando consulta. Dialecto: {dialecto}")
 
         filtros_sql = []
-        params_sql = {} 
-        params_list_sql = []
+        params_sql = []
 
         if fecha_desde:
             try:
-                fecha_desde_dt = datetime.datetime.strptime(fecha_desde, '%Y-%m-%d').strftime('%Y-%m-%d 00:00:00')
-                if db_type_admin == 'mysql':
-                    filtros_sql.append("timestamp >= %(fecha_desde)s")
-                    params_sql['fecha_desde'] = fecha_desde_dt
-                else: 
-                    filtros_sql.append("timestamp >= ?")
-                    params_list_sql.append(fecha_desde_dt)
+                filtros_sql.append(f"timestamp >= {placeholder}")
+                params_sql.append(inicio_rango_fecha(fecha_desde))
             except ValueError:
                 logger.warning(f"STATS_RESPUESTA_UTIL: Formato de fecha_desde inválido: {fecha_desde}")
                 raise HTTPException(status_code=400, detail="Formato de fecha_desde inválido. Usar YYYY-MM-DD.")
 
         if fecha_hasta:
             try:
-                fecha_hasta_dt = datetime.datetime.strptime(fecha_hasta, '%Y-%m-%d').strftime('%Y-%m-%d 23:59:59')
-                if db_type_admin == 'mysql':
-                    filtros_sql.append("timestamp <= %(fecha_hasta)s")
-                    params_sql['fecha_hasta'] = fecha_hasta_dt
-                else: 
-                    filtros_sql.append("timestamp <= ?")
-                    params_list_sql.append(fecha_hasta_dt)
+                filtros_sql.append(f"timestamp < {placeholder}")
+                params_sql.append(fin_rango_fecha(fecha_hasta))
             except ValueError:
                 logger.warning(f"STATS_RESPUESTA_UTIL: Formato de fecha_hasta inválido: {fecha_hasta}")
                 raise HTTPException(status_code=400, detail="Formato de fecha_hasta inválido. Usar YYYY-MM-DD.")
@@ -1316,12 +1400,8 @@ async def obtener_stats_respuesta_util(
         # Se agrega LOWER() para unificar 'si', 'Si', 'SI', etc. y COALESCE para agrupar nulos.
 
         logger.info(f"STATS_RESPUESTA_UTIL: Query: {query_stats}")
-        if db_type_admin == 'mysql':
-            logger.info(f"STATS_RESPUESTA_UTIL: Params (MySQL): {params_sql}")
-            cursor.execute(query_stats, params_sql)
-        else:
-            logger.info(f"STATS_RESPUESTA_UTIL: Params (SQLite): {tuple(params_list_sql)}")
-            cursor.execute(query_stats, tuple(params_list_sql))
+        logger.info(f"STATS_RESPUESTA_UTIL: Params: {tuple(params_sql)}")
+        cursor.execute(query_stats, tuple(params_sql))
             
         results = cursor.fetchall()
 
@@ -1336,7 +1416,7 @@ async def obtener_stats_respuesta_util(
                 values.append(value_from_db)
         
         logger.info(f"STATS_RESPUESTA_UTIL: Resultados para gráfico: Labels: {labels}, Values: {values}")
-        return RespuestaUtilChartResponse(labels=labels, values=values)
+        return responder_con_etag(request, RespuestaUtilChartResponse(labels=labels, values=values), etag, admin_cache_max_age)
 
     except HTTPException as http_exc: # Re-lanzar HTTPExceptions para que FastAPI las maneje
         logger.error(f"STATS_RESPUESTA_UTIL: HTTPException: {http_exc.detail}")
@@ -1350,15 +1430,14 @@ async def obtener_stats_respuesta_util(
             conn.close()
             logger.info("STATS_RESPUESTA_UTIL: Conexión a BD cerrada.")
 
-# Endpoint para obtener estadísticas generales
-@router.get("/admin/estadisticas", response_model=EstadisticasResponse, summary="Obtener Estadísticas Generales")
-async def obtener_estadisticas(
-    fecha_desde: Optional[str] = Query(None, description="Fecha desde (YYYY-MM-DD)"),
-    fecha_hasta: Optional[str] = Query(None, description="Fecha hasta (YYYY-MM-DD)"),
-    ugel_origen: Optional[str] = Query(None, description="UGEL origen específica")
-):
+# Estadísticas generales memoizadas por combinación de filtros (por proceso)
+cache_estadisticas = CacheTTL("estadisticas", ttl=estadisticas_cache_ttl)
+
+def calcular_estadisticas(fecha_desde=None, fecha_hasta=None, ugel_origen=None):
     """
-    Obtiene estadísticas basadas en los filtros aplicados
+    Estadísticas generales en una sola consulta: desde consultas_diarias si existe; si no, una
+    pasada sobre consultas con agregación condicional agrupada por UGL (el total, los tokens y los
+    desgloses de utilidad y respuesta vacía se suman en Python sobre esos grupos).
     """
     conn = get_admin_db_connection()
     if not conn:
@@ -1366,220 +1445,116 @@ async def obtener_estadisticas(
 
     try:
         cursor = conn.cursor()
-        
-        # Construir condiciones de filtrado
-        filtros_sql = []
-        params_sql = {}  # Para MySQL
-        params_list_sql = []  # Para SQLite
 
-        db_type_admin = os.getenv('DB_TYPE', 'sqlite')
+        # Con la tabla de agregados diarios se responde sin recorrer consultas
+        dialecto = rollup_service.dialecto_de_conexion(conn)
+        if usar_rollup_estadisticas and rollup_service.rollup_disponible(cursor, dialecto):
+            return rollup_service.estadisticas(cursor, dialecto, fecha_desde, fecha_hasta, ugel_origen)
 
-        # Construir filtros
+        placeholder = '%s' if dialecto == 'mysql' else '?'
+        filtros_sql = []
+        params_sql = []
         if fecha_desde:
-            try:
-                fecha_desde_dt = datetime.datetime.strptime(fecha_desde, '%Y-%m-%d').strftime('%Y-%m-%d 00:00:00')
-                if db_type_admin == 'mysql':
-                    filtros_sql.append("timestamp >= %(fecha_desde)s")
-                    params_sql['fecha_desde'] = fecha_desde_dt
-                else:  # sqlite
-                    filtros_sql.append("timestamp >= ?")
-                    params_list_sql.append(fecha_desde_dt)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Formato de fecha_desde inválido. Usar YYYY-MM-DD.")
-
+            filtros_sql.append(f"timestamp >= {placeholder}")
+            params_sql.append(inicio_rango_fecha(fecha_desde))
         if fecha_hasta:
-            try:
-                fecha_hasta_dt = datetime.datetime.strptime(fecha_hasta, '%Y-%m-%d').strftime('%Y-%m-%d 23:59:59')
-                if db_type_admin == 'mysql':
-                    filtros_sql.append("timestamp <= %(fecha_hasta)s")
-                    params_sql['fecha_hasta'] = fecha_hasta_dt
-                else:  # sqlite
-                    filtros_sql.append("timestamp <= ?")
-                    params_list_sql.append(fecha_hasta_dt)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Formato de fecha_hasta inválido. Usar YYYY-MM-DD.")
-                
+            filtros_sql.append(f"timestamp < {placeholder}")
+            params_sql.append(fin_rango_fecha(fecha_hasta))
         if ugel_origen:
-            if db_type_admin == 'mysql':
-                filtros_sql.append("ugel_origen = %(ugel_origen)s")
-                params_sql['ugel_origen'] = ugel_origen
-            else:  # sqlite
-                filtros_sql.append("ugel_origen = ?")
-                params_list_sql.append(ugel_origen)
-                
-        # Crear cláusula WHERE si hay filtros
-        where_clause = ""
-        if filtros_sql:
-            where_clause = " WHERE " + " AND ".join(filtros_sql)
-        
-        # 1. Contar total de preguntas
-        query_total = f"SELECT COUNT(*) as total FROM consultas{where_clause}"
-        
-        if db_type_admin == 'mysql':
-            cursor.execute(query_total, params_sql)
-        else:
-            cursor.execute(query_total, tuple(params_list_sql))
-            
-        total_result = cursor.fetchone()
-        total_preguntas = total_result['total'] if isinstance(total_result, dict) else total_result[0]
-        
-        # 2. Sumar tokens
-        query_tokens = f"""
-            SELECT 
-                SUM(COALESCE(tokens_input, 0)) as total_input,
-                SUM(COALESCE(tokens_output, 0)) as total_output
-            FROM consultas
-            {where_clause}
-        """
-        
-        if db_type_admin == 'mysql':
-            cursor.execute(query_tokens, params_sql)
-        else:
-            cursor.execute(query_tokens, tuple(params_list_sql))
-            
-        tokens_result = cursor.fetchone()
-        
-        if isinstance(tokens_result, dict):
-            total_tokens_input = tokens_result['total_input'] or 0
-            total_tokens_output = tokens_result['total_output'] or 0
-        else:
-            total_tokens_input = tokens_result[0] or 0
-            total_tokens_output = tokens_result[1] or 0
-        
-        # 3. Estadísticas de utilidad
-        query_utilidad = f"""
-            SELECT 
-                respuesta_util,
-                COUNT(*) as cantidad
-            FROM consultas
-            {where_clause}
-            GROUP BY respuesta_util
-        """
-        
-        if db_type_admin == 'mysql':
-            cursor.execute(query_utilidad, params_sql)
-        else:
-            cursor.execute(query_utilidad, tuple(params_list_sql))
-            
-        utilidad_results = cursor.fetchall()
-        
-        # Inicializar contadores
-        utilidad_si = 0
-        utilidad_no = 0
-        utilidad_sin_clasificar = 0
-        
-        for row in utilidad_results:
-            if isinstance(row, dict):
-                util_val = row['respuesta_util']
-                cantidad = row['cantidad']
-            else:
-                util_val = row[0]
-                cantidad = row[1]
-                
-            if util_val == 'si':
-                utilidad_si = cantidad
-            elif util_val == 'no':
-                utilidad_no = cantidad
-            else:
-                utilidad_sin_clasificar += cantidad
-        
-        # 4. Estadísticas de respuestas vacías
-        query_vacia = f"""
-            SELECT 
-                respuesta_es_vacia,
-                COUNT(*) as cantidad
-            FROM consultas
-            {where_clause}
-            GROUP BY respuesta_es_vacia
-        """
-        
-        if db_type_admin == 'mysql':
-            cursor.execute(query_vacia, params_sql)
-        else:
-            cursor.execute(query_vacia, tuple(params_list_sql))
-            
-        vacia_results = cursor.fetchall()
-        
-        # Inicializar contadores
-        vacia_si = 0
-        vacia_no = 0
-        vacia_sin_clasificar = 0
-        
-        for row in vacia_results:
-            if isinstance(row, dict):
-                vacia_val = row['respuesta_es_vacia']
-                cantidad = row['cantidad']
-            else:
-                vacia_val = row[0]
-                cantidad = row[1]
-                
-            if vacia_val == 1:
-                vacia_si = cantidad
-            elif vacia_val == 0:
-                vacia_no = cantidad
-            else:
-                vacia_sin_clasificar += cantidad
-        
-        # 5. Preguntas por UGEL
-        query_ugel = f"""
-            SELECT 
-                COALESCE(ugel_origen, 'Sin UGEL') as ugel,
-                COUNT(*) as cantidad
+            filtros_sql.append(f"ugel_origen = {placeholder}")
+            params_sql.append(ugel_origen)
+        where_clause = " WHERE " + " AND ".join(filtros_sql) if filtros_sql else ""
+
+        query = f"""
+            SELECT
+                COALESCE(ugel_origen, 'Sin UGEL') AS ugel,
+                COUNT(*) AS cantidad,
+                SUM(COALESCE(tokens_input, 0)) AS total_input,
+                SUM(COALESCE(tokens_output, 0)) AS total_output,
+                SUM(CASE WHEN respuesta_util = 'si' THEN 1 ELSE 0 END) AS utilidad_si,
+                SUM(CASE WHEN respuesta_util = 'no' THEN 1 ELSE 0 END) AS utilidad_no,
+                SUM(CASE WHEN respuesta_es_vacia = 1 THEN 1 ELSE 0 END) AS vacia_si,
+                SUM(CASE WHEN respuesta_es_vacia = 0 THEN 1 ELSE 0 END) AS vacia_no
             FROM consultas
             {where_clause}
             GROUP BY ugel_origen
-            ORDER BY cantidad DESC
         """
-        
-        if db_type_admin == 'mysql':
-            cursor.execute(query_ugel, params_sql)
-        else:
-            cursor.execute(query_ugel, tuple(params_list_sql))
-            
-        ugel_results = cursor.fetchall()
-        
+        cursor.execute(query, tuple(params_sql))
+
+        totales = dict.fromkeys(("cantidad", "total_input", "total_output", "utilidad_si", "utilidad_no", "vacia_si", "vacia_no"), 0)
         ugel_data = []
-        for row in ugel_results:
-            if isinstance(row, dict):
-                ugel_nombre = row['ugel'] or 'Sin definir'
-                cantidad = row['cantidad']
-            else:
-                ugel_nombre = row[0] or 'Sin definir'
-                cantidad = row[1]
-                
-            ugel_data.append({
-                "ugel": ugel_nombre,
-                "cantidad": cantidad
-            })
-        
-        # Construir la respuesta final
-        respuesta = {
-            "total_preguntas": total_preguntas,
-            "total_tokens_input": total_tokens_input,
-            "total_tokens_output": total_tokens_output,
+        for row in cursor.fetchall():
+            for campo in totales:
+                totales[campo] += int(row[campo] or 0)
+            ugel_data.append({"ugel": row['ugel'] or 'Sin definir', "cantidad": int(row['cantidad'])})
+        ugel_data.sort(key=lambda item: -item["cantidad"])
+
+        return {
+            "total_preguntas": totales["cantidad"],
+            "total_tokens_input": totales["total_input"],
+            "total_tokens_output": totales["total_output"],
             "utilidad": {
-                "si": utilidad_si,
-                "no": utilidad_no,
-                "sin_clasificar": utilidad_sin_clasificar
+                "si": totales["utilidad_si"],
+                "no": totales["utilidad_no"],
+                "sin_clasificar": totales["cantidad"] - totales["utilidad_si"] - totales["utilidad_no"]
             },
             "respuesta_vacia": {
-                "si": vacia_si,
-                "no": vacia_no,
-                "sin_clasificar": vacia_sin_clasificar
+                "si": totales["vacia_si"],
+                "no": totales["vacia_no"],
+                "sin_clasificar": totales["cantidad"] - totales["vacia_si"] - totales["vacia_no"]
             },
             "ugel_preguntas": ugel_data
         }
-        
-        return respuesta
-        
+    finally:
+        conn.close()
+
+def version_consultas_actual():
+    """Versión de los datos de consultas (ver app/services/version_datos.py), con una conexión propia"""
+    conn = get_admin_db_connection()
+    if not conn:
+        raise HTTPException(status_code=503, detail="No se pudo conectar a la base de datos para admin.")
+    try:
+        return version_datos.version_consultas(conn.cursor(), rollup_service.dialecto_de_conexion(conn))
+    finally:
+        conn.close()
+
+# Endpoint para obtener estadísticas generales
+@router.get("/admin/estadisticas", response_model=EstadisticasResponse, summary="Obtener Estadísticas Generales")
+async def obtener_estadisticas(
+    request: Request,
+    fecha_desde: Optional[str] = Query(None, description="Fecha desde (YYYY-MM-DD)"),
+    fecha_hasta: Optional[str] = Query(None, description="Fecha hasta (YYYY-MM-DD)"),
+    ugel_origen: Optional[str] = Query(None, description="UGEL origen específica")
+):
+    """
+    Obtiene estadísticas basadas en los filtros aplicados.
+    Lleva un ETag con la versión de los datos: si el navegador ya la tiene se responde 304. El
+    resultado calculado se memoiza por versión y combinación de filtros (ESTADISTICAS_CACHE_TTL
+    segundos; sin tabla de contadores, la versión no existe y el memo puede atrasar ese tiempo).
+    """
+    validar_fechas_filtro(fecha_desde, fecha_hasta)
+    filtros = (fecha_desde or None, fecha_hasta or None, ugel_origen or None)
+
+    try:
+        version = await run_in_threadpool(version_consultas_actual)
+        etag = version_datos.etag_version("estadisticas", version)
+        respuesta_304 = no_modificado(request, etag, admin_cache_max_age)
+        if respuesta_304 is not None:
+            return respuesta_304
+
+        clave = (version,) + filtros
+        respuesta = cache_estadisticas.obtener(clave)
+        if respuesta is None:
+            respuesta = await run_in_threadpool(calcular_estadisticas, *filtros)
+            cache_estadisticas.guardar(clave, respuesta)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error al obtener estadísticas: {e}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
-            logger.info("Conexión a BD (admin) cerrada.")
+
+    return responder_con_etag(request, respuesta, etag, admin_cache_max_age)
 
 # Modelo Pydantic para la respuesta de estadísticas diarias
 class EstadisticasDiariasResponse(BaseModel):
@@ -1588,11 +1563,12 @@ class EstadisticasDiariasResponse(BaseModel):
 
 @router.get("/admin/stats/registros_por_dia", response_model=List[EstadisticasDiariasResponse])
 async def obtener_stats_diarias(
+    request: Request,
     fecha_desde: Optional[str] = Query(None, description="Fecha desde (YYYY-MM-DD)"),
     fecha_hasta: Optional[str] = Query(None, description="Fecha hasta (YYYY-MM-DD)")
 ):
     """
-    Obtiene la cantidad de registros por día para un rango de fechas.
+    Obtiene la cantidad de registros por día para un rango de fechas, con ETag (304 si los datos no cambiaron).
     """
     conn = get_admin_db_connection()
     if not conn:
@@ -1600,34 +1576,37 @@ async def obtener_stats_diarias(
 
     try:
         cursor = conn.cursor()
-        db_type = os.getenv('DB_TYPE', 'sqlite')
-        
+
+        dialecto = rollup_service.dialecto_de_conexion(conn)
+        validar_fechas_filtro(fecha_desde, fecha_hasta)
+        etag = version_datos.etag_version("por-dia", version_datos.version_consultas(cursor, dialecto))
+        respuesta_304 = no_modificado(request, etag, admin_cache_max_age)
+        if respuesta_304 is not None:
+            return respuesta_304
+
+        # Con la tabla de agregados diarios se responde sin recorrer consultas
+        if usar_rollup_estadisticas and rollup_service.rollup_disponible(cursor, dialecto):
+            stats_diarias = rollup_service.registros_por_dia(cursor, dialecto, fecha_desde, fecha_hasta)
+            return responder_con_etag(request, stats_diarias, etag, admin_cache_max_age)
+
+        # Marcador según la conexión abierta (puede ser SQLite de respaldo aunque DB_TYPE sea mysql)
+        placeholder = '%s' if dialecto == 'mysql' else '?'
+
         # Construir filtros
         filtros_sql = []
-        params_sql = {}  # Para MySQL
-        params_list_sql = []  # Para SQLite
+        params_sql = []
 
         if fecha_desde:
             try:
-                fecha_desde_dt = datetime.datetime.strptime(fecha_desde, '%Y-%m-%d').strftime('%Y-%m-%d 00:00:00')
-                if db_type == 'mysql':
-                    filtros_sql.append("timestamp >= %(fecha_desde)s")
-                    params_sql['fecha_desde'] = fecha_desde_dt
-                else:  # sqlite
-                    filtros_sql.append("timestamp >= ?")
-                    params_list_sql.append(fecha_desde_dt)
+                filtros_sql.append(f"timestamp >= {placeholder}")
+                params_sql.append(inicio_rango_fecha(fecha_desde))
             except ValueError:
                 raise HTTPException(status_code=400, detail="Formato de fecha_desde inválido. Usar YYYY-MM-DD.")
 
         if fecha_hasta:
             try:
-                fecha_hasta_dt = datetime.datetime.strptime(fecha_hasta, '%Y-%m-%d').strftime('%Y-%m-%d 23:59:59')
-                if db_type == 'mysql':
-                    filtros_sql.append("timestamp <= %(fecha_hasta)s")
-                    params_sql['fecha_hasta'] = fecha_hasta_dt
-                else:  # sqlite
-                    filtros_sql.append("timestamp <= ?")
-                    params_list_sql.append(fecha_hasta_dt)
+                filtros_sql.append(f"timestamp < {placeholder}")
+                params_sql.append(fin_rango_fecha(fecha_hasta))
             except ValueError:
                 raise HTTPException(status_code=400, detail="Formato de fecha_hasta inválido. Usar YYYY-MM-DD.")
 
@@ -1637,7 +1616,7 @@ async def obtener_stats_diarias(
             where_clause = " WHERE " + " AND ".join(filtros_sql)
 
         # Query adaptada según el tipo de base de datos
-        if db_type == 'mysql':
+        if dialecto == 'mysql':
             query = f"""
                 SELECT DATE(timestamp) as fecha, COUNT(*) as cantidad
                 FROM consultas
@@ -1654,10 +1633,7 @@ async def obtener_stats_diarias(
                 ORDER BY fecha ASC
             """
 
-        if db_type == 'mysql':
-            cursor.execute(query, params_sql)
-        else:
-            cursor.execute(query, tuple(params_list_sql))
+        cursor.execute(query, tuple(params_sql))
 
         resultados = cursor.fetchall()
         
@@ -1680,8 +1656,10 @@ async def obtener_stats_diarias(
                 "cantidad": cantidad
             })
 
-        return stats_diarias
+        return responder_con_etag(request, stats_diarias, etag, admin_cache_max_age)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error al obtener estadísticas diarias: {e}")
         logger.error(traceback.format_exc())
@@ -1721,16 +1699,19 @@ async def basic_status():
         # Hacer verificaciones básicas
         uvicorn_check = checker.check_uvicorn_status()
         qdrant_check = checker.check_qdrant_connection()
+        circuitos_abiertos = [circuito.nombre for circuito in circuitos if circuito.abierto]
         
         if uvicorn_check["status"] == "OK" and qdrant_check["status"] == "OK":
             return {
-                "status": "OK",
-                "message": "Sistema operativo",
+                "status": "WARNING" if circuitos_abiertos else "OK",
+                "message": f"Sistema operativo con circuitos abiertos: {', '.join(circuitos_abiertos)}" if circuitos_abiertos else "Sistema operativo",
                 "timestamp": datetime.datetime.now().isoformat(),
                 "components": {
                     "uvicorn": "OK",
                     "qdrant": "OK"
-                }
+                },
+                "single_flight": analisis_en_vuelo.estado(),
+                "circuitos": [circuito.estado() for circuito in circuitos]
             }
         else:
             return {
@@ -1740,7 +1721,23 @@ async def basic_status():
                 "components": {
                     "uvicorn": uvicorn_check["status"],
                     "qdrant": qdrant_check["status"]
-                }
+                },
+                "single_flight": analisis_en_vuelo.estado(),
+                "circuitos": [circuito.estado() for circuito in circuitos]
             }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en verificación básica: {str(e)}")
+
+@router.get("/metricas", summary="Métricas de contrapresión")
+async def metricas_contrapresion():
+    """
+    Estado de los limitadores de OpenAI (cola, espera, admitidos/rechazados, cuota disponible),
+    de la coalescencia de requests idénticos, de los circuit breakers y de las caches de administración.
+    """
+    return {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "limitadores": [limitador_llm.estado(), limitador_embeddings.estado()],
+        "single_flight": analisis_en_vuelo.estado(),
+        "circuitos": [circuito.estado() for circuito in circuitos],
+        "caches": [cache_estadisticas.estado(), registro_ugl.estado()]
+    }
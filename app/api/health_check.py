@@ -20,12 +20,12 @@ import pymysql
 import sqlite3
 
 # Imports de la aplicación
-from app.core.dependencies import get_embeddings, get_qdrant_client, get_vector_store, get_llm
-from app.core.config import qdrant_url, collection_name_fragmento, openai_api_key
+from app.core.dependencies import get_embeddings, get_qdrant_client, get_vector_store, get_llm, resolver_coleccion, circuitos
+from app.services.circuito import ABIERTO, SEMIABIERTO
+from app.core.config import qdrant_url, collection_name_fragmento, openai_api_key, qdrant_prefer_grpc, qdrant_grpc_port
 from app.core.logging_config import get_logger
 
 # Imports para Qdrant
-from qdrant_client import QdrantClient
 from qdrant_client.http.exceptions import UnexpectedResponse
 
 # Imports para base de datos
@@ -277,7 +277,8 @@ class HealthChecker:
     def check_qdrant_connection(self) -> Dict[str, Any]:
         """Verificar conexión con Qdrant"""
         try:
-            client = QdrantClient(url=qdrant_url)
+            # Usar el cliente compartido para verificar el mismo transporte (HTTP/gRPC) que usa la app
+            client = get_qdrant_client()
             
             # Verificar que el servicio responde
             collections = client.get_collections()
@@ -287,6 +288,7 @@ class HealthChecker:
                 collection_info = client.get_collection(collection_name_fragmento)
                 collection_exists = True
                 collection_details = {
+                    "resolved_collection": resolver_coleccion(client, collection_name_fragmento),
                     "vectors_count": collection_info.vectors_count,
                     "status": collection_info.status.value if hasattr(collection_info.status, 'value') else str(collection_info.status)
                 }
@@ -299,6 +301,7 @@ class HealthChecker:
                 "message": "Qdrant está funcionando correctamente",
                 "details": {
                     "url": qdrant_url,
+                    "transporte": f"gRPC:{qdrant_grpc_port}" if qdrant_prefer_grpc else "HTTP",
                     "total_collections": len(collections.collections),
                     "target_collection": collection_name_fragmento,
                     "collection_exists": collection_exists,
@@ -617,6 +620,7 @@ class HealthChecker:
                     "api_key_prefix": openai_api_key[:10] + "..." if openai_api_key else "Not configured",
                     "embedding_test": {
                         "success": True,
+                        "cache": getattr(embeddings, "modo", "off"),
                         "vector_size": len(test_embedding),
                         "response_time_ms": round(embedding_time, 2)
                     },
@@ -686,6 +690,36 @@ class HealthChecker:
                 "error": str(e)
             }
 
+    def check_circuit_breakers(self) -> Dict[str, Any]:
+        """Verificar el estado de los circuit breakers de Qdrant, embeddings y LLM"""
+        try:
+            estados = [circuito.estado() for circuito in circuitos]
+            abiertos = [e["nombre"] for e in estados if e["estado"] == ABIERTO]
+            semiabiertos = [e["nombre"] for e in estados if e["estado"] == SEMIABIERTO]
+            
+            if abiertos:
+                status = "ERROR"
+                message = f"Circuitos abiertos (dependencia caída): {', '.join(abiertos)}"
+            elif semiabiertos:
+                status = "WARNING"
+                message = f"Circuitos semiabiertos (probando recuperación): {', '.join(semiabiertos)}"
+            else:
+                status = "OK"
+                message = "Todos los circuitos cerrados"
+            
+            return {
+                "status": status,
+                "message": message,
+                "details": {e["nombre"]: e for e in estados}
+            }
+            
+        except Exception as e:
+            return {
+                "status": "ERROR",
+                "message": f"Error verificando circuit breakers: {str(e)}",
+                "error": str(e)
+            }
+
     def run_full_diagnosis(self) -> Dict[str, Any]:
         """Ejecutar diagnóstico completo"""
         logger.info("Iniciando diagnóstico completo del sistema")
@@ -698,6 +732,7 @@ class HealthChecker:
             "database_dual_connection": self.check_database_dual_connection,
             "database_tables": self.check_database_tables,
             "openai_connection": self.check_openai_connection,
+            "circuit_breakers": self.check_circuit_breakers,
             "critical_scripts": self.check_critical_scripts
         }
         
@@ -788,6 +823,7 @@ def get_health_check_html(diagnosis_result: Dict[str, Any]) -> str:
             "database_dual_connection": "🗄️ Base de Datos (MySQL/SQLite)",
             "database_tables": "📋 Tablas del Sistema",
             "openai_connection": "🤖 Conexión OpenAI",
+            "circuit_breakers": "🔌 Circuit Breakers",
             "critical_scripts": "📁 Scripts Críticos"
         }
         
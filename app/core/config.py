@@ -103,6 +103,84 @@ else:
     nombre_bdvectorial = os.environ.get('NOMBRE_BDV', 'fragment_store')
     max_results = int(os.environ.get('MAX_RESULTS', 5))
 
+def leer_parametro(variable_entorno, clave_ini, valor_defecto, seccion='SERVICIOS_SIMAP_Q'):
+    """
+    Lee un parámetro priorizando la variable de entorno y usando config.ini como fallback
+    """
+    valor = os.environ.get(variable_entorno)
+    if (valor is None or valor == '') and seccion in config:
+        valor = config[seccion].get(clave_ini)
+    if valor is None or valor == '':
+        return valor_defecto
+    return valor
+
+def leer_booleano(variable_entorno, clave_ini, valor_defecto=False, seccion='SERVICIOS_SIMAP_Q'):
+    """
+    Lee un parámetro booleano (acepta 1/0, true/false, si/no)
+    """
+    valor = leer_parametro(variable_entorno, clave_ini, None, seccion)
+    if valor is None:
+        return valor_defecto
+    return str(valor).strip().lower() in ('1', 'true', 'si', 'sí', 'yes', 'on')
+
+# Transporte del cliente Qdrant: HTTP/JSON por defecto, gRPC opcional (vectores en binario)
+qdrant_prefer_grpc = leer_booleano('QDRANT_PREFER_GRPC', 'qdrant_prefer_grpc', False)
+qdrant_grpc_port = int(leer_parametro('QDRANT_GRPC_PORT', 'qdrant_grpc_port', 6334))
+qdrant_timeout = int(leer_parametro('QDRANT_TIMEOUT', 'qdrant_timeout', 10))
+qdrant_grpc_keepalive_ms = int(leer_parametro('QDRANT_GRPC_KEEPALIVE_MS', 'qdrant_grpc_keepalive_ms', 30000))
+
+# Cache de embeddings en disco: off | grabar | reproducir (reproducir = sin llamadas a la API)
+embeddings_cache_modo = str(leer_parametro('EMBEDDINGS_CACHE_MODO', 'embeddings_cache_modo', 'off')).strip().lower()
+embeddings_cache_dir = leer_parametro('EMBEDDINGS_CACHE_DIR', 'embeddings_cache_dir', 'cache_embeddings')
+
+# Backend de embeddings: openai (1536 dimensiones) | local (sentence-transformers en CPU)
+# La colección de Qdrant debe haberse cargado con el mismo backend (la dimensión tiene que coincidir)
+embeddings_backend = str(leer_parametro('EMBEDDINGS_BACKEND', 'embeddings_backend', 'openai')).strip().lower()
+embeddings_modelo_local = leer_parametro('EMBEDDINGS_MODELO_LOCAL', 'embeddings_modelo_local', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+embeddings_hilos_local = int(leer_parametro('EMBEDDINGS_HILOS_LOCAL', 'embeddings_hilos_local', 2))
+embeddings_lote_local = int(leer_parametro('EMBEDDINGS_LOTE_LOCAL', 'embeddings_lote_local', 32))
+
+# Limitador de llamadas a OpenAI: cuotas de la cuenta (por minuto) que se reparten entre los workers
+openai_llm_rpm = int(leer_parametro('OPENAI_LLM_RPM', 'openai_llm_rpm', 500))
+openai_llm_tpm = int(leer_parametro('OPENAI_LLM_TPM', 'openai_llm_tpm', 200000))
+openai_embeddings_rpm = int(leer_parametro('OPENAI_EMBEDDINGS_RPM', 'openai_embeddings_rpm', 3000))
+openai_embeddings_tpm = int(leer_parametro('OPENAI_EMBEDDINGS_TPM', 'openai_embeddings_tpm', 1000000))
+openai_max_concurrentes = int(leer_parametro('OPENAI_MAX_CONCURRENTES', 'openai_max_concurrentes', 8))
+openai_espera_maxima = float(leer_parametro('OPENAI_ESPERA_MAXIMA', 'openai_espera_maxima', 10))
+openai_tokens_salida_estimados = int(leer_parametro('OPENAI_TOKENS_SALIDA_ESTIMADOS', 'openai_tokens_salida_estimados', 500))
+openai_workers = max(1, int(leer_parametro('WEB_CONCURRENCY', 'openai_workers', 1)))
+
+# Plazo total por request en segundos (0 = sin plazo); el header X-Request-Timeout-Ms puede acortarlo
+plazo_request_segundos = float(leer_parametro('PLAZO_REQUEST_SEGUNDOS', 'plazo_request_segundos', 45))
+
+# Circuit breakers de Qdrant / embeddings / LLM: fallos consecutivos para abrir y segundos abierto antes de sondear
+circuito_umbral_fallos = int(leer_parametro('CIRCUITO_UMBRAL_FALLOS', 'circuito_umbral_fallos', 5))
+circuito_segundos_abierto = float(leer_parametro('CIRCUITO_SEGUNDOS_ABIERTO', 'circuito_segundos_abierto', 30))
+
+# Con gunicorn --preload: cargar también el modelo de embeddings local en el maestro antes del fork
+# (comparte los pesos entre workers; desactivado por defecto porque torch no siempre tolera el fork)
+precargar_modelo_local = leer_booleano('PRECARGAR_MODELO_LOCAL', 'precargar_modelo_local', False)
+
+# Paginación de /api/admin/consultas_filtradas: filas por página por defecto y tope del parámetro `limite`
+admin_pagina_defecto = int(leer_parametro('ADMIN_PAGINA_DEFECTO', 'admin_pagina_defecto', 50))
+admin_pagina_maxima = int(leer_parametro('ADMIN_PAGINA_MAXIMA', 'admin_pagina_maxima', 500))
+
+# Estadísticas de administración desde la tabla consultas_diarias (si existe) en lugar de recorrer consultas
+usar_rollup_estadisticas = leer_booleano('USAR_ROLLUP_ESTADISTICAS', 'usar_rollup_estadisticas', True)
+# Segundos que se reutiliza el resultado de /api/admin/estadisticas por combinación de filtros (0 = sin cache)
+estadisticas_cache_ttl = float(leer_parametro('ESTADISTICAS_CACHE_TTL', 'estadisticas_cache_ttl', 30))
+# Lista de UGL del panel de administración: segundos antes de releerla de la base, y max-age
+# que se indica al navegador para reutilizarla sin volver a pedirla
+ugls_cache_ttl = float(leer_parametro('UGLS_CACHE_TTL', 'ugls_cache_ttl', 3600))
+ugls_max_age = int(leer_parametro('UGLS_MAX_AGE', 'ugls_max_age', 300))
+# max-age de las respuestas de estadísticas y listados de administración (con ETag: pasado ese
+# tiempo el navegador revalida y recibe 304 si los datos no cambiaron; 0 = revalidar siempre)
+admin_cache_max_age = int(leer_parametro('ADMIN_CACHE_MAX_AGE', 'admin_cache_max_age', 10))
+# Filas por lote en /api/admin/exportar_consultas (cada lote se lee, serializa y envía antes del siguiente)
+exportacion_lote = int(leer_parametro('EXPORTACION_LOTE', 'exportacion_lote', 1000))
+# Máximo de ítems por llamada a /api/feedback/batch
+feedback_lote_maximo = int(leer_parametro('FEEDBACK_LOTE_MAXIMO', 'feedback_lote_maximo', 500))
+
 # Para mantener compatibilidad con código que espera fragment_store_directory
 fragment_store_directory = None  # Ya no se usa con Qdrant, pero lo mantenemos para compatibilidad
 
@@ -4,7 +4,22 @@ from qdrant_client import QdrantClient
 from qdrant_client.http.exceptions import UnexpectedResponse
 from langchain_qdrant import Qdrant
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from app.core.config import model_name, collection_name_fragmento, qdrant_url, openai_api_key
+from app.core.config import (
+    model_name, collection_name_fragmento, qdrant_url, openai_api_key,
+    qdrant_prefer_grpc, qdrant_grpc_port, qdrant_timeout, qdrant_grpc_keepalive_ms,
+    embeddings_cache_modo, embeddings_cache_dir,
+    embeddings_backend, embeddings_modelo_local, embeddings_hilos_local, embeddings_lote_local,
+    openai_llm_rpm, openai_llm_tpm, openai_embeddings_rpm, openai_embeddings_tpm,
+    openai_max_concurrentes, openai_espera_maxima, openai_tokens_salida_estimados, openai_workers,
+    circuito_umbral_fallos, circuito_segundos_abierto
+)
+from app.services.embeddings_cache import envolver_embeddings
+from app.services.limitador import LimitadorOpenAI, EmbeddingsLimitadas, segundos_retry_after
+from app.services.token_utils import contar_tokens
+from app.services.circuito import CircuitBreaker
+from app.services.qdrant_conexion import obtener_parametros_cliente_qdrant, resolver_alias
+from app.services.plazo import PlazoAgotado, stop_sin_plazo, wait_dentro_del_plazo, timeout_para_etapa, tiempo_restante
+from app.services.embeddings_local import EmbeddingsLocales, dimension_embeddings
 from app.core.logging_config import log_message, get_logger
 import traceback
 import time
@@ -19,11 +34,42 @@ _qdrant_client = None
 _vector_store = None
 _llm = None
 
+def cuota_por_worker(cuota):
+    """Parte de la cuota de la cuenta que le toca a este worker; nunca 0 si hay cuota (0 = sin límite)"""
+    return max(1, cuota // openai_workers) if cuota else 0
+
+# Limitadores compartidos por todas las llamadas a OpenAI del proceso (cuota repartida entre workers)
+limitador_llm = LimitadorOpenAI(
+    "llm",
+    rpm=cuota_por_worker(openai_llm_rpm),
+    tpm=cuota_por_worker(openai_llm_tpm),
+    max_concurrentes=openai_max_concurrentes,
+    espera_maxima=openai_espera_maxima
+)
+limitador_embeddings = LimitadorOpenAI(
+    "embeddings",
+    rpm=cuota_por_worker(openai_embeddings_rpm),
+    tpm=cuota_por_worker(openai_embeddings_tpm),
+    max_concurrentes=openai_max_concurrentes,
+    espera_maxima=openai_espera_maxima
+)
+logger.info(
+    f"Cuota de OpenAI por worker ({openai_workers} workers): "
+    f"LLM {cuota_por_worker(openai_llm_rpm)} RPM / {cuota_por_worker(openai_llm_tpm)} TPM, "
+    f"embeddings {cuota_por_worker(openai_embeddings_rpm)} RPM / {cuota_por_worker(openai_embeddings_tpm)} TPM"
+)
+
+# Circuit breakers: con una dependencia caída las llamadas fallan en milisegundos en lugar de agotar reintentos
+circuito_qdrant = CircuitBreaker("qdrant", circuito_umbral_fallos, circuito_segundos_abierto)
+circuito_embeddings = CircuitBreaker("embeddings", circuito_umbral_fallos, circuito_segundos_abierto, errores_ignorados=(RateLimitError,))
+circuito_llm = CircuitBreaker("llm", circuito_umbral_fallos, circuito_segundos_abierto, errores_ignorados=(RateLimitError,))
+circuitos = (circuito_qdrant, circuito_embeddings, circuito_llm)
+
 # Configuración de reintento para OpenAI
 @retry(
     retry=retry_if_exception_type((RateLimitError, APITimeoutError, APIConnectionError, APIError)),
-    stop=stop_after_attempt(5),
-    wait=wait_exponential(multiplier=1, min=4, max=60),
+    stop=stop_after_attempt(5) | stop_sin_plazo(),
+    wait=wait_dentro_del_plazo(wait_exponential(multiplier=1, min=4, max=60)),
     before_sleep=before_sleep_log(logger, logger.level)
 )
 def create_embeddings_with_retry(api_key):
@@ -32,63 +78,117 @@ def create_embeddings_with_retry(api_key):
 
 @retry(
     retry=retry_if_exception_type((RateLimitError, APITimeoutError, APIConnectionError, APIError)),
-    stop=stop_after_attempt(5),
-    wait=wait_exponential(multiplier=1, min=4, max=60),
+    stop=stop_after_attempt(5) | stop_sin_plazo(),
+    wait=wait_dentro_del_plazo(wait_exponential(multiplier=1, min=4, max=60)),
     before_sleep=before_sleep_log(logger, logger.level)
 )
 def create_llm_with_retry(model, temperature, api_key):
     """Crea la instancia de ChatOpenAI con reintentos"""
     return ChatOpenAI(model=model, temperature=temperature, api_key=api_key)
 
+def parametros_cliente_qdrant(url):
+    """Parámetros de QdrantClient con el transporte configurado para la API"""
+    return obtener_parametros_cliente_qdrant(
+        url, qdrant_timeout, prefer_grpc=qdrant_prefer_grpc, grpc_port=qdrant_grpc_port, keepalive_ms=qdrant_grpc_keepalive_ms
+    )
+
 # Configuración de reintento para Qdrant
 @retry(
     retry=retry_if_exception_type((UnexpectedResponse, ConnectionError, TimeoutError)),
-    stop=stop_after_attempt(5),
-    wait=wait_exponential(multiplier=1, min=2, max=30),
+    stop=stop_after_attempt(5) | stop_sin_plazo(),
+    wait=wait_dentro_del_plazo(wait_exponential(multiplier=1, min=2, max=30)),
     before_sleep=before_sleep_log(logger, logger.level)
 )
 def create_qdrant_client_with_retry(url):
     """Crea la instancia de QdrantClient con reintentos"""
-    return QdrantClient(url=url)
+    return QdrantClient(**parametros_cliente_qdrant(url))
 
 @retry(
     retry=retry_if_exception_type((UnexpectedResponse, ConnectionError, TimeoutError)),
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=2, max=10),
+    stop=stop_after_attempt(3) | stop_sin_plazo(),
+    wait=wait_dentro_del_plazo(wait_exponential(multiplier=1, min=2, max=10)),
     before_sleep=before_sleep_log(logger, logger.level)
 )
 def check_collection_with_retry(client, collection_name):
     """Verifica que la colección existe con reintentos"""
     return client.get_collection(collection_name)
 
+def resolver_coleccion(client, collection_name):
+    """
+    Devuelve la colección física detrás del nombre configurado. Con la carga blue/green
+    collection_name_fragmento es un alias que el loader reapunta a cada versión nueva;
+    si no es un alias (esquema anterior) se devuelve el mismo nombre.
+    """
+    try:
+        return resolver_alias(client, collection_name) or collection_name
+    except Exception as e:
+        logger.warning(f"No se pudieron consultar los aliases de Qdrant: {str(e)}")
+    return collection_name
+
 def get_embeddings():
-    """Devuelve una instancia singleton de OpenAIEmbeddings"""
+    """Devuelve una instancia singleton del proveedor de embeddings (OpenAI o local según EMBEDDINGS_BACKEND)"""
     global _embeddings
     if _embeddings is None:
-        logger.info("Inicializando OpenAIEmbeddings (singleton)")
-        api_key_prefix = openai_api_key[:10] if len(openai_api_key) > 10 else openai_api_key
-        logger.info(f"Usando API key que comienza con: {api_key_prefix}...")
-        try:
-            _embeddings = create_embeddings_with_retry(openai_api_key)
-            logger.info("OpenAIEmbeddings inicializado correctamente")
-        except Exception as e:
-            logger.error(f"Error al inicializar OpenAIEmbeddings después de múltiples intentos: {str(e)}")
-            logger.error(traceback.format_exc())
-            # Creamos una versión básica sin reintentos como fallback
-            _embeddings = OpenAIEmbeddings(api_key=openai_api_key)
+        if embeddings_backend == 'local':
+            logger.info(f"Inicializando embeddings locales (singleton): {embeddings_modelo_local} - hilos: {embeddings_hilos_local}")
+            embeddings = EmbeddingsLocales(
+                modelo=embeddings_modelo_local,
+                hilos=embeddings_hilos_local,
+                tamano_lote=embeddings_lote_local
+            )
+        else:
+            logger.info("Inicializando OpenAIEmbeddings (singleton)")
+            api_key_prefix = openai_api_key[:10] if len(openai_api_key) > 10 else openai_api_key
+            logger.info(f"Usando API key que comienza con: {api_key_prefix}...")
+            try:
+                embeddings = create_embeddings_with_retry(openai_api_key)
+                logger.info("OpenAIEmbeddings inicializado correctamente")
+            except Exception as e:
+                logger.error(f"Error al inicializar OpenAIEmbeddings después de múltiples intentos: {str(e)}")
+                logger.error(traceback.format_exc())
+                # Creamos una versión básica sin reintentos como fallback
+                embeddings = OpenAIEmbeddings(api_key=openai_api_key)
+            # Sólo las llamadas reales a OpenAI pasan por el limitador (los aciertos del cache no)
+            modelo_embeddings = embeddings.model
+            embeddings = EmbeddingsLimitadas(embeddings, limitador_embeddings, lambda texto: contar_tokens(texto, modelo_embeddings))
+        if embeddings_cache_modo != 'off':
+            logger.info(f"Embeddings con cache en disco: modo {embeddings_cache_modo}, directorio {embeddings_cache_dir}")
+            embeddings = envolver_embeddings(embeddings, embeddings_cache_modo, embeddings_cache_dir)
+        _embeddings = embeddings
     return _embeddings
 
+def calentar_embeddings():
+    """Carga el modelo local al arranque para que la primera consulta no pague la carga"""
+    embeddings = get_embeddings()
+    base = getattr(embeddings, 'base', embeddings)
+    if isinstance(base, EmbeddingsLocales):
+        segundos = base.calentar()
+        logger.info(f"Modelo de embeddings local precargado en {segundos:.2f} s (dimensión {base.dimension})")
+
+def verificar_dimension_coleccion(client, collection_name, embeddings):
+    """Compara la dimensión de la colección con la del backend de embeddings; devuelve (ok, dim_coleccion, dim_backend)"""
+    info = client.get_collection(collection_name)
+    vectores = info.config.params.vectors
+    dim_coleccion = getattr(vectores, 'size', None)
+    dim_backend = dimension_embeddings(embeddings)
+    return dim_coleccion == dim_backend, dim_coleccion, dim_backend
+
 def get_qdrant_client():
     """Devuelve una instancia singleton de QdrantClient"""
     global _qdrant_client
     if _qdrant_client is None:
-        logger.info(f"Inicializando QdrantClient (singleton) en: {qdrant_url}")
+        transporte = f"gRPC (puerto {qdrant_grpc_port})" if qdrant_prefer_grpc else "HTTP"
+        logger.info(f"Inicializando QdrantClient (singleton) en: {qdrant_url} - transporte: {transporte}")
         try:
             _qdrant_client = create_qdrant_client_with_retry(qdrant_url)
             # Verificar que la colección existe
             try:
                 check_collection_with_retry(_qdrant_client, collection_name_fragmento)
-                logger.info(f"Colección {collection_name_fragmento} encontrada en Qdrant.")
+                coleccion_fisica = resolver_coleccion(_qdrant_client, collection_name_fragmento)
+                if coleccion_fisica != collection_name_fragmento:
+                    logger.info(f"Colección {collection_name_fragmento} encontrada en Qdrant (alias de {coleccion_fisica}).")
+                else:
+                    logger.info(f"Colección {collection_name_fragmento} encontrada en Qdrant.")
             except Exception as e:
                 error_msg = f"Error: La colección {collection_name_fragmento} no existe en Qdrant: {str(e)}"
                 logger.error(error_msg)
@@ -98,7 +198,7 @@ def get_qdrant_client():
             logger.error(f"Error al conectar con Qdrant después de múltiples intentos: {str(e)}")
             logger.error(traceback.format_exc())
             # Creamos una versión básica sin reintentos como fallback
-            _qdrant_client = QdrantClient(url=qdrant_url)
+            _qdrant_client = QdrantClient(**parametros_cliente_qdrant(qdrant_url))
     return _qdrant_client
 
 def get_vector_store():
@@ -109,6 +209,12 @@ def get_vector_store():
         # Obtener las dependencias manualmente sin usar Depends
         embeddings = get_embeddings()
         qdrant_client = get_qdrant_client()
+        try:
+            ok, dim_coleccion, dim_backend = verificar_dimension_coleccion(qdrant_client, collection_name_fragmento, embeddings)
+            if not ok:
+                logger.error(f"La colección {collection_name_fragmento} tiene vectores de {dim_coleccion} dimensiones pero el backend de embeddings '{embeddings_backend}' genera {dim_backend}: recargue la colección con el mismo backend")
+        except Exception as e:
+            logger.warning(f"No se pudo verificar la dimensión de la colección {collection_name_fragmento}: {str(e)}")
         _vector_store = Qdrant(
             client=qdrant_client,
             collection_name=collection_name_fragmento,
@@ -137,4 +243,41 @@ def get_llm():
             logger.error(traceback.format_exc())
             # Creamos una versión básica sin reintentos como fallback
             _llm = ChatOpenAI(model=model_name, temperature=0, api_key=openai_api_key)
-    return _llm 
\ No newline at end of file
+    return _llm
+
+def buscar_similares(vector_store, query, k):
+    """
+    Equivalente a similarity_search_with_score con el timeout de Qdrant acotado a lo que queda del plazo
+    del request. El embedding de la consulta y la búsqueda pasan cada uno por su circuit breaker.
+    """
+    with circuito_embeddings.proteger():
+        vector = vector_store.embeddings.embed_query(query)
+    timeout = timeout_para_etapa("busqueda_qdrant", qdrant_timeout)
+    with circuito_qdrant.proteger():
+        return vector_store.similarity_search_with_score_by_vector(vector, k=k, timeout=max(1, int(timeout)))
+
+def invocar_llm(llm, mensajes):
+    """
+    Invoca el LLM (o el LLM con tools) pasando por limitador_llm.
+    Reserva los tokens estimados del prompt más la salida esperada y luego ajusta el TPM con el uso real;
+    un 429 de OpenAI frena al resto de las llamadas del proceso durante el Retry-After.
+    Con plazo de request el timeout de la llamada es el tiempo que le queda.
+    """
+    texto = "\n".join(str(getattr(mensaje, "content", mensaje)) for mensaje in mensajes)
+    tokens_estimados = contar_tokens(texto, model_name) + openai_tokens_salida_estimados
+    with circuito_llm.proteger(), limitador_llm.reservar(tokens_estimados) as reserva:
+        timeout = timeout_para_etapa("llm")
+        try:
+            respuesta = llm.invoke(mensajes, **({"timeout": timeout} if timeout else {}))
+        except RateLimitError as e:
+            limitador_llm.penalizar(segundos_retry_after(e))
+            raise
+        except APITimeoutError as e:
+            restante = tiempo_restante()
+            if restante is not None and restante <= 0.5:
+                raise PlazoAgotado("llm") from e
+            raise
+    uso = getattr(respuesta, "usage_metadata", None)
+    if uso:
+        reserva.ajustar_tokens(uso.get("total_tokens"))
+    return respuesta
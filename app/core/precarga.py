@@ -0,0 +1,52 @@
+# app/core/precarga.py
+"""
+Precarga del estado de sólo lectura que los workers pueden compartir.
+
+Con gunicorn y preload_app (ver gunicorn.conf.py) se ejecuta en el proceso maestro antes del
+fork: el tokenizador, el prompt resuelto y, opcionalmente, el modelo de embeddings local quedan
+en páginas que los workers comparten copy-on-write en lugar de cargarlos N veces.
+No abre conexiones de red: los clientes de Qdrant y OpenAI se crean en cada worker (startup de main.py).
+Sin gunicorn (uvicorn directo) se llama desde el startup y sólo adelanta la carga.
+"""
+
+import time
+
+from app.core.config import model_name, embeddings_backend, precargar_modelo_local
+from app.core.logging_config import get_logger
+from app.services.token_utils import get_tokenizer, contar_tokens
+from app.services.prompt_service import get_system_prompt
+
+logger = get_logger()
+
+
+def _medir(tiempos, nombre, funcion):
+    inicio = time.perf_counter()
+    try:
+        funcion()
+        tiempos[nombre] = round(time.perf_counter() - inicio, 3)
+    except Exception as e:
+        logger.warning(f"PRECARGA: no se pudo precargar {nombre}: {e}")
+        tiempos[nombre] = None
+
+
+def precargar_estado_compartido(incluir_modelo_local=None):
+    """
+    Carga tokenizador, prompt y (si corresponde) el modelo de embeddings local.
+
+    Returns:
+        dict: segundos que tardó cada componente (None si falló)
+    """
+    if incluir_modelo_local is None:
+        incluir_modelo_local = precargar_modelo_local
+    tiempos = {}
+
+    # get_tokenizer tiene lru_cache: la primera llamada carga (y descarga si hace falta) el BPE de tiktoken
+    _medir(tiempos, "tokenizador", lambda: (get_tokenizer(model_name), contar_tokens("precarga del tokenizador", model_name)))
+    _medir(tiempos, "prompt", get_system_prompt)
+
+    if incluir_modelo_local and embeddings_backend == 'local':
+        from app.core.dependencies import calentar_embeddings
+        _medir(tiempos, "modelo_embeddings_local", calentar_embeddings)
+
+    logger.info(f"PRECARGA: estado compartido cargado en {sum(t for t in tiempos.values() if t):.2f} s: {tiempos}")
+    return tiempos
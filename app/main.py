@@ -2,13 +2,17 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 import os
 
 # Importar el router de la API
 from app.api import endpoints 
 from app.core.logging_config import get_logger # Para el logger
-from app.core.dependencies import get_embeddings, get_qdrant_client, get_vector_store, get_llm
+from app.core.dependencies import get_embeddings, get_qdrant_client, get_vector_store, get_llm, calentar_embeddings
+from app.services.limitador import LimiteExcedido
+from app.core.precarga import precargar_estado_compartido
+from app.services.plazo import iniciar_plazo, restablecer_plazo
+from app.core.config import plazo_request_segundos
 
 # Obtener el logger
 logger = get_logger()
@@ -37,15 +41,49 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Ultimo-Id", "Retry-After"],  # legibles desde fetch() en las páginas servidas como file://
 )
 logger.info("MAIN_MINIMAL: CORSMiddleware añadido.")
 
+# Plazo por request para la API: config PLAZO_REQUEST_SEGUNDOS, que el header X-Request-Timeout-Ms puede acortar
+@app.middleware("http")
+async def plazo_por_request(request, call_next):
+    if not request.url.path.startswith("/api/"):
+        return await call_next(request)
+    segundos = plazo_request_segundos
+    encabezado = request.headers.get("X-Request-Timeout-Ms")
+    if encabezado:
+        try:
+            pedido = float(encabezado) / 1000.0
+            if pedido > 0:
+                segundos = min(segundos, pedido) if segundos else pedido
+        except ValueError:
+            logger.warning(f"Header X-Request-Timeout-Ms inválido: {encabezado}")
+    token = iniciar_plazo(segundos)
+    try:
+        return await call_next(request)
+    finally:
+        restablecer_plazo(token)
+
+# Contrapresión: sin lugar en el limitador de OpenAI se responde rápido en lugar de colgar el request
+@app.exception_handler(LimiteExcedido)
+async def limite_excedido_handler(request, exc: LimiteExcedido):
+    logger.warning(f"Request rechazado por el limitador: {exc}")
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc), "recurso": exc.recurso, "motivo": exc.motivo},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Inicializar recursos al arranque de la aplicación
 @app.on_event("startup")
 async def startup_event():
     logger.info("MAIN_MINIMAL: Evento startup iniciando...")
     try:
+        # Con gunicorn --preload ya se hizo en el maestro (queda cacheado); con uvicorn directo adelanta la carga
+        precargar_estado_compartido(incluir_modelo_local=False)
         get_embeddings() 
+        calentar_embeddings()
         get_qdrant_client()
         get_vector_store()
         get_llm()
@@ -80,5 +118,6 @@ logger.info("MAIN_MINIMAL: Fin de la configuración de app/main.py (versión mí
 
 if __name__ == "__main__":
     import uvicorn
+    # Modo desarrollo (un proceso con recarga); en producción: gunicorn -c gunicorn.conf.py app.main:app
     logger.info("MAIN_MINIMAL: Ejecutando Uvicorn directamente desde main.py")
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
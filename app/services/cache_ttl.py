@@ -0,0 +1,60 @@
+# app/services/cache_ttl.py
+"""
+Cache en memoria con vencimiento (TTL) para resultados caros de recalcular, como las
+estadísticas del panel de administración. Es por proceso: cada worker de gunicorn tiene la suya,
+y un resultado puede quedar desactualizado a lo sumo `ttl` segundos (o hasta invalidar()).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheTTL:
+    """Diccionario clave -> valor con vencimiento por entrada y tope de entradas, seguro entre threads"""
+
+    def __init__(self, nombre, ttl=30.0, max_entradas=256):
+        self.nombre = nombre
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()  # clave -> (vence, valor), en orden de inserción
+        self._lock = threading.Lock()
+        self.metricas = {"aciertos": 0, "fallos": 0, "invalidaciones": 0}
+
+    def obtener(self, clave, defecto=None):
+        """Valor vigente para la clave, o `defecto` si no está o venció"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] > time.monotonic():
+                self.metricas["aciertos"] += 1
+                return entrada[1]
+            if entrada is not None:
+                del self._entradas[clave]
+            self.metricas["fallos"] += 1
+            return defecto
+
+    def guardar(self, clave, valor):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            self._entradas.pop(clave, None)
+            if len(self._entradas) >= self.max_entradas:
+                for vieja in [c for c, (vence, _) in self._entradas.items() if vence <= ahora]:
+                    del self._entradas[vieja]
+                while len(self._entradas) >= self.max_entradas:
+                    self._entradas.popitem(last=False)
+            self._entradas[clave] = (ahora + self.ttl, valor)
+
+    def invalidar(self, clave=None):
+        """Descarta una clave, o todo el contenido si no se indica"""
+        with self._lock:
+            if clave is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(clave, None)
+            self.metricas["invalidaciones"] += 1
+
+    def estado(self):
+        with self._lock:
+            return {"nombre": self.nombre, "entradas": len(self._entradas), "ttl_segundos": self.ttl, **self.metricas}
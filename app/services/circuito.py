@@ -0,0 +1,122 @@
+# app/services/circuito.py
+"""
+Circuit breaker para las dependencias externas (Qdrant, embeddings y LLM).
+
+Cerrado: las llamadas pasan y se cuentan los fallos consecutivos. Al llegar al umbral se abre:
+durante `segundos_abierto` toda llamada falla en el acto con CircuitoAbierto, sin esperar
+timeouts ni reintentos. Cumplido ese tiempo pasa a semiabierto y deja pasar una sonda: si
+responde bien se cierra, si falla vuelve a abrirse.
+
+Sólo cuentan como fallo los errores de la dependencia; el rechazo del limitador, el plazo del
+request agotado o los errores indicados en errores_ignorados (p. ej. el 429 de OpenAI, que es
+cuota y no caída) no.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from app.services.limitador import LimiteExcedido
+from app.services.plazo import PlazoAgotado
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+ERRORES_NO_CONTABLES = (LimiteExcedido, PlazoAgotado)
+
+
+class CircuitoAbierto(Exception):
+    """La dependencia está marcada como caída: se falla sin llamarla"""
+
+    def __init__(self, recurso, reintento_en):
+        self.recurso = recurso
+        self.reintento_en = reintento_en
+        super().__init__(f"Circuito de {recurso} abierto; se vuelve a probar en {reintento_en:.0f} s")
+
+
+class CircuitBreaker:
+    """Circuit breaker cerrado / abierto / semiabierto, seguro entre threads"""
+
+    def __init__(self, nombre, umbral_fallos=5, segundos_abierto=30.0, errores_ignorados=()):
+        self.nombre = nombre
+        self.errores_ignorados = ERRORES_NO_CONTABLES + tuple(errores_ignorados)
+        self.umbral_fallos = umbral_fallos
+        self.segundos_abierto = segundos_abierto
+        self._lock = threading.Lock()
+        self._estado = CERRADO
+        self._fallos_consecutivos = 0
+        self._abierto_hasta = 0.0
+        self._sonda_en_curso = False
+        self._ultimo_error = None
+        self.metricas = {"aperturas": 0, "rechazadas": 0}
+
+    def _admitir(self):
+        with self._lock:
+            if self._estado == CERRADO:
+                return False
+            ahora = time.monotonic()
+            if self._estado == ABIERTO and ahora >= self._abierto_hasta:
+                self._estado = SEMIABIERTO
+            if self._estado == SEMIABIERTO and not self._sonda_en_curso:
+                self._sonda_en_curso = True
+                return True
+            self.metricas["rechazadas"] += 1
+            raise CircuitoAbierto(self.nombre, max(0.0, self._abierto_hasta - ahora))
+
+    def _registrar_exito(self, sonda):
+        with self._lock:
+            if sonda:
+                self._sonda_en_curso = False
+            self._estado = CERRADO
+            self._fallos_consecutivos = 0
+
+    def _registrar_fallo(self, sonda, error):
+        with self._lock:
+            if sonda:
+                self._sonda_en_curso = False
+            self._fallos_consecutivos += 1
+            self._ultimo_error = f"{type(error).__name__}: {error}"[:200]
+            if sonda or self._fallos_consecutivos >= self.umbral_fallos:
+                if self._estado != ABIERTO:
+                    self.metricas["aperturas"] += 1
+                self._estado = ABIERTO
+                self._abierto_hasta = time.monotonic() + self.segundos_abierto
+
+    @contextmanager
+    def proteger(self):
+        """Ejecuta el bloque a través del circuito (lanza CircuitoAbierto si está abierto)"""
+        sonda = self._admitir()
+        try:
+            yield
+        except self.errores_ignorados:
+            if sonda:
+                with self._lock:
+                    self._sonda_en_curso = False
+            raise
+        except Exception as e:
+            self._registrar_fallo(sonda, e)
+            raise
+        else:
+            self._registrar_exito(sonda)
+
+    @property
+    def abierto(self):
+        with self._lock:
+            return self._estado == ABIERTO and time.monotonic() < self._abierto_hasta
+
+    def estado(self):
+        with self._lock:
+            ahora = time.monotonic()
+            estado = self._estado
+            if estado == ABIERTO and ahora >= self._abierto_hasta:
+                estado = SEMIABIERTO
+            return {
+                "nombre": self.nombre,
+                "estado": estado,
+                "fallos_consecutivos": self._fallos_consecutivos,
+                "umbral_fallos": self.umbral_fallos,
+                "reintento_en_segundos": round(max(0.0, self._abierto_hasta - ahora), 1) if estado == ABIERTO else 0.0,
+                "ultimo_error": self._ultimo_error,
+                **self.metricas,
+            }
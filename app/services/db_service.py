@@ -1,6 +1,7 @@
 # app/services/db_service.py
 import sys
 import os
+import threading
 import traceback
 from datetime import datetime
 from sqlalchemy import create_engine
@@ -12,10 +13,38 @@ import json # Importar json para serializar el diccionario de datos
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 from BD_RELA.create_tables import Consulta, get_engine
 from app.core.logging_config import get_logger, log_message
+from app.services.rollup_service import sumar_consulta, mover_feedback, mover_feedback_lote
+from app.services.registro_ugl import registro_ugl
+from app.services.version_datos import registrar_cambio
 
 # Configurar logger
 logger = get_logger()
 
+# Engine compartido por proceso: su pool reutiliza las conexiones entre requests en lugar de
+# abrir una nueva (y verificarla) en cada escritura. Se crea en el primer uso.
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def obtener_engine():
+    """Engine de SQLAlchemy (MySQL o SQLite, ver BD_RELA/create_tables.get_engine) compartido por el proceso"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = get_engine()
+    return _engine
+
+
+def _descartar_conexiones_heredadas():
+    """En un worker recién forkeado no se usan las conexiones del pool del proceso padre"""
+    if _engine is not None:
+        _engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_descartar_conexiones_heredadas)
+
 def persistir_consulta(
     pregunta_usuario,
     respuesta_asistente,
@@ -79,7 +108,7 @@ def persistir_consulta(
 
     try:
         # Obtener motor y sesión
-        engine = get_engine()
+        engine = obtener_engine()
         Session = sessionmaker(bind=engine)
         session = Session()
         
@@ -143,7 +172,30 @@ def persistir_consulta(
         )
         
         session.add(consulta)
+        session.flush()
+
+        # Sumar la consulta a los agregados diarios en la misma transacción que el INSERT
+        try:
+            cursor_rollup = session.connection().connection.cursor()
+            try:
+                sumar_consulta(
+                    cursor_rollup, engine.dialect.name,
+                    timestamp=consulta.timestamp,
+                    ugel_origen=consulta.ugel_origen,
+                    respuesta_util=consulta.respuesta_util,
+                    respuesta_es_vacia=consulta.respuesta_es_vacia,
+                    tokens_input=consulta.tokens_input,
+                    tokens_output=consulta.tokens_output,
+                    tiempo_respuesta_ms=consulta.tiempo_respuesta_ms
+                )
+            finally:
+                cursor_rollup.close()
+        except Exception as e:
+            # La consulta se guarda igual; el rollup se corrige con BD_RELA/backfill_consultas_diarias.py
+            logger.warning(f"No se pudo actualizar consultas_diarias para la nueva consulta: {e}")
+
         session.commit()
+        registro_ugl.registrar(consulta.ugel_origen)
         
         logger.info(f"INSERT en tabla 'consultas' exitoso. ID asignado: {consulta.id_consulta}. Status: ÉXITO.")
         logger.info(f"Tokens guardados para ID {consulta.id_consulta}: input={consulta.tokens_input}, output={consulta.tokens_output}")
@@ -163,4 +215,113 @@ def persistir_consulta(
         logger.error(f"Datos que se intentaron insertar: {json.dumps(datos_a_insertar, indent=2, ensure_ascii=False)}")
         logger.error(f"Detalles del error: {str(e)}")
         logger.error(traceback.format_exc())
-        return None 
\ No newline at end of file
+        return None 
+
+
+def actualizar_feedback(id_consulta, respuesta_util):
+    """
+    Guarda el feedback de una consulta con un único UPDATE, en una transacción del engine compartido
+    que también mueve la consulta de grupo en consultas_diarias e incrementa el contador de versión.
+
+    Returns:
+        bool: True si se actualizó, False si no existe la consulta (rowcount 0)
+    """
+    engine = obtener_engine()
+    dialecto = engine.dialect.name
+    marcador = "%s" if dialecto == "mysql" else "?"
+    with engine.begin() as conexion:
+        cursor = conexion.connection.cursor()
+        try:
+            # El rollup lee la utilidad anterior de la fila: va antes del UPDATE
+            try:
+                mover_feedback(cursor, dialecto, id_consulta, respuesta_util)
+            except Exception as e:
+                logger.warning(f"No se pudo actualizar consultas_diarias para id_consulta {id_consulta}: {e}")
+
+            cursor.execute(f"UPDATE consultas SET respuesta_util = {marcador} WHERE id_consulta = {marcador}",
+                           (respuesta_util, id_consulta))
+            if cursor.rowcount == 0:
+                return False
+
+            try:
+                registrar_cambio(cursor, dialecto)
+            except Exception as e:
+                logger.warning(f"No se pudo incrementar contadores_cambios para id_consulta {id_consulta}: {e}")
+            return True
+        finally:
+            cursor.close()
+
+
+def actualizar_feedback_lote(items):
+    """
+    Guarda el feedback de varias consultas en una sola transacción: un SELECT para saber qué ids
+    existen, el movimiento en consultas_diarias y un executemany del UPDATE (el comentario sólo
+    se reemplaza si viene).
+
+    Args:
+        items (list): tuplas (id_consulta, respuesta_util, comentario o None), sin ids repetidos
+
+    Returns:
+        set: ids de las consultas actualizadas (los que no están no existen)
+    """
+    if not items:
+        return set()
+    engine = obtener_engine()
+    dialecto = engine.dialect.name
+    marcador = "%s" if dialecto == "mysql" else "?"
+    with engine.begin() as conexion:
+        cursor = conexion.connection.cursor()
+        try:
+            ids = [id_consulta for id_consulta, _, _ in items]
+            cursor.execute(f"SELECT id_consulta FROM consultas WHERE id_consulta IN ({', '.join([marcador] * len(ids))})", ids)
+            existentes = {fila[0] for fila in cursor.fetchall()}
+            aplicar = [item for item in items if item[0] in existentes]
+            if not aplicar:
+                return set()
+
+            # El rollup lee la utilidad anterior de cada fila: va antes del UPDATE
+            try:
+                mover_feedback_lote(cursor, dialecto, [(id_consulta, util) for id_consulta, util, _ in aplicar])
+            except Exception as e:
+                logger.warning(f"No se pudo actualizar consultas_diarias para el lote de feedback: {e}")
+
+            cursor.executemany(
+                f"UPDATE consultas SET respuesta_util = {marcador}, comentario = COALESCE({marcador}, comentario) "
+                f"WHERE id_consulta = {marcador}",
+                [(util, comentario, id_consulta) for id_consulta, util, comentario in aplicar]
+            )
+
+            try:
+                registrar_cambio(cursor, dialecto, cantidad=len(aplicar))
+            except Exception as e:
+                logger.warning(f"No se pudo incrementar contadores_cambios para el lote de feedback: {e}")
+            return {id_consulta for id_consulta, _, _ in aplicar}
+        finally:
+            cursor.close()
+
+
+def actualizar_comentario(id_consulta, comentario):
+    """
+    Guarda el comentario de una consulta con un único UPDATE (e incrementa el contador de versión).
+
+    Returns:
+        bool: True si se actualizó, False si no existe la consulta (rowcount 0)
+    """
+    engine = obtener_engine()
+    dialecto = engine.dialect.name
+    marcador = "%s" if dialecto == "mysql" else "?"
+    with engine.begin() as conexion:
+        cursor = conexion.connection.cursor()
+        try:
+            cursor.execute(f"UPDATE consultas SET comentario = {marcador} WHERE id_consulta = {marcador}",
+                           (comentario, id_consulta))
+            if cursor.rowcount == 0:
+                return False
+
+            try:
+                registrar_cambio(cursor, dialecto)
+            except Exception as e:
+                logger.warning(f"No se pudo incrementar contadores_cambios para id_consulta {id_consulta}: {e}")
+            return True
+        finally:
+            cursor.close()
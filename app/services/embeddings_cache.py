@@ -0,0 +1,202 @@
+# app/services/embeddings_cache.py
+"""
+Capa de grabación / reproducción de embeddings.
+
+EmbeddingsGrabadas envuelve cualquier proveedor de embeddings de LangChain (normalmente
+OpenAIEmbeddings) y guarda los vectores en disco en un formato compacto:
+
+    <directorio>/indice.json          clave -> [shard, fila]  (+ modelo y dimensión)
+    <directorio>/shard_00000.npy      matriz float32 (filas x dimensión)
+    <directorio>/indice.lock          bloqueo entre procesos para volcar shards
+
+Varios procesos pueden grabar en el mismo directorio (workers de gunicorn, cargas en paralelo):
+cada volcado toma un bloqueo exclusivo del archivo, vuelve a leer el índice del disco, lo combina
+con el propio y elige el número de shard siguiente recién ahí, así nadie pisa shards ni claves ajenas.
+
+La clave es el sha256 de "modelo + texto", así que vectores de modelos distintos no se mezclan.
+Modos:
+  - "grabar":     usa el cache y graba lo que falte llamando al proveedor
+  - "reproducir": sólo el cache; un texto sin grabar es un error (ejecución offline determinista)
+  - "off":        sin cache (se devuelve el proveedor tal cual, ver envolver_embeddings)
+
+No importa nada de la app para poder usarse también desde el loader y los scripts de CARGA_BDV.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MODOS_CACHE = ("off", "grabar", "reproducir")
+
+
+@contextmanager
+def _bloqueo_exclusivo(ruta):
+    """Bloqueo exclusivo entre procesos sobre `ruta` (espera a que se libere)"""
+    with open(ruta, "a+b") as archivo:
+        if fcntl is not None:
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX)
+        else:
+            archivo.seek(0)
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(archivo.fileno(), fcntl.LOCK_UN)
+            else:
+                archivo.seek(0)
+                msvcrt.locking(archivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class EmbeddingNoGrabado(KeyError):
+    """Texto sin vector grabado en modo reproducir"""
+
+
+class EmbeddingsGrabadas(Embeddings):
+    """Proveedor de embeddings con grabación / reproducción en shards .npy"""
+
+    def __init__(self, base, directorio, modo="grabar", modelo=None, filas_por_shard=4096):
+        if modo not in ("grabar", "reproducir"):
+            raise ValueError(f"Modo de cache de embeddings inválido: {modo}")
+        self.base = base
+        self.directorio = directorio
+        self.modo = modo
+        self.modelo = modelo or getattr(base, "model", None) or "desconocido"
+        self.filas_por_shard = filas_por_shard
+        self.ruta_indice = os.path.join(directorio, "indice.json")
+        self.ruta_bloqueo = os.path.join(directorio, "indice.lock")
+        self._lock = threading.Lock()
+        self._indice = {}
+        self._shards = {}
+        self._pendientes = {}
+        self.metricas = {"aciertos": 0, "fallos": 0, "grabados": 0}
+
+        os.makedirs(directorio, exist_ok=True)
+        self._indice, _ = self._leer_indice()
+
+    def _leer_indice(self):
+        """(claves, siguiente_shard) del índice en disco; vacío si todavía no existe"""
+        if not os.path.exists(self.ruta_indice):
+            return {}, 0
+        with open(self.ruta_indice, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+        return datos.get("claves", {}), datos.get("siguiente_shard", 0)
+
+    def clave(self, texto: str) -> str:
+        return hashlib.sha256(f"{self.modelo}\x1f{texto}".encode("utf-8")).hexdigest()
+
+    def _shard(self, numero):
+        if numero not in self._shards:
+            ruta = os.path.join(self.directorio, f"shard_{numero:05d}.npy")
+            # mmap: sólo se leen de disco las filas que se usan
+            self._shards[numero] = np.load(ruta, mmap_mode="r")
+        return self._shards[numero]
+
+    def _buscar(self, clave):
+        if clave in self._pendientes:
+            return self._pendientes[clave]
+        ubicacion = self._indice.get(clave)
+        if ubicacion is None:
+            return None
+        shard, fila = ubicacion
+        return self._shard(shard)[fila].tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        claves = [self.clave(t) for t in texts]
+        with self._lock:
+            vectores = [self._buscar(c) for c in claves]
+        faltantes = [i for i, v in enumerate(vectores) if v is None]
+
+        with self._lock:
+            self.metricas["aciertos"] += len(texts) - len(faltantes)
+            self.metricas["fallos"] += len(faltantes)
+
+        if faltantes:
+            if self.modo == "reproducir":
+                raise EmbeddingNoGrabado(f"{len(faltantes)} texto(s) sin embedding grabado (modelo {self.modelo}), p. ej.: {texts[faltantes[0]][:80]!r}")
+            nuevos = self.base.embed_documents([texts[i] for i in faltantes])
+            with self._lock:
+                for i, vector in zip(faltantes, nuevos):
+                    vectores[i] = vector
+                    self._pendientes[claves[i]] = vector
+                self.metricas["grabados"] += len(nuevos)
+                if len(self._pendientes) >= self.filas_por_shard:
+                    self._volcar()
+        return vectores
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _volcar(self):
+        """Escribe los vectores pendientes como un shard nuevo y actualiza el índice (con el lock tomado)"""
+        if not self._pendientes:
+            return
+        claves = list(self._pendientes)
+        matriz = np.asarray([self._pendientes[c] for c in claves], dtype=np.float32)
+
+        with _bloqueo_exclusivo(self.ruta_bloqueo):
+            # Lo que otros procesos hayan volcado desde que leímos el índice
+            en_disco, numero = self._leer_indice()
+            for clave, ubicacion in en_disco.items():
+                self._indice.setdefault(clave, ubicacion)
+            while os.path.exists(os.path.join(self.directorio, f"shard_{numero:05d}.npy")):
+                numero += 1
+
+            np.save(os.path.join(self.directorio, f"shard_{numero:05d}.npy"), matriz)
+            for fila, clave in enumerate(claves):
+                self._indice[clave] = [numero, fila]
+            self._pendientes = {}
+
+            # Reemplazo atómico del índice: un corte a mitad de escritura no lo corrompe
+            temporal = self.ruta_indice + f".{os.getpid()}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump({"modelo": self.modelo, "dimension": int(matriz.shape[1]),
+                           "siguiente_shard": numero + 1, "claves": self._indice}, f)
+            os.replace(temporal, self.ruta_indice)
+
+    def guardar(self):
+        """Persiste los vectores grabados que todavía están en memoria"""
+        with self._lock:
+            self._volcar()
+
+    def __len__(self):
+        return len(self._indice) + len(self._pendientes)
+
+
+def envolver_embeddings(base, modo="off", directorio=None, modelo=None):
+    """
+    Devuelve `base` envuelto en EmbeddingsGrabadas según el modo ("off" lo devuelve sin cambios).
+    Con el modo "grabar" los vectores pendientes se guardan también al salir del proceso.
+    """
+    modo = (modo or "off").strip().lower()
+    if modo not in MODOS_CACHE:
+        raise ValueError(f"Modo de cache de embeddings inválido: {modo} (opciones: {', '.join(MODOS_CACHE)})")
+    if modo == "off":
+        return base
+    envuelto = EmbeddingsGrabadas(base, directorio or "cache_embeddings", modo=modo, modelo=modelo)
+    if modo == "grabar":
+        import atexit
+        atexit.register(envuelto.guardar)
+    return envuelto
+
+
+def envolver_desde_entorno(base, modelo=None):
+    """Igual que envolver_embeddings leyendo EMBEDDINGS_CACHE_MODO / EMBEDDINGS_CACHE_DIR del entorno"""
+    return envolver_embeddings(
+        base,
+        modo=os.environ.get("EMBEDDINGS_CACHE_MODO", "off"),
+        directorio=os.environ.get("EMBEDDINGS_CACHE_DIR", "cache_embeddings"),
+        modelo=modelo,
+    )
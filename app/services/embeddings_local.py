@@ -0,0 +1,95 @@
+# app/services/embeddings_local.py
+"""
+Backend de embeddings local (CPU) con sentence-transformers, alternativo a OpenAIEmbeddings.
+
+El modelo se carga una sola vez, limita los hilos de torch para no competir con los workers
+de la API y codifica en lotes. La dimensión depende del modelo (384 para el MiniLM multilingüe
+por defecto, contra 1536 de OpenAI), por eso la colección de Qdrant tiene que crearse con el
+mismo backend con el que se consulta.
+
+Como embeddings_cache, no importa nada de la app para poder usarse desde el loader.
+"""
+
+import threading
+import time
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+BACKENDS_EMBEDDINGS = ("openai", "local")
+MODELO_LOCAL_POR_DEFECTO = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+DIMENSION_OPENAI = 1536
+
+
+class EmbeddingsLocales(Embeddings):
+    """Embeddings en CPU con sentence-transformers (carga perezosa, lotes, hilos acotados)"""
+
+    def __init__(self, modelo=MODELO_LOCAL_POR_DEFECTO, hilos=2, tamano_lote=32, normalizar=True):
+        self.model = modelo
+        self.hilos = hilos
+        self.tamano_lote = tamano_lote
+        self.normalizar = normalizar
+        self._modelo = None
+        # encode no gana nada corriendo en paralelo con los hilos acotados: se serializa
+        self._lock = threading.Lock()
+
+    def _cargar(self):
+        if self._modelo is None:
+            with self._lock:
+                if self._modelo is None:
+                    import torch
+                    from sentence_transformers import SentenceTransformer
+                    if self.hilos:
+                        torch.set_num_threads(self.hilos)
+                    self._modelo = SentenceTransformer(self.model, device="cpu")
+        return self._modelo
+
+    @property
+    def dimension(self) -> int:
+        return self._cargar().get_sentence_embedding_dimension()
+
+    def calentar(self) -> float:
+        """Carga el modelo y codifica un texto de prueba; devuelve los segundos que tardó"""
+        inicio = time.perf_counter()
+        self.embed_query("calentamiento del modelo de embeddings")
+        return time.perf_counter() - inicio
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        modelo = self._cargar()
+        with self._lock:
+            vectores = modelo.encode(
+                list(texts),
+                batch_size=self.tamano_lote,
+                normalize_embeddings=self.normalizar,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return vectores.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def crear_embeddings(backend="openai", api_key=None, modelo_local=MODELO_LOCAL_POR_DEFECTO, hilos=2, tamano_lote=32, **kwargs_openai):
+    """
+    Crea el proveedor de embeddings del backend indicado.
+    Los kwargs_openai se pasan a OpenAIEmbeddings (p. ej. max_retries=0 en el loader).
+    """
+    backend = (backend or "openai").strip().lower()
+    if backend not in BACKENDS_EMBEDDINGS:
+        raise ValueError(f"Backend de embeddings inválido: {backend} (opciones: {', '.join(BACKENDS_EMBEDDINGS)})")
+    if backend == "local":
+        return EmbeddingsLocales(modelo=modelo_local, hilos=hilos, tamano_lote=tamano_lote)
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(api_key=api_key, **kwargs_openai)
+
+
+def dimension_embeddings(embeddings) -> int:
+    """Dimensión de los vectores del proveedor (sin llamar a la API en el caso de OpenAI)"""
+    base = embeddings
+    while hasattr(base, "base"):  # EmbeddingsGrabadas / EmbeddingsLimitadas envuelven al proveedor real
+        base = base.base
+    if isinstance(base, EmbeddingsLocales):
+        return base.dimension
+    dimensiones = getattr(base, "dimensions", None)
+    return dimensiones or DIMENSION_OPENAI
@@ -0,0 +1,145 @@
+# app/services/exportacion.py
+"""
+Exportación de consultas en streaming para análisis (CSV o Parquet).
+
+Las filas se leen del cursor de a lotes con fetchmany() y cada lote se serializa y se entrega
+antes de leer el siguiente, así la memoria no depende del tamaño de la exportación. El cursor
+debe ser de servidor (pymysql SSDictCursor) o perezoso (sqlite3); las filas se leen por nombre
+de columna (sqlite3.Row o dict).
+
+Parquet usa pyarrow si está instalado (opcional): cada lote es un row group del archivo.
+"""
+
+import csv
+import io
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+COLUMNAS_EXPORTACION = (
+    "id_consulta", "timestamp", "id_usuario", "ugel_origen", "pregunta_usuario", "respuesta_asistente",
+    "respuesta_es_vacia", "respuesta_util", "tokens_input", "tokens_output", "tiempo_respuesta_ms",
+    "id_prompt_usado", "modelo_llm_usado", "comentario", "error_detectado", "tipo_error", "mensaje_error",
+)
+
+TIPOS_MEDIA = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# id_prompt_usado va como texto: hay filas que guardan el nombre del archivo de prompt de respaldo
+_COLUMNAS_ENTERAS = {"id_consulta", "id_usuario", "tokens_input", "tokens_output", "tiempo_respuesta_ms"}
+_COLUMNAS_BOOLEANAS = {"respuesta_es_vacia", "error_detectado"}
+
+
+def parquet_disponible():
+    return pa is not None
+
+
+def _lotes(cursor, tamano_lote):
+    while True:
+        filas = cursor.fetchmany(tamano_lote)
+        if not filas:
+            return
+        yield filas
+
+
+def _a_datetime(valor):
+    """SQLite devuelve el timestamp como texto; MySQL como datetime"""
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    return datetime.fromisoformat(str(valor))
+
+
+def generar_csv(cursor, tamano_lote=1000):
+    """Bytes UTF-8 del CSV: encabezado y luego un bloque por lote (con BOM para que Excel detecte la codificación)"""
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(COLUMNAS_EXPORTACION)
+    yield ("\ufeff" + salida.getvalue()).encode("utf-8")
+    for filas in _lotes(cursor, tamano_lote):
+        salida.seek(0)
+        salida.truncate(0)
+        for fila in filas:
+            escritor.writerow([fila[columna] for columna in COLUMNAS_EXPORTACION])
+        yield salida.getvalue().encode("utf-8")
+
+
+class _SumideroBytes:
+    """Archivo de sólo escritura para ParquetWriter que se vacía después de cada row group"""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+        self.closed = False
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+def _esquema_parquet():
+    campos = []
+    for columna in COLUMNAS_EXPORTACION:
+        if columna in _COLUMNAS_ENTERAS:
+            tipo = pa.int64()
+        elif columna in _COLUMNAS_BOOLEANAS:
+            tipo = pa.bool_()
+        elif columna == "timestamp":
+            tipo = pa.timestamp("us")
+        else:
+            tipo = pa.string()
+        campos.append(pa.field(columna, tipo))
+    return pa.schema(campos)
+
+
+def generar_parquet(cursor, tamano_lote=1000):
+    """Bytes del archivo Parquet: un row group por lote y el pie (footer) al final"""
+    if pa is None:
+        raise RuntimeError("pyarrow no está instalado: no se puede exportar en Parquet")
+    esquema = _esquema_parquet()
+    sumidero = _SumideroBytes()
+    escritor = pq.ParquetWriter(sumidero, esquema, compression="snappy")
+    try:
+        for filas in _lotes(cursor, tamano_lote):
+            columnas = {}
+            for columna in COLUMNAS_EXPORTACION:
+                valores = [fila[columna] for fila in filas]
+                if columna == "timestamp":
+                    valores = [_a_datetime(v) for v in valores]
+                elif columna in _COLUMNAS_BOOLEANAS:
+                    valores = [None if v is None else bool(v) for v in valores]
+                elif columna not in _COLUMNAS_ENTERAS:
+                    valores = [None if v is None else str(v) for v in valores]
+                columnas[columna] = valores
+            escritor.write_table(pa.Table.from_pydict(columnas, schema=esquema))
+            yield sumidero.vaciar()
+    finally:
+        escritor.close()
+    yield sumidero.vaciar()
+
+
+def generar(formato, cursor, tamano_lote=1000):
+    if formato == "parquet":
+        return generar_parquet(cursor, tamano_lote)
+    return generar_csv(cursor, tamano_lote)
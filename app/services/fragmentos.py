@@ -0,0 +1,61 @@
+# app/services/fragmentos.py
+from typing import List, Tuple
+from langchain_core.documents import Document
+
+# Metadatos internos de la carga que no aportan nada al prompt
+METADATOS_INTERNOS = ("hash_contenido", "overlap_chars", "fecha_carga")
+
+def unir_fragmentos_adyacentes(documentos_con_score: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+    """
+    Une los chunks consecutivos de un mismo registro (mismo id_sub, chunk_index contiguos)
+    recuperados en una misma búsqueda, quitando el solapamiento que la carga repite al inicio
+    de cada chunk. Se conserva el orden de relevancia del primer chunk de cada grupo y su score.
+    Los documentos cargados sin fragmentación (sin chunk_index) pasan sin cambios.
+
+    Args:
+        documentos_con_score: Resultados de similarity_search_with_score
+
+    Returns:
+        Lista de (Document, score) con los chunks adyacentes unidos
+    """
+    grupos = {}
+    orden = []
+    for posicion, (doc, score) in enumerate(documentos_con_score):
+        id_sub = doc.metadata.get("id_sub")
+        if doc.metadata.get("chunk_index") is None or id_sub in (None, ""):
+            clave = ("sin_chunk", posicion)
+        else:
+            clave = ("id_sub", id_sub)
+        if clave not in grupos:
+            grupos[clave] = []
+            orden.append(clave)
+        grupos[clave].append((doc, score))
+
+    resultado = []
+    for clave in orden:
+        miembros = grupos[clave]
+        if clave[0] == "sin_chunk":
+            resultado.extend(miembros)
+            continue
+
+        # Dentro de un registro: ordenar por índice y unir las corridas contiguas
+        score_grupo = miembros[0][1]
+        miembros = sorted(miembros, key=lambda par: par[0].metadata["chunk_index"])
+        corridas = [[miembros[0][0]]]
+        for doc, _ in miembros[1:]:
+            if doc.metadata["chunk_index"] == corridas[-1][-1].metadata["chunk_index"] + 1:
+                corridas[-1].append(doc)
+            elif doc.metadata["chunk_index"] != corridas[-1][-1].metadata["chunk_index"]:
+                corridas.append([doc])
+
+        for corrida in corridas:
+            texto = corrida[0].page_content
+            for doc in corrida[1:]:
+                texto += "\n" + doc.page_content[int(doc.metadata.get("overlap_chars") or 0):]
+            metadata = {k: v for k, v in corrida[0].metadata.items() if k not in METADATOS_INTERNOS}
+            metadata["chunk_index"] = corrida[0].metadata["chunk_index"]
+            if len(corrida) > 1:
+                metadata["chunk_hasta"] = corrida[-1].metadata["chunk_index"]
+            resultado.append((Document(page_content=texto, metadata=metadata), score_grupo))
+
+    return resultado
@@ -1,5 +1,4 @@
 # app/services/graph_logic.py
-from qdrant_client import QdrantClient
 from qdrant_client.http.exceptions import UnexpectedResponse
 from langchain_qdrant import Qdrant
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
@@ -7,8 +6,12 @@ from langgraph.graph import MessagesState, StateGraph
 from langgraph.prebuilt import ToolNode
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from app.services.token_utils import contar_tokens, validar_palabras, reducir_contenido_por_palabras
+from app.services.fragmentos import unir_fragmentos_adyacentes
 from app.core.logging_config import log_message, get_logger
-from app.core.config import qdrant_url, collection_name_fragmento, model_name
+from app.core.config import collection_name_fragmento, model_name, openai_api_key, embeddings_backend
+from app.core.dependencies import get_embeddings, get_qdrant_client, get_vector_store, get_llm, invocar_llm, buscar_similares, limitador_embeddings
+from app.services.limitador import LimiteExcedido, EmbeddingsLimitadas
+from app.services.plazo import PlazoAgotado, stop_sin_plazo, wait_dentro_del_plazo, verificar_plazo
 import traceback
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, retry_if_not_exception_type, before_sleep_log
 from openai import RateLimitError, APITimeoutError, APIConnectionError, APIError
@@ -38,32 +41,31 @@ def build_graph(question, fecha_desde=None, fecha_hasta=None, k=None, api_key=No
     Returns:
         tuple: (graph, human_message)
     """
-    # Inicializar embeddings
-    embeddings = OpenAIEmbeddings(api_key=api_key)
-    
-    # Inicializar el cliente de Qdrant
-    qdrant_client = QdrantClient(url=qdrant_url)
-    
-    # Crear objeto Qdrant para búsqueda vectorial
-    vector_store = Qdrant(
-        client=qdrant_client,
-        collection_name=collection_name_fragmento,
-        embeddings=embeddings
-    )
-    
-    # Inicializar el modelo LLM
-    llm = ChatOpenAI(model=model_name, temperature=0, api_key=api_key)
+    # Reutilizar los singletons (cliente Qdrant HTTP/gRPC compartido, embeddings y LLM)
+    # en lugar de abrir una conexión nueva por cada pregunta
+    if not api_key or api_key == openai_api_key:
+        vector_store = get_vector_store()
+        llm = get_llm()
+    else:
+        # API key distinta a la configurada: instancias propias sobre el mismo cliente Qdrant
+        # (con el backend local los embeddings no usan API key y se reutiliza el singleton)
+        vector_store = Qdrant(
+            client=get_qdrant_client(),
+            collection_name=collection_name_fragmento,
+            embeddings=get_embeddings() if embeddings_backend == 'local' else EmbeddingsLimitadas(OpenAIEmbeddings(api_key=api_key), limitador_embeddings)
+        )
+        llm = ChatOpenAI(model=model_name, temperature=0, api_key=api_key)
     
     # Función para realizar búsqueda en Qdrant con reintentos
     @retry(
         retry=retry_if_exception_type((UnexpectedResponse, ConnectionError, TimeoutError)),
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=20),
+        stop=stop_after_attempt(3) | stop_sin_plazo(),
+        wait=wait_dentro_del_plazo(wait_exponential(multiplier=1, min=2, max=20)),
         before_sleep=before_sleep_log(logger, logger.level)
     )
     def _similarity_search_with_retry(query, k_value):
         """Ejecuta similarity_search_with_score con reintentos automáticos en caso de errores de conexión"""
-        return vector_store.similarity_search_with_score(query, k=k_value)
+        return buscar_similares(vector_store, query, k_value)
     
     # Función de retrieve
     def retrieve(query: str):
@@ -81,8 +83,11 @@ def build_graph(question, fecha_desde=None, fecha_hasta=None, k=None, api_key=No
         try:
             # Usamos la función con reintentos
             retrieved_docs = _similarity_search_with_retry(query, k_value)
+            cantidad_fragmentos = len(retrieved_docs)
+            # Unir chunks contiguos de un mismo registro (sin repetir el solapamiento)
+            retrieved_docs = unir_fragmentos_adyacentes(retrieved_docs)
             documentos_relevantes = [doc for doc, score in retrieved_docs]
-            cantidad_fragmentos = len(documentos_relevantes)
+            log_message(f"Fragmentos tras unir chunks adyacentes: {len(documentos_relevantes)}")
             
             # Guardar la cantidad de fragmentos
             retrieve_stats.document_count = cantidad_fragmentos
@@ -102,7 +107,12 @@ def build_graph(question, fecha_desde=None, fecha_hasta=None, k=None, api_key=No
             log_message(f"Total tokens en retrieve: {tokens_consulta + tokens_respuesta_retrieve}")
             
             return serialized
+        except (LimiteExcedido, PlazoAgotado):
+            # Sin lugar en el limitador (429/503) o sin plazo (respuesta degradada): se corta el request
+            raise
         except Exception as e:
+            # Un timeout de Qdrant con el presupuesto ya consumido es plazo agotado, no un error de búsqueda
+            verificar_plazo("busqueda_qdrant")
             error_msg = f"Error al realizar la búsqueda en Qdrant después de múltiples intentos: {str(e)}"
             log_message(error_msg, level='ERROR')
             log_message(traceback.format_exc(), level='ERROR')
@@ -111,13 +121,13 @@ def build_graph(question, fecha_desde=None, fecha_hasta=None, k=None, api_key=No
     # Función para invocar LLM con reintentos
     @retry(
         retry=retry_if_exception_type((RateLimitError, APITimeoutError, APIConnectionError, APIError)),
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=30),
+        stop=stop_after_attempt(3) | stop_sin_plazo(),
+        wait=wait_dentro_del_plazo(wait_exponential(multiplier=1, min=4, max=30)),
         before_sleep=before_sleep_log(logger, logger.level)
     )
     def _invoke_llm_with_retry(llm_instance, messages):
-        """Invoca LLM con reintentos en caso de error de API"""
-        return llm_instance.invoke(messages)
+        """Invoca LLM con reintentos en caso de error de API (cada intento pasa por el limitador de OpenAI)"""
+        return invocar_llm(llm_instance, messages)
     
     # Nodo 1: Generar consulta o responder directamente
     def query_or_respond(state: MessagesState):
@@ -141,6 +151,8 @@ def build_graph(question, fecha_desde=None, fecha_hasta=None, k=None, api_key=No
             log_message(f"Total tokens en query_or_respond: {tokens_entrada_qor + tokens_salida_qor}")
             
             return {"messages": [response]}
+        except (LimiteExcedido, PlazoAgotado):
+            raise
         except Exception as e:
             error_msg = f"Error al invocar LLM en query_or_respond después de múltiples intentos: {str(e)}"
             log_message(error_msg, level='ERROR')
@@ -151,7 +163,8 @@ def build_graph(question, fecha_desde=None, fecha_hasta=None, k=None, api_key=No
             return {"messages": [error_response]}
     
     # Nodo 2: Ejecutar la herramienta de recuperación
-    tools = ToolNode([retrieve])
+    # handle_tool_errors=False: retrieve ya maneja sus errores, sólo propaga LimiteExcedido
+    tools = ToolNode([retrieve], handle_tool_errors=False)
     
     # Nodo 3: Generar la respuesta final
     def generate(state: MessagesState):
@@ -217,6 +230,8 @@ quienes se encargan de atender las consultas de los afiliados.
             log_message(f"Total tokens consumidos: {tokens_entrada + tokens_salida}")
             
             return {"messages": [response]}
+        except (LimiteExcedido, PlazoAgotado):
+            raise
         except Exception as e:
             error_msg = f"Error al invocar LLM en generate después de múltiples intentos: {str(e)}"
             log_message(error_msg, level='ERROR')
@@ -0,0 +1,235 @@
+# app/services/limitador.py
+"""
+Limitador de llamadas a OpenAI (LLM y embeddings) con contrapresión.
+
+Combina dos cubos de tokens (requests por minuto y tokens por minuto) con un máximo de
+llamadas simultáneas. Una llamada que no entra espera en cola sólo mientras le alcance la
+espera máxima: si el cubo indica que no va a haber capacidad a tiempo se rechaza en el acto
+con LimiteExcedido (que la API traduce a 429/503 con Retry-After) en lugar de colgar el thread
+en los reintentos de tenacity.
+
+Los límites son por proceso: con varios workers de uvicorn/gunicorn se reparte la cuota de la
+cuenta entre ellos (ver openai_workers en config.py).
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+from openai import RateLimitError
+
+from app.services.plazo import PlazoAgotado, tiempo_restante
+
+
+class LimiteExcedido(Exception):
+    """La llamada no consiguió lugar en el limitador dentro de la espera máxima"""
+
+    def __init__(self, recurso, motivo, retry_after):
+        self.recurso = recurso
+        self.motivo = motivo
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+        # Saturación propia (cola de concurrencia llena) = 503; cuota de OpenAI = 429
+        self.status_code = 503 if motivo == "concurrencia" else 429
+        super().__init__(f"Límite de {recurso} excedido ({motivo}); reintentar en {self.retry_after} s")
+
+
+class CuboTokens:
+    """Cubo de tokens que se recarga de forma continua hasta `capacidad` por minuto (sin lock propio)"""
+
+    def __init__(self, capacidad_por_minuto):
+        self.capacidad = float(capacidad_por_minuto)
+        self.tasa = self.capacidad / 60.0
+        self.disponible = self.capacidad
+        self._ultimo = time.monotonic()
+
+    def _recargar(self, ahora):
+        self.disponible = min(self.capacidad, self.disponible + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def espera_para(self, cantidad, ahora):
+        """Segundos hasta que haya `cantidad` disponible (una cantidad mayor que la capacidad espera al cubo lleno)"""
+        self._recargar(ahora)
+        faltante = min(cantidad, self.capacidad) - self.disponible
+        return faltante / self.tasa if faltante > 0 else 0.0
+
+    def consumir(self, cantidad):
+        # Puede quedar negativo al ajustar con el consumo real: las siguientes llamadas lo devuelven
+        self.disponible -= cantidad
+
+
+class Reserva:
+    """Lugar obtenido en el limitador; permite ajustar el TPM con los tokens reales consumidos"""
+
+    def __init__(self, limitador, tokens):
+        self.limitador = limitador
+        self.tokens = tokens
+
+    def ajustar_tokens(self, tokens_reales):
+        if tokens_reales:
+            self.limitador._ajustar_tokens(tokens_reales - self.tokens)
+            self.tokens = tokens_reales
+
+
+class LimitadorOpenAI:
+    """Limitador RPM + TPM + concurrencia, seguro entre threads"""
+
+    def __init__(self, nombre, rpm=0, tpm=0, max_concurrentes=0, espera_maxima=10.0):
+        self.nombre = nombre
+        self.max_concurrentes = max_concurrentes
+        self.espera_maxima = espera_maxima
+        self._rpm = CuboTokens(rpm) if rpm else None
+        self._tpm = CuboTokens(tpm) if tpm else None
+        self._condicion = threading.Condition()
+        self._concurrentes = 0
+        self._en_cola = 0
+        self._bloqueado_hasta = 0.0
+        self._esperas_ms = deque(maxlen=1000)
+        self.metricas = {"admitidos": 0, "rechazados": 0, "errores_429": 0}
+
+    def _espera_necesaria(self, tokens, ahora):
+        """(segundos, motivo) hasta poder admitir la llamada; segundos None = esperar a que se libere un lugar"""
+        esperas = [(self._bloqueado_hasta - ahora, "bloqueo_429")]
+        if self._rpm:
+            esperas.append((self._rpm.espera_para(1, ahora), "rpm"))
+        if self._tpm:
+            esperas.append((self._tpm.espera_para(tokens, ahora), "tpm"))
+        espera, motivo = max(esperas)
+        if espera > 0:
+            return espera, motivo
+        if self.max_concurrentes and self._concurrentes >= self.max_concurrentes:
+            return None, "concurrencia"
+        return 0.0, None
+
+    @contextmanager
+    def reservar(self, tokens=1, espera_maxima=None):
+        """
+        Espera un lugar para una llamada de `tokens` estimados.
+        Lanza LimiteExcedido si no lo obtiene antes de espera_maxima segundos, o PlazoAgotado si
+        lo que corta la espera es el plazo del request.
+        """
+        espera_maxima = self.espera_maxima if espera_maxima is None else espera_maxima
+        restante = tiempo_restante()
+        corta_el_plazo = restante is not None and restante < espera_maxima
+        if corta_el_plazo:
+            espera_maxima = max(0.0, restante)
+        inicio = time.monotonic()
+        limite = inicio + espera_maxima
+        with self._condicion:
+            self._en_cola += 1
+            try:
+                while True:
+                    ahora = time.monotonic()
+                    espera, motivo = self._espera_necesaria(tokens, ahora)
+                    if espera == 0.0:
+                        break
+                    restante = limite - ahora
+                    if restante <= 0 or (espera is not None and espera > restante):
+                        self.metricas["rechazados"] += 1
+                        if corta_el_plazo:
+                            raise PlazoAgotado(f"cola del limitador {self.nombre}")
+                        raise LimiteExcedido(self.nombre, motivo, espera if espera is not None else 1.0)
+                    self._condicion.wait(timeout=min(espera, restante) if espera is not None else restante)
+                if self._rpm:
+                    self._rpm.consumir(1)
+                if self._tpm:
+                    self._tpm.consumir(tokens)
+                self._concurrentes += 1
+                self.metricas["admitidos"] += 1
+                self._esperas_ms.append((time.monotonic() - inicio) * 1000)
+            finally:
+                self._en_cola -= 1
+        try:
+            yield Reserva(self, tokens)
+        finally:
+            with self._condicion:
+                self._concurrentes -= 1
+                self._condicion.notify_all()
+
+    def _ajustar_tokens(self, diferencia):
+        if self._tpm and diferencia:
+            with self._condicion:
+                self._tpm.consumir(diferencia)
+
+    def penalizar(self, segundos):
+        """OpenAI respondió 429: nadie llama hasta que pase `segundos`"""
+        with self._condicion:
+            self.metricas["errores_429"] += 1
+            self._bloqueado_hasta = max(self._bloqueado_hasta, time.monotonic() + segundos)
+
+    def estado(self):
+        with self._condicion:
+            ahora = time.monotonic()
+            esperas = sorted(self._esperas_ms)
+
+            def percentil(p):
+                if not esperas:
+                    return 0.0
+                return round(esperas[max(0, min(len(esperas) - 1, math.ceil(p / 100.0 * len(esperas)) - 1))], 1)
+
+            if self._rpm:
+                self._rpm._recargar(ahora)
+            if self._tpm:
+                self._tpm._recargar(ahora)
+            return {
+                "nombre": self.nombre,
+                "en_cola": self._en_cola,
+                "concurrentes": self._concurrentes,
+                "max_concurrentes": self.max_concurrentes,
+                "rpm_disponibles": round(self._rpm.disponible, 1) if self._rpm else None,
+                "tpm_disponibles": round(self._tpm.disponible, 1) if self._tpm else None,
+                "bloqueado_segundos": round(max(0.0, self._bloqueado_hasta - ahora), 1),
+                "espera_ms_p50": percentil(50),
+                "espera_ms_p95": percentil(95),
+                "espera_ms_max": round(esperas[-1], 1) if esperas else 0.0,
+                **self.metricas,
+            }
+
+
+def segundos_retry_after(error, defecto=5.0):
+    """Lee el Retry-After de un RateLimitError de OpenAI (si la respuesta lo trae)"""
+    respuesta = getattr(error, "response", None)
+    valor = respuesta.headers.get("retry-after") if respuesta is not None else None
+    try:
+        return float(valor) if valor else defecto
+    except ValueError:
+        return defecto
+
+
+class EmbeddingsLimitadas(Embeddings):
+    """
+    Proveedor de embeddings que pasa cada llamada por un LimitadorOpenAI; un 429 de OpenAI frena
+    al resto de las llamadas del proceso durante el Retry-After (como invocar_llm con el LLM)
+    """
+
+    def __init__(self, base, limitador, contar_tokens=None):
+        self.base = base
+        self.limitador = limitador
+        self.contar_tokens = contar_tokens or (lambda texto: len(texto) // 4 + 1)
+
+    @property
+    def model(self):
+        return getattr(self.base, "model", None)
+
+    @property
+    def dimensions(self):
+        return getattr(self.base, "dimensions", None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.limitador.reservar(sum(self.contar_tokens(t) for t in texts)):
+            try:
+                return self.base.embed_documents(texts)
+            except RateLimitError as e:
+                self.limitador.penalizar(segundos_retry_after(e))
+                raise
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.limitador.reservar(self.contar_tokens(text)):
+            try:
+                return self.base.embed_query(text)
+            except RateLimitError as e:
+                self.limitador.penalizar(segundos_retry_after(e))
+                raise
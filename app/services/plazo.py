@@ -0,0 +1,95 @@
+# app/services/plazo.py
+"""
+Plazo (deadline) por request propagado con contextvars a todas las etapas del pipeline RAG.
+
+El middleware de la app fija el plazo al recibir el request (config o header X-Request-Timeout-Ms);
+el contexto viaja al threadpool y a los nodos de LangGraph, así que cada etapa puede preguntar
+cuánto le queda: los reintentos de tenacity sólo siguen mientras quede presupuesto y los timeouts
+de Qdrant y OpenAI salen del tiempo restante. Sin plazo fijado (scripts, arranque) todo se
+comporta como antes.
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from tenacity.stop import stop_base
+from tenacity.wait import wait_base
+
+RESPUESTA_DEGRADADA = (
+    "Lo siento, la consulta tardó más de lo esperado y no pude completar la respuesta. "
+    "Por favor, intenta nuevamente en unos momentos."
+)
+
+_limite: ContextVar[Optional[float]] = ContextVar("limite_plazo_request", default=None)
+
+
+class PlazoAgotado(Exception):
+    """Se terminó el presupuesto de tiempo del request"""
+
+    def __init__(self, etapa):
+        self.etapa = etapa
+        super().__init__(f"Plazo del request agotado en la etapa: {etapa}")
+
+
+def iniciar_plazo(segundos):
+    """Fija el plazo del contexto actual; devuelve el token para restablecer_plazo"""
+    return _limite.set(time.monotonic() + segundos if segundos else None)
+
+
+def restablecer_plazo(token):
+    _limite.reset(token)
+
+
+def tiempo_restante() -> Optional[float]:
+    """Segundos que quedan del plazo (None si el contexto no tiene plazo)"""
+    limite = _limite.get()
+    return None if limite is None else limite - time.monotonic()
+
+
+def verificar_plazo(etapa, minimo=0.0):
+    """Lanza PlazoAgotado si quedan `minimo` segundos o menos"""
+    restante = tiempo_restante()
+    if restante is not None and restante <= minimo:
+        raise PlazoAgotado(etapa)
+
+
+def timeout_para_etapa(etapa, maximo=None, minimo=0.5):
+    """
+    Timeout para una llamada externa: el menor entre `maximo` y lo que queda del plazo.
+    Si queda menos de `minimo` segundos no vale la pena intentar la llamada.
+    """
+    restante = tiempo_restante()
+    if restante is None:
+        return maximo
+    if restante <= minimo:
+        raise PlazoAgotado(etapa)
+    return restante if maximo is None else min(maximo, restante)
+
+
+class stop_sin_plazo(stop_base):
+    """Corta los reintentos si después de la próxima espera no quedaría `margen` de presupuesto"""
+
+    def __init__(self, margen=1.0):
+        self.margen = margen
+
+    def __call__(self, retry_state) -> bool:
+        restante = tiempo_restante()
+        if restante is None:
+            return False
+        return restante - (retry_state.upcoming_sleep or 0) <= self.margen
+
+
+class wait_dentro_del_plazo(wait_base):
+    """Envuelve una espera de tenacity para que nunca duerma más que el tiempo restante"""
+
+    def __init__(self, espera, margen=1.0):
+        self.espera = espera
+        self.margen = margen
+
+    def __call__(self, retry_state) -> float:
+        segundos = self.espera(retry_state)
+        restante = tiempo_restante()
+        if restante is None:
+            return segundos
+        return max(0.0, min(segundos, restante - self.margen))
@@ -14,6 +14,8 @@ from langchain_core.prompts import PromptTemplate
 from app.core.config import model_name, max_results, collection_name_fragmento, qdrant_url, openai_api_key
 from app.core.logging_config import get_logger
 from app.core.dependencies import get_embeddings, get_qdrant_client, get_vector_store, get_llm
+from app.services.limitador import LimiteExcedido
+from app.services.plazo import PlazoAgotado, RESPUESTA_DEGRADADA
 from langgraph.graph import MessagesState, StateGraph
 from langgraph.prebuilt import ToolNode
 
@@ -45,6 +47,12 @@ def process_question(question, fecha_desde=None, fecha_hasta=None, k=None):
         if not answer:
             answer = "No se pudo generar una respuesta."
     
+    except LimiteExcedido:
+        # Lo traduce a 429/503 el manejador de excepciones de la app
+        raise
+    except PlazoAgotado as e:
+        logger.warning(f"Respuesta degradada: {str(e)}")
+        answer = RESPUESTA_DEGRADADA
     except Exception as e:
         logger.error(f"Error procesando la pregunta: {str(e)}")
         logger.error(traceback.format_exc())
@@ -1,13 +1,18 @@
 # app/services/prompt_service.py
 import os
 import sys
+import threading
+import time
 from pathlib import Path
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 from dotenv import load_dotenv
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from BD_RELA.create_tables import aplicar_perfil_sqlite
+
 # Cargar variables de entorno
 load_dotenv()
 
@@ -17,6 +22,14 @@ logger = logging.getLogger(__name__)
 # Prompt por defecto hardcodeado
 DEFAULT_PROMPT = "Hola, soy tu asistente. ¿En qué puedo ayudarte?"
 
+# Segundos que se reutiliza el prompt resuelto antes de volver a consultarlo (0 = sin cache).
+# El prompt activo se cambia desde los scripts de BD_RELA: el cambio se ve en a lo sumo este tiempo.
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", "60"))
+
+_prompt_cacheado = None
+_prompt_expira = 0.0
+_lock_prompt = threading.Lock()
+
 def get_database_engine():
     """
     Crea y retorna un motor de base de datos.
@@ -69,6 +82,10 @@ def get_database_engine():
         
         sqlite_url = f"sqlite:///{sqlite_path}"
         engine = create_engine(sqlite_url)
+
+        @event.listens_for(engine, "connect")
+        def set_sqlite_pragma(dbapi_connection, connection_record):
+            aplicar_perfil_sqlite(dbapi_connection)
         
         # Probar la conexión
         with engine.connect() as conn:
@@ -157,6 +174,31 @@ def get_prompt_from_file():
         return None, None
 
 def get_system_prompt():
+    """
+    Devuelve el prompt del sistema (ver _resolver_system_prompt) cacheado PROMPT_CACHE_TTL segundos,
+    para no abrir una conexión a la base por cada pregunta.
+    """
+    global _prompt_cacheado, _prompt_expira
+    if _prompt_cacheado is not None and time.monotonic() < _prompt_expira:
+        return _prompt_cacheado
+    with _lock_prompt:
+        # Otro thread pudo haberlo resuelto mientras se esperaba el lock
+        if _prompt_cacheado is not None and time.monotonic() < _prompt_expira:
+            return _prompt_cacheado
+        resultado = _resolver_system_prompt()
+        if PROMPT_CACHE_TTL > 0:
+            _prompt_cacheado = resultado
+            _prompt_expira = time.monotonic() + PROMPT_CACHE_TTL
+        return resultado
+
+def invalidar_cache_prompt():
+    """Descarta el prompt cacheado (la próxima llamada lo vuelve a resolver)"""
+    global _prompt_cacheado, _prompt_expira
+    with _lock_prompt:
+        _prompt_cacheado = None
+        _prompt_expira = 0.0
+
+def _resolver_system_prompt():
     """
     Obtiene el prompt del sistema siguiendo la jerarquía de fallbacks:
     1. Base de datos (prompt activo)
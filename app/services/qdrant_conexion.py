@@ -0,0 +1,38 @@
+# app/services/qdrant_conexion.py
+"""
+Conexión a Qdrant compartida por la API (app/core/dependencies.py) y la carga de la base
+vectorial (CARGA_BDV/carga_bdv_q1.py, versiones_qdrant.py): parámetros de construcción de
+QdrantClient (cada uno pasa los valores de transporte de su configuración, .env / config.ini)
+y resolución de aliases de colecciones.
+"""
+
+
+def obtener_parametros_cliente_qdrant(url, timeout, prefer_grpc=False, grpc_port=6334, keepalive_ms=30000):
+    """
+    Devuelve los parámetros de construcción de QdrantClient según el transporte indicado.
+    En modo gRPC el canal se mantiene vivo con keepalive para reutilizar la conexión entre búsquedas.
+    """
+    parametros = {"url": url, "timeout": timeout}
+    if prefer_grpc:
+        parametros.update({
+            "prefer_grpc": True,
+            "grpc_port": grpc_port,
+            "grpc_options": {
+                "grpc.keepalive_time_ms": keepalive_ms,
+                "grpc.keepalive_timeout_ms": max(keepalive_ms // 3, 1000),
+                "grpc.keepalive_permit_without_calls": 1,
+                "grpc.http2.max_pings_without_data": 0,
+                # Upserts masivos: permitir mensajes grandes (lotes de vectores de 1536 floats)
+                "grpc.max_send_message_length": 64 * 1024 * 1024,
+                "grpc.max_receive_message_length": 64 * 1024 * 1024,
+            },
+        })
+    return parametros
+
+
+def resolver_alias(client, alias):
+    """Devuelve la colección a la que apunta el alias, o None si el alias no existe"""
+    for descripcion in client.get_aliases().aliases:
+        if descripcion.alias_name == alias:
+            return descripcion.collection_name
+    return None
@@ -0,0 +1,88 @@
+# app/services/registro_ugl.py
+"""
+Registro en memoria de las UGL conocidas, para no recorrer consultas en cada carga de las
+páginas de administración. Se siembra desde la base (usuarios + UGL ya presentes en consultas),
+se amplía con la UGL de cada consulta nueva y se vuelve a leer de la base al vencer el TTL.
+
+Es por proceso: una UGL nueva registrada en otro worker de gunicorn aparece aquí a más tardar
+al vencer el TTL.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from app.core.config import ugls_cache_ttl
+
+
+class RegistroUGL:
+    """Conjunto de UGL con recarga por TTL y versión (ETag) que cambia cuando cambia el contenido"""
+
+    def __init__(self, ttl=3600.0):
+        self.ttl = ttl
+        self._ugls = None  # None = sin cargar todavía
+        self._vence = 0.0
+        self._lista = []
+        self._etag = None
+        self._recientes = set()  # registradas desde la última carga
+        self._lock = threading.Lock()
+        self.metricas = {"cargas": 0, "aciertos": 0, "registradas": 0}
+
+    def _publicar(self):
+        """Recalcula la lista ordenada y su ETag; llamar con el lock tomado"""
+        self._lista = sorted(self._ugls)
+        resumen = hashlib.sha1(json.dumps(self._lista, ensure_ascii=False).encode("utf-8")).hexdigest()
+        self._etag = f'"ugl-{resumen[:16]}"'
+
+    def obtener(self, cargar):
+        """
+        Devuelve (lista ordenada de UGL, ETag). Si no hay datos vigentes los lee con `cargar()`,
+        una función sin argumentos que devuelve un iterable de nombres de UGL.
+        """
+        with self._lock:
+            if self._ugls is not None and time.monotonic() < self._vence:
+                self.metricas["aciertos"] += 1
+                return self._lista, self._etag
+
+        # La lectura se hace fuera del lock para no bloquear a registrar() durante la consulta
+        ugls = {u for u in cargar() if u}
+        with self._lock:
+            # Conservar lo registrado desde la carga anterior: puede no haber estado confirmado al leer
+            ugls |= self._recientes
+            self._recientes = set()
+            self._ugls = ugls
+            self._vence = time.monotonic() + self.ttl
+            self._publicar()
+            self.metricas["cargas"] += 1
+            return self._lista, self._etag
+
+    def registrar(self, ugel):
+        """Agrega una UGL (p. ej. la de una consulta recién insertada); no hace nada si ya se conocía"""
+        if not ugel:
+            return
+        with self._lock:
+            if self._ugls is None or ugel in self._ugls:
+                return
+            self._ugls.add(ugel)
+            self._recientes.add(ugel)
+            self._publicar()
+            self.metricas["registradas"] += 1
+
+    def invalidar(self):
+        """Fuerza la relectura de la base en el próximo obtener()"""
+        with self._lock:
+            self._vence = 0.0
+
+    def estado(self):
+        with self._lock:
+            return {
+                "nombre": "ugls",
+                "entradas": len(self._ugls) if self._ugls is not None else 0,
+                "ttl_segundos": self.ttl,
+                "etag": self._etag,
+                **self.metricas,
+            }
+
+
+registro_ugl = RegistroUGL(ttl=ugls_cache_ttl)
@@ -0,0 +1,304 @@
+# app/services/rollup_service.py
+"""
+Agregados diarios de consultas (tabla consultas_diarias) para las estadísticas de administración.
+
+Una fila por (fecha, ugel_origen, respuesta_util, respuesta_es_vacia) con la cantidad de
+consultas y las sumas de tokens y tiempo de respuesta. Se mantiene de forma incremental en la
+misma transacción que modifica consultas: +1 al persistir una consulta y, cuando llega feedback,
+-1 en el grupo anterior de respuesta_util y +1 en el nuevo (calculado en SQL desde la fila). BD_RELA/backfill_consultas_diarias.py
+la reconstruye desde consultas para bases existentes o ante cualquier desvío.
+
+Las funciones reciben un cursor DB-API (sqlite3 o pymysql) y el dialecto ('sqlite' o 'mysql');
+las filas se leen por nombre de columna (sqlite3.Row o DictCursor).
+Si la tabla no existe todavía, el mantenimiento se omite y los endpoints usan consultas.
+"""
+
+import re
+import threading
+import time
+from datetime import date, timedelta
+
+TABLA_ROLLUP = "consultas_diarias"
+
+# Valores con los que se guardan en la clave los NULL de consultas (las columnas de una PK no admiten NULL)
+SIN_UGEL = "Sin UGEL"
+SIN_CLASIFICAR = "sin clasificar"
+VACIA_SIN_DATO = -1
+
+COLUMNAS_SUMA = ("cantidad", "tokens_input", "tokens_output", "tiempo_respuesta_ms", "cantidad_con_tiempo")
+
+_COLUMNAS_INSERT = """
+    INSERT INTO consultas_diarias (fecha, ugel_origen, respuesta_util, respuesta_es_vacia,
+        cantidad, tokens_input, tokens_output, tiempo_respuesta_ms, cantidad_con_tiempo)
+"""
+
+# Si el grupo ya existe se suman los valores nuevos a los que tiene
+_CONFLICTO = {
+    "sqlite": """
+    ON CONFLICT (fecha, ugel_origen, respuesta_util, respuesta_es_vacia) DO UPDATE SET
+""" + ",\n".join(f"        {c} = {c} + excluded.{c}" for c in COLUMNAS_SUMA),
+    # Calificadas: en INSERT ... SELECT FROM consultas, tokens_input etc. existen en ambas tablas
+    "mysql": """
+    ON DUPLICATE KEY UPDATE
+""" + ",\n".join(f"        consultas_diarias.{c} = consultas_diarias.{c} + VALUES({c})" for c in COLUMNAS_SUMA),
+}
+
+_UPSERT = {
+    dialecto: _COLUMNAS_INSERT + """
+    VALUES (:fecha, :ugel_origen, :respuesta_util, :respuesta_es_vacia,
+        :cantidad, :tokens_input, :tokens_output, :tiempo_respuesta_ms, :cantidad_con_tiempo)
+""" + conflicto
+    for dialecto, conflicto in _CONFLICTO.items()
+}
+
+# Aporte (multiplicado por :signo) de una consulta al grupo {grupo_util}, leído de la propia fila;
+# sólo si su respuesta_util actual es distinta de :respuesta_util_nueva (si no, no hay nada que mover)
+_MOVER_DESDE_CONSULTA = _COLUMNAS_INSERT + f"""
+    SELECT DATE(timestamp),
+           COALESCE(ugel_origen, '{SIN_UGEL}'),
+           {{grupo_util}},
+           COALESCE(respuesta_es_vacia, {VACIA_SIN_DATO}),
+           :signo,
+           :signo * COALESCE(tokens_input, 0),
+           :signo * COALESCE(tokens_output, 0),
+           CASE WHEN tiempo_respuesta_ms > 0 THEN :signo * tiempo_respuesta_ms ELSE 0 END,
+           CASE WHEN tiempo_respuesta_ms > 0 THEN :signo ELSE 0 END
+    FROM consultas
+    WHERE id_consulta = :id_consulta
+      AND COALESCE(LOWER(respuesta_util), '{SIN_CLASIFICAR}') <> :respuesta_util_nueva
+"""
+
+_BORRAR_GRUPOS_VACIOS = """
+    DELETE FROM consultas_diarias
+    WHERE cantidad <= 0 AND fecha = (SELECT DATE(timestamp) FROM consultas WHERE id_consulta = :id_consulta)
+"""
+
+# Misma normalización que parametros_consulta, hecha en SQL para la reconstrucción
+_SELECT_RECONSTRUCCION = f"""
+    SELECT DATE(timestamp),
+           COALESCE(ugel_origen, '{SIN_UGEL}'),
+           COALESCE(LOWER(respuesta_util), '{SIN_CLASIFICAR}'),
+           COALESCE(respuesta_es_vacia, {VACIA_SIN_DATO}),
+           COUNT(*),
+           SUM(COALESCE(tokens_input, 0)),
+           SUM(COALESCE(tokens_output, 0)),
+           SUM(CASE WHEN tiempo_respuesta_ms > 0 THEN tiempo_respuesta_ms ELSE 0 END),
+           SUM(CASE WHEN tiempo_respuesta_ms > 0 THEN 1 ELSE 0 END)
+    FROM consultas
+"""
+
+# La existencia de cada tabla se consulta como mucho una vez por minuto y proceso
+_SEGUNDOS_CACHE_EXISTENCIA = 60.0
+_existencia = {}
+_lock = threading.Lock()
+
+
+def _sql(dialecto, sql):
+    """Las sentencias se escriben con :nombre (sqlite3); pymysql usa %(nombre)s"""
+    return re.sub(r":(\w+)", r"%(\1)s", sql) if dialecto == "mysql" else sql
+
+
+def dialecto_de_conexion(conn):
+    return "mysql" if hasattr(conn, "server_version") else "sqlite"
+
+
+def _fecha(timestamp):
+    if hasattr(timestamp, "strftime"):
+        return timestamp.strftime("%Y-%m-%d")
+    return str(timestamp)[:10]
+
+
+def tabla_existe(cursor, dialecto, tabla):
+    """True si la tabla existe en la base de este cursor (cacheado por tabla y dialecto)"""
+    ahora = time.monotonic()
+    with _lock:
+        cacheado = _existencia.get((dialecto, tabla))
+        if cacheado and ahora - cacheado[1] < _SEGUNDOS_CACHE_EXISTENCIA:
+            return cacheado[0]
+    if dialecto == "mysql":
+        cursor.execute("SELECT 1 FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                       (tabla,))
+    else:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,))
+    existe = cursor.fetchone() is not None
+    with _lock:
+        _existencia[(dialecto, tabla)] = (existe, ahora)
+    return existe
+
+
+def rollup_disponible(cursor, dialecto):
+    """True si la tabla consultas_diarias existe en la base de este cursor"""
+    return tabla_existe(cursor, dialecto, TABLA_ROLLUP)
+
+
+def olvidar_existencia():
+    """Descarta la existencia cacheada (p. ej. después de crear la tabla)"""
+    with _lock:
+        _existencia.clear()
+
+
+def parametros_consulta(timestamp, ugel_origen, respuesta_util, respuesta_es_vacia,
+                        tokens_input, tokens_output, tiempo_respuesta_ms, signo=1):
+    """Clave y sumas con que una consulta aporta a consultas_diarias (signo=-1 para restarla)"""
+    tiempo = int(tiempo_respuesta_ms or 0)
+    return {
+        "fecha": _fecha(timestamp),
+        "ugel_origen": ugel_origen if ugel_origen is not None else SIN_UGEL,
+        "respuesta_util": respuesta_util.lower() if respuesta_util is not None else SIN_CLASIFICAR,
+        "respuesta_es_vacia": VACIA_SIN_DATO if respuesta_es_vacia is None else int(bool(respuesta_es_vacia)),
+        "cantidad": signo,
+        "tokens_input": signo * int(tokens_input or 0),
+        "tokens_output": signo * int(tokens_output or 0),
+        "tiempo_respuesta_ms": signo * tiempo if tiempo > 0 else 0,
+        "cantidad_con_tiempo": signo if tiempo > 0 else 0,
+    }
+
+
+def sumar_consulta(cursor, dialecto, **campos):
+    """Suma una consulta recién insertada (misma transacción que el INSERT). False si no hay rollup"""
+    if not rollup_disponible(cursor, dialecto):
+        return False
+    cursor.execute(_sql(dialecto, _UPSERT[dialecto]), parametros_consulta(**campos))
+    return True
+
+
+def mover_feedback(cursor, dialecto, id_consulta, respuesta_util_nueva):
+    """
+    Pasa una consulta del grupo de su respuesta_util actual al de la nueva, sin traer la fila:
+    las sentencias leen de consultas, por eso se llama ANTES del UPDATE de respuesta_util y en
+    la misma transacción. No hace nada si la consulta no existe o ya tenía ese valor.
+    """
+    if not rollup_disponible(cursor, dialecto):
+        return False
+    params = {"id_consulta": id_consulta, "respuesta_util_nueva": respuesta_util_nueva.lower()}
+    conflicto = _CONFLICTO[dialecto]
+    cursor.execute(_sql(dialecto, _MOVER_DESDE_CONSULTA.format(
+        grupo_util=f"COALESCE(LOWER(respuesta_util), '{SIN_CLASIFICAR}')") + conflicto), {**params, "signo": -1})
+    if cursor.rowcount == 0:
+        return False
+    cursor.execute(_sql(dialecto, _MOVER_DESDE_CONSULTA.format(grupo_util=":respuesta_util_nueva") + conflicto),
+                   {**params, "signo": 1})
+    # El grupo anterior puede haber quedado vacío
+    cursor.execute(_sql(dialecto, _BORRAR_GRUPOS_VACIOS), {"id_consulta": id_consulta})
+    return True
+
+
+def mover_feedback_lote(cursor, dialecto, cambios):
+    """
+    Como mover_feedback para varias consultas a la vez: `cambios` es una lista de
+    (id_consulta, respuesta_util_nueva) sin ids repetidos. Se ejecuta con executemany, antes del
+    UPDATE de las consultas y en la misma transacción.
+    """
+    if not cambios or not rollup_disponible(cursor, dialecto):
+        return False
+    conflicto = _CONFLICTO[dialecto]
+    params = [{"id_consulta": id_consulta, "respuesta_util_nueva": nueva.lower()} for id_consulta, nueva in cambios]
+    # Las dos pasadas leen la utilidad anterior: el UPDATE de consultas todavía no se hizo
+    cursor.executemany(_sql(dialecto, _MOVER_DESDE_CONSULTA.format(
+        grupo_util=f"COALESCE(LOWER(respuesta_util), '{SIN_CLASIFICAR}')") + conflicto),
+        [{**p, "signo": -1} for p in params])
+    cursor.executemany(_sql(dialecto, _MOVER_DESDE_CONSULTA.format(grupo_util=":respuesta_util_nueva") + conflicto),
+                       [{**p, "signo": 1} for p in params])
+    cursor.executemany(_sql(dialecto, _BORRAR_GRUPOS_VACIOS), [{"id_consulta": p["id_consulta"]} for p in params])
+    return True
+
+
+def _filtros(fecha_desde=None, fecha_hasta=None, ugel_origen=None):
+    """WHERE sobre consultas_diarias; las fechas son YYYY-MM-DD ya validadas (fecha es DATE, el rango es inclusivo)"""
+    condiciones, params = [], {}
+    if fecha_desde:
+        condiciones.append("fecha >= :fecha_desde")
+        params["fecha_desde"] = fecha_desde
+    if fecha_hasta:
+        condiciones.append("fecha <= :fecha_hasta")
+        params["fecha_hasta"] = fecha_hasta
+    if ugel_origen:
+        condiciones.append("ugel_origen = :ugel_origen")
+        params["ugel_origen"] = ugel_origen
+    return (" WHERE " + " AND ".join(condiciones) if condiciones else ""), params
+
+
+def reconstruir(cursor, dialecto, fecha_desde=None, fecha_hasta=None):
+    """
+    Recalcula consultas_diarias desde consultas para el rango de fechas (todo si no se indica).
+    No hace commit: quien llama decide la transacción. Devuelve la cantidad de grupos escritos.
+    """
+    where_rollup, params = _filtros(fecha_desde, fecha_hasta)
+    cursor.execute(_sql(dialecto, f"DELETE FROM consultas_diarias{where_rollup}"), params)
+
+    condiciones = []
+    if fecha_desde:
+        condiciones.append("timestamp >= :inicio")
+        params["inicio"] = f"{fecha_desde} 00:00:00"
+    if fecha_hasta:
+        condiciones.append("timestamp < :fin")
+        params["fin"] = f"{date.fromisoformat(fecha_hasta) + timedelta(days=1)} 00:00:00"
+    where_consultas = " WHERE " + " AND ".join(condiciones) if condiciones else ""
+    cursor.execute(_sql(dialecto, f"""
+        INSERT INTO consultas_diarias (fecha, ugel_origen, respuesta_util, respuesta_es_vacia,
+            cantidad, tokens_input, tokens_output, tiempo_respuesta_ms, cantidad_con_tiempo)
+        {_SELECT_RECONSTRUCCION}{where_consultas}
+        GROUP BY 1, 2, 3, 4
+    """), params)
+    return cursor.rowcount
+
+
+def estadisticas(cursor, dialecto, fecha_desde=None, fecha_hasta=None, ugel_origen=None):
+    """Estadísticas generales (formato de /api/admin/estadisticas) leyendo sólo consultas_diarias"""
+    where, params = _filtros(fecha_desde, fecha_hasta, ugel_origen)
+    cursor.execute(_sql(dialecto, f"""
+        SELECT ugel_origen, respuesta_util, respuesta_es_vacia,
+               SUM(cantidad) AS cantidad, SUM(tokens_input) AS tokens_input, SUM(tokens_output) AS tokens_output
+        FROM consultas_diarias{where}
+        GROUP BY ugel_origen, respuesta_util, respuesta_es_vacia
+    """), params)
+
+    total = tokens_input = tokens_output = 0
+    utilidad = {"si": 0, "no": 0, "sin_clasificar": 0}
+    vacia = {"si": 0, "no": 0, "sin_clasificar": 0}
+    por_ugel = {}
+    for fila in cursor.fetchall():
+        cantidad = int(fila["cantidad"] or 0)
+        total += cantidad
+        tokens_input += int(fila["tokens_input"] or 0)
+        tokens_output += int(fila["tokens_output"] or 0)
+        utilidad[fila["respuesta_util"] if fila["respuesta_util"] in ("si", "no") else "sin_clasificar"] += cantidad
+        vacia[{1: "si", 0: "no"}.get(fila["respuesta_es_vacia"], "sin_clasificar")] += cantidad
+        por_ugel[fila["ugel_origen"]] = por_ugel.get(fila["ugel_origen"], 0) + cantidad
+
+    return {
+        "total_preguntas": total,
+        "total_tokens_input": tokens_input,
+        "total_tokens_output": tokens_output,
+        "utilidad": utilidad,
+        "respuesta_vacia": vacia,
+        "ugel_preguntas": [{"ugel": ugel, "cantidad": cantidad}
+                           for ugel, cantidad in sorted(por_ugel.items(), key=lambda item: -item[1]) if cantidad],
+    }
+
+
+def registros_por_dia(cursor, dialecto, fecha_desde=None, fecha_hasta=None):
+    """[{fecha, cantidad}] por día, ordenado por fecha"""
+    where, params = _filtros(fecha_desde, fecha_hasta)
+    cursor.execute(_sql(dialecto, f"""
+        SELECT fecha, SUM(cantidad) AS cantidad
+        FROM consultas_diarias{where}
+        GROUP BY fecha
+        HAVING SUM(cantidad) > 0
+        ORDER BY fecha ASC
+    """), params)
+    return [{"fecha": _fecha(fila["fecha"]), "cantidad": int(fila["cantidad"])} for fila in cursor.fetchall()]
+
+
+def conteo_utilidad(cursor, dialecto, fecha_desde=None, fecha_hasta=None):
+    """(labels, values) de respuesta_util ordenados por cantidad, para el gráfico de utilidad"""
+    where, params = _filtros(fecha_desde, fecha_hasta)
+    cursor.execute(_sql(dialecto, f"""
+        SELECT respuesta_util, SUM(cantidad) AS cantidad
+        FROM consultas_diarias{where}
+        GROUP BY respuesta_util
+        HAVING SUM(cantidad) > 0
+        ORDER BY cantidad DESC
+    """), params)
+    filas = cursor.fetchall()
+    return [str(fila["respuesta_util"]) for fila in filas], [int(fila["cantidad"]) for fila in filas]
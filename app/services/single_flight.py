@@ -0,0 +1,78 @@
+# app/services/single_flight.py
+"""
+Coalescencia de requests idénticos en vuelo ("single-flight").
+
+Cuando varios requests piden lo mismo al mismo tiempo (p. ej. decenas de agentes preguntando
+por una circular del SIMAP recién publicada), sólo el primero ejecuta el cálculo; el resto
+espera ese mismo resultado. La clave la arma quien llama (pregunta normalizada + versión del prompt).
+
+El cálculo corre en el threadpool de Starlette como una tarea propia: si el request que lo
+inició se cancela (cliente que corta), el resultado sigue llegando a los demás. La tarea tiene
+su propio plazo (app/services/plazo.py) en lugar del de quien la inició, así un request con
+X-Request-Timeout-Ms corto no degrada la respuesta de todos los que comparten la clave; el
+plazo de cada request sólo limita cuánto espera él (espera_maxima).
+La deduplicación es por proceso (cada worker de uvicorn/gunicorn tiene la suya).
+"""
+
+import asyncio
+import re
+import unicodedata
+
+from starlette.concurrency import run_in_threadpool
+
+from app.services.plazo import iniciar_plazo
+
+
+def normalizar_pregunta(texto: str) -> str:
+    """Normaliza una pregunta para compararla: unicode NFC, minúsculas, espacios y signos de los extremos"""
+    texto = unicodedata.normalize("NFC", texto or "").casefold()
+    texto = re.sub(r"\s+", " ", texto).strip()
+    return texto.strip(" ¿?¡!.")
+
+
+class SingleFlight:
+    """Ejecuta una sola vez cada cálculo en vuelo por clave y comparte el resultado"""
+
+    def __init__(self, nombre="single_flight", plazo=None):
+        self.nombre = nombre
+        self.plazo = plazo  # segundos del plazo de cada cálculo compartido (None = sin plazo)
+        self._en_vuelo = {}
+        self.metricas = {"ejecuciones": 0, "coalescidas": 0}
+
+    async def ejecutar(self, clave, funcion, *args, espera_maxima=None, **kwargs):
+        """
+        Ejecuta funcion(*args, **kwargs) en el threadpool, o se suma a la ejecución en vuelo con la misma clave.
+        Con espera_maxima, quien espera deja de hacerlo (asyncio.TimeoutError) sin cancelar el cálculo.
+
+        Returns:
+            tuple: (resultado, compartido) - compartido es True si el resultado vino de otra ejecución
+        """
+        tarea = self._en_vuelo.get(clave)
+        compartido = tarea is not None
+        if compartido:
+            self.metricas["coalescidas"] += 1
+        else:
+            tarea = asyncio.ensure_future(self._calcular(funcion, *args, **kwargs))
+            self._en_vuelo[clave] = tarea
+            self.metricas["ejecuciones"] += 1
+            tarea.add_done_callback(lambda t: self._terminar(clave, t))
+
+        # shield: cancelar a quien espera no cancela el cálculo compartido
+        resultado = await asyncio.wait_for(asyncio.shield(tarea), timeout=espera_maxima)
+        return resultado, compartido
+
+    async def _calcular(self, funcion, *args, **kwargs):
+        # La tarea corre en una copia del contexto de quien la creó: reemplazar su plazo acá no
+        # afecta a ese request, y el threadpool hereda el plazo propio del cálculo
+        iniciar_plazo(self.plazo)
+        return await run_in_threadpool(funcion, *args, **kwargs)
+
+    def _terminar(self, clave, tarea):
+        if self._en_vuelo.get(clave) is tarea:
+            del self._en_vuelo[clave]
+        # Marca la excepción como leída aunque todos los que esperaban se hayan cancelado
+        if not tarea.cancelled():
+            tarea.exception()
+
+    def estado(self):
+        return {"nombre": self.nombre, "en_vuelo": len(self._en_vuelo), **self.metricas}
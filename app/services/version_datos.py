@@ -0,0 +1,58 @@
+# app/services/version_datos.py
+"""
+Versión barata de los datos de consultas, para que los endpoints de administración respondan
+304 Not Modified sin recalcular nada cuando el navegador ya tiene la última versión.
+
+La versión combina MAX(id_consulta) (cambia con cada consulta nueva; es una lectura del índice
+de la clave primaria) con un contador en la tabla contadores_cambios que se incrementa en la
+misma transacción que modifica consultas existentes (feedback, comentarios) o reconstruye los
+agregados diarios. Si la tabla del contador no existe no hay versión y los endpoints responden
+sin ETag, como antes.
+
+Las funciones reciben un cursor DB-API (sqlite3 o pymysql) y el dialecto ('sqlite' o 'mysql').
+"""
+
+from app.services.rollup_service import tabla_existe
+
+TABLA_CONTADORES = "contadores_cambios"
+CONTADOR_CONSULTAS = "consultas"
+
+_INCREMENTO = {
+    "sqlite": """
+        INSERT INTO contadores_cambios (nombre, valor) VALUES (?, ?)
+        ON CONFLICT (nombre) DO UPDATE SET valor = valor + excluded.valor
+    """,
+    "mysql": """
+        INSERT INTO contadores_cambios (nombre, valor) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE valor = valor + VALUES(valor)
+    """,
+}
+
+
+def registrar_cambio(cursor, dialecto, cantidad=1, nombre=CONTADOR_CONSULTAS):
+    """
+    Incrementa el contador dentro de la transacción en curso (no hace commit).
+    Devuelve False si la tabla no existe todavía.
+    """
+    if not tabla_existe(cursor, dialecto, TABLA_CONTADORES):
+        return False
+    cursor.execute(_INCREMENTO[dialecto], (nombre, cantidad))
+    return True
+
+
+def version_consultas(cursor, dialecto):
+    """'<max id_consulta>.<contador de cambios>', o None si no se puede versionar"""
+    if not tabla_existe(cursor, dialecto, TABLA_CONTADORES):
+        return None
+    marcador = "%s" if dialecto == "mysql" else "?"
+    cursor.execute(f"""
+        SELECT (SELECT MAX(id_consulta) FROM consultas) AS ultimo_id,
+               (SELECT valor FROM contadores_cambios WHERE nombre = {marcador}) AS cambios
+    """, (CONTADOR_CONSULTAS,))
+    fila = cursor.fetchone()
+    return f"{int(fila['ultimo_id'] or 0)}.{int(fila['cambios'] or 0)}"
+
+
+def etag_version(prefijo, version):
+    """ETag de una representación que depende sólo de la versión (la URL ya distingue los filtros)"""
+    return f'W/"{prefijo}-{version}"' if version else None
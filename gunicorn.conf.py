@@ -0,0 +1,53 @@
+# gunicorn.conf.py
+"""
+Perfil de producción: gunicorn como gestor de procesos con workers de uvicorn.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+- Un worker por núcleo disponible (WEB_CONCURRENCY lo fija a mano).
+- preload_app: la app se importa una vez en el maestro y el estado de sólo lectura se precarga
+  antes del fork (app/core/precarga.py); gc.freeze evita que el GC de cada worker toque esas
+  páginas y rompa el copy-on-write.
+- Reciclado gradual de workers (max_requests + jitter) para acotar el crecimiento de memoria
+  sin reiniciar todos a la vez.
+"""
+
+import gc
+import multiprocessing
+import os
+
+
+def _nucleos_disponibles():
+    try:
+        return len(os.sched_getaffinity(0))  # respeta el cpuset del contenedor
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY") or _nucleos_disponibles())
+# El limitador de OpenAI reparte la cuota de la cuenta entre los workers leyendo WEB_CONCURRENCY
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+# Mayor que PLAZO_REQUEST_SEGUNDOS: un worker sólo se mata si quedó colgado de verdad
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+accesslog = "-"
+errorlog = "-"
+
+
+def when_ready(server):
+    """En el maestro, con la app ya importada y antes de crear los workers"""
+    from app.core.precarga import precargar_estado_compartido
+
+    tiempos = precargar_estado_compartido()
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"Estado compartido precargado {tiempos}; gc.freeze de {gc.get_freeze_count()} objetos; {workers} workers")
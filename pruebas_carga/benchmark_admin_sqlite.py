@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de las consultas SQL de los endpoints de administración sobre una base SQLite sintética.
+
+Genera una tabla consultas con el esquema de BD_RELA/create_tables.py y N filas sintéticas
+(por defecto un millón, repartidas en un año, varias UGL y feedback si/no/nada) y mide cada
+endpoint en dos fases:
+
+    antes    SQL anterior (DATE(timestamp), listado sin LIMIT con textos completos) sin índices
+    despues  SQL actual (rango semiabierto sobre timestamp, keyset + SUBSTR) con los índices
+             declarados en Consulta.__table_args__
+
+Se reporta la mediana de varias repeticiones en ms. La base generada se reutiliza en corridas
+siguientes (los índices se borran al empezar para que la fase "antes" sea siempre sin índices).
+
+Se ejecuta desde la raíz del proyecto:
+    python pruebas_carga/benchmark_admin_sqlite.py --filas 1000000 --repeticiones 5
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from sqlalchemy.dialects import sqlite as dialecto_sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from BD_RELA.create_tables import Consulta
+
+UGLS = [f"UGL {numero}" for numero in ("I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X",
+                                      "XI", "XII", "XIII", "XIV", "XV", "XVI", "XVII", "XVIII", "XIX", "XX")]
+UTILIDAD = (["nada"] * 70) + (["si"] * 22) + (["no"] * 8)
+TEMAS = ["bastón", "audífonos", "prótesis de cadera", "medicamentos oncológicos", "silla de ruedas",
+         "anteojos", "internación domiciliaria", "traslados", "pañales", "oxígeno"]
+COLUMNAS_INSERT = ("timestamp", "id_usuario", "ugel_origen", "pregunta_usuario", "respuesta_asistente",
+                   "respuesta_es_vacia", "respuesta_util", "id_prompt_usado", "tokens_input", "tokens_output",
+                   "tiempo_respuesta_ms", "error_detectado")
+
+# Filtros comunes: un mes dentro del año generado, como usa el panel por defecto
+DESDE, HASTA = "2025-03-01", "2025-03-31"
+DESDE_INCL, HASTA_EXCL = "2025-03-01 00:00:00", "2025-04-01 00:00:00"
+HASTA_VIEJO = "2025-03-31 23:59:59"
+FILTRO_VIEJO = "timestamp >= ? AND timestamp <= ?"
+FILTRO_NUEVO = "timestamp >= ? AND timestamp < ?"
+
+COLUMNAS_LISTADO_VIEJO = """id_consulta, timestamp, id_usuario, ugel_origen, pregunta_usuario, respuesta_asistente,
+    respuesta_es_vacia, respuesta_util, tokens_input, tokens_output, tiempo_respuesta_ms"""
+COLUMNAS_LISTADO_NUEVO = """id_consulta, timestamp, id_usuario, ugel_origen, SUBSTR(pregunta_usuario, 1, 51),
+    SUBSTR(respuesta_asistente, 1, 51), respuesta_es_vacia, respuesta_util, tokens_input, tokens_output, tiempo_respuesta_ms"""
+
+
+def consultas_estadisticas(filtro):
+    """Las cinco consultas de /api/admin/estadisticas con el filtro dado (fecha + UGL)"""
+    where = f" WHERE {filtro} AND ugel_origen = ?"
+    return [
+        f"SELECT COUNT(*) FROM consultas{where}",
+        f"SELECT SUM(COALESCE(tokens_input, 0)), SUM(COALESCE(tokens_output, 0)) FROM consultas{where}",
+        f"SELECT respuesta_util, COUNT(*) FROM consultas{where} GROUP BY respuesta_util",
+        f"SELECT respuesta_es_vacia, COUNT(*) FROM consultas{where} GROUP BY respuesta_es_vacia",
+        f"SELECT COALESCE(ugel_origen, 'Sin UGEL'), COUNT(*) FROM consultas{where} GROUP BY ugel_origen",
+    ]
+
+
+def consulta_estadisticas_una_pasada(filtro):
+    """/api/admin/estadisticas actual sin rollup: una pasada con agregación condicional por UGL"""
+    return [
+        f"""SELECT COALESCE(ugel_origen, 'Sin UGEL'), COUNT(*), SUM(COALESCE(tokens_input, 0)), SUM(COALESCE(tokens_output, 0)),
+                   SUM(CASE WHEN respuesta_util = 'si' THEN 1 ELSE 0 END), SUM(CASE WHEN respuesta_util = 'no' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN respuesta_es_vacia = 1 THEN 1 ELSE 0 END), SUM(CASE WHEN respuesta_es_vacia = 0 THEN 1 ELSE 0 END)
+            FROM consultas WHERE {filtro} AND ugel_origen = ? GROUP BY ugel_origen""",
+    ]
+
+
+# nombre -> ((sentencias, params) antes, (sentencias, params) después)
+ESCENARIOS = {
+    "consultas_filtradas (mes)": (
+        ([f"SELECT {COLUMNAS_LISTADO_VIEJO} FROM consultas WHERE DATE(timestamp) >= ? AND DATE(timestamp) <= ? "
+          "ORDER BY timestamp DESC"], (DESDE, HASTA)),
+        ([f"SELECT {COLUMNAS_LISTADO_NUEVO} FROM consultas WHERE {FILTRO_NUEVO} "
+          "ORDER BY timestamp DESC, id_consulta DESC LIMIT 51"], (DESDE_INCL, HASTA_EXCL)),
+    ),
+    "consultas_filtradas (mes + util=si)": (
+        ([f"SELECT {COLUMNAS_LISTADO_VIEJO} FROM consultas WHERE DATE(timestamp) >= ? AND DATE(timestamp) <= ? "
+          "AND respuesta_util = ? ORDER BY timestamp DESC"], (DESDE, HASTA, "si")),
+        ([f"SELECT {COLUMNAS_LISTADO_NUEVO} FROM consultas WHERE {FILTRO_NUEVO} AND respuesta_util = ? "
+          "ORDER BY timestamp DESC, id_consulta DESC LIMIT 51"], (DESDE_INCL, HASTA_EXCL, "si")),
+    ),
+    "estadisticas (mes + UGL)": (
+        (consultas_estadisticas(FILTRO_VIEJO), (DESDE_INCL, HASTA_VIEJO, "UGL VII")),
+        (consulta_estadisticas_una_pasada(FILTRO_NUEVO), (DESDE_INCL, HASTA_EXCL, "UGL VII")),
+    ),
+    "stats/respuesta_util_por_fecha (mes)": (
+        ([f"SELECT COALESCE(LOWER(respuesta_util), 'sin clasificar') AS c, COUNT(*) FROM consultas "
+          f"WHERE {FILTRO_VIEJO} GROUP BY c"], (DESDE_INCL, HASTA_VIEJO)),
+        ([f"SELECT COALESCE(LOWER(respuesta_util), 'sin clasificar') AS c, COUNT(*) FROM consultas "
+          f"WHERE {FILTRO_NUEVO} GROUP BY c"], (DESDE_INCL, HASTA_EXCL)),
+    ),
+    "stats/registros_por_dia (mes)": (
+        ([f"SELECT date(timestamp), COUNT(*) FROM consultas WHERE {FILTRO_VIEJO} GROUP BY date(timestamp)"],
+         (DESDE_INCL, HASTA_VIEJO)),
+        ([f"SELECT date(timestamp), COUNT(*) FROM consultas WHERE {FILTRO_NUEVO} GROUP BY date(timestamp)"],
+         (DESDE_INCL, HASTA_EXCL)),
+    ),
+}
+
+
+def filas_sinteticas(cantidad, largo_respuesta, semilla):
+    aleatorio = random.Random(semilla)
+    inicio = datetime(2025, 1, 1)
+    segundos_anio = 365 * 24 * 3600
+    relleno = "Según la normativa vigente del SIMAP, el trámite requiere prescripción médica y formulario. "
+    for _ in range(cantidad):
+        tema = aleatorio.choice(TEMAS)
+        respuesta = (f"Para el trámite de {tema}: " + relleno * (largo_respuesta // len(relleno) + 1))[:largo_respuesta]
+        yield (
+            (inicio + timedelta(seconds=aleatorio.random() * segundos_anio)).strftime("%Y-%m-%d %H:%M:%S.%f"),
+            aleatorio.randint(1, 5000),
+            aleatorio.choice(UGLS),
+            f"¿Cómo solicito {tema} para un afiliado de la {aleatorio.choice(UGLS)}?",
+            respuesta,
+            1 if aleatorio.random() < 0.05 else 0,
+            aleatorio.choice(UTILIDAD),
+            "1",
+            aleatorio.randint(800, 4000),
+            aleatorio.randint(100, 600),
+            aleatorio.randint(1500, 12000),
+            0,
+        )
+
+
+def preparar_base(ruta, filas, largo_respuesta, semilla):
+    conn = sqlite3.connect(ruta)
+    existe = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='consultas'").fetchone()
+    actuales = conn.execute("SELECT COUNT(*) FROM consultas").fetchone()[0] if existe else 0
+    if actuales != filas:
+        print(f"Generando {filas:,} consultas sintéticas en {ruta} ...")
+        conn.execute("DROP TABLE IF EXISTS consultas")
+        conn.execute(str(CreateTable(Consulta.__table__).compile(dialect=dialecto_sqlite.dialect())))
+        inicio = time.perf_counter()
+        sql = f"INSERT INTO consultas ({', '.join(COLUMNAS_INSERT)}) VALUES ({', '.join('?' * len(COLUMNAS_INSERT))})"
+        lote = []
+        for fila in filas_sinteticas(filas, largo_respuesta, semilla):
+            lote.append(fila)
+            if len(lote) >= 10000:
+                conn.executemany(sql, lote)
+                lote.clear()
+        if lote:
+            conn.executemany(sql, lote)
+        conn.commit()
+        print(f"  listo en {time.perf_counter() - inicio:.1f} s")
+    else:
+        print(f"Reutilizando {ruta} ({actuales:,} consultas)")
+    for indice in Consulta.__table__.indexes:
+        conn.execute(f"DROP INDEX IF EXISTS {indice.name}")
+    conn.execute("ANALYZE")
+    conn.commit()
+    return conn
+
+
+def crear_indices(conn):
+    inicio = time.perf_counter()
+    for indice in Consulta.__table__.indexes:
+        conn.execute(str(CreateIndex(indice).compile(dialect=dialecto_sqlite.dialect())))
+    conn.execute("ANALYZE")
+    conn.commit()
+    return time.perf_counter() - inicio
+
+
+def medir(conn, sentencias, params, repeticiones):
+    """Mediana (ms) de ejecutar todas las sentencias del endpoint y leer sus filas"""
+    tiempos = []
+    filas = 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        filas = sum(len(conn.execute(sql, params).fetchall()) for sql in sentencias)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return round(statistics.median(tiempos), 2), filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las consultas de administración sobre SQLite sintético")
+    parser.add_argument("--bd", default="benchmark_admin.db", help="Archivo SQLite a generar/reutilizar")
+    parser.add_argument("--filas", type=int, default=1_000_000, help="Cantidad de consultas sintéticas")
+    parser.add_argument("--largo-respuesta", type=int, default=600, help="Caracteres de cada respuesta sintética")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Repeticiones por escenario (se reporta la mediana)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    conn = preparar_base(args.bd, args.filas, args.largo_respuesta, args.semilla)
+
+    resultados = {nombre: {} for nombre in ESCENARIOS}
+    for nombre, (antes, _) in ESCENARIOS.items():
+        resultados[nombre]["antes_ms"], resultados[nombre]["antes_filas"] = medir(conn, *antes, args.repeticiones)
+
+    segundos_indices = crear_indices(conn)
+    print(f"Índices creados en {segundos_indices:.1f} s")
+
+    for nombre, (_, despues) in ESCENARIOS.items():
+        resultados[nombre]["despues_ms"], resultados[nombre]["despues_filas"] = medir(conn, *despues, args.repeticiones)
+    conn.close()
+
+    print(f"\n{'endpoint':<40}{'antes ms':>12}{'después ms':>12}{'mejora':>10}")
+    for nombre, r in resultados.items():
+        mejora = r["antes_ms"] / r["despues_ms"] if r["despues_ms"] else float("inf")
+        r["mejora"] = round(mejora, 1)
+        print(f"{nombre:<40}{r['antes_ms']:>12.1f}{r['despues_ms']:>12.1f}{mejora:>9.1f}x")
+
+    salida = args.salida or f"admin_sqlite_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump({"fecha": datetime.now().isoformat(), "filas": args.filas,
+                   "segundos_crear_indices": round(segundos_indices, 2), "resultados": resultados},
+                  f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
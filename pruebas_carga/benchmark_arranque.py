@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de arranque: uvicorn de un proceso vs gunicorn con workers de uvicorn y preload.
+
+Para cada modo levanta el servidor, mide el tiempo hasta la primera respuesta y, una vez
+estabilizado, la memoria del árbol de procesos: RSS (cuenta las páginas compartidas en cada
+proceso) y PSS (las reparte entre quienes las comparten). La diferencia entre la suma de RSS
+y la de PSS es lo que el preload + copy-on-write ahorra.
+
+Se ejecuta desde la raíz del proyecto:
+    python pruebas_carga/benchmark_arranque.py --modos uvicorn,gunicorn --workers 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+import psutil
+
+RUTA_PRUEBA = "/minimal_root"
+
+
+def comando(modo, puerto, workers):
+    if modo == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(puerto)]
+    return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{puerto}", "app.main:app"]
+
+
+def memoria_arbol(pid):
+    """RSS y PSS (MB) del proceso y sus hijos; PSS sólo está disponible en Linux"""
+    padre = psutil.Process(pid)
+    procesos = [padre] + padre.children(recursive=True)
+    rss = pss = 0
+    for proceso in procesos:
+        try:
+            info = proceso.memory_full_info()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        rss += info.rss
+        pss += getattr(info, "pss", info.rss)
+    return len(procesos), round(rss / 1024 / 1024, 1), round(pss / 1024 / 1024, 1)
+
+
+def medir_modo(modo, args):
+    entorno = dict(os.environ)
+    if modo == "gunicorn":
+        entorno["WEB_CONCURRENCY"] = str(args.workers)
+    url = f"http://127.0.0.1:{args.puerto}{RUTA_PRUEBA}"
+
+    inicio = time.perf_counter()
+    servidor = subprocess.Popen(comando(modo, args.puerto, args.workers), env=entorno,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        primera_respuesta = None
+        while time.perf_counter() - inicio < args.timeout:
+            if servidor.poll() is not None:
+                raise RuntimeError(f"El servidor en modo {modo} terminó con código {servidor.returncode}")
+            try:
+                if httpx.get(url, timeout=1.0).status_code == 200:
+                    primera_respuesta = time.perf_counter() - inicio
+                    break
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        if primera_respuesta is None:
+            raise RuntimeError(f"El servidor en modo {modo} no respondió en {args.timeout} s")
+
+        # Dejar que terminen de arrancar todos los workers antes de medir memoria
+        time.sleep(args.estabilizar)
+        procesos, rss_mb, pss_mb = memoria_arbol(servidor.pid)
+
+        latencias = []
+        with httpx.Client(timeout=5.0) as cliente:
+            for _ in range(args.requests):
+                t0 = time.perf_counter()
+                cliente.get(url)
+                latencias.append((time.perf_counter() - t0) * 1000)
+        latencias.sort()
+
+        return {
+            "modo": modo,
+            "workers": args.workers if modo == "gunicorn" else 1,
+            "segundos_primera_respuesta": round(primera_respuesta, 2),
+            "procesos": procesos,
+            "rss_total_mb": rss_mb,
+            "pss_total_mb": pss_mb,
+            "compartido_mb": round(rss_mb - pss_mb, 1),
+            "latencia_ms_p50": round(latencias[len(latencias) // 2], 2) if latencias else None,
+        }
+    finally:
+        servidor.terminate()
+        try:
+            servidor.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            servidor.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque y memoria: uvicorn vs gunicorn con preload")
+    parser.add_argument("--modos", default="uvicorn,gunicorn", help="Modos a medir: uvicorn,gunicorn")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Workers de gunicorn")
+    parser.add_argument("--puerto", type=int, default=8765, help="Puerto local para las pruebas")
+    parser.add_argument("--timeout", type=float, default=180.0, help="Segundos máximos hasta la primera respuesta")
+    parser.add_argument("--estabilizar", type=float, default=10.0, help="Segundos de espera antes de medir memoria")
+    parser.add_argument("--requests", type=int, default=50, help="Requests secuenciales a la ruta de prueba")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    resultados = []
+    for modo in [m.strip() for m in args.modos.split(",") if m.strip()]:
+        print(f"\n--- Modo: {modo} ---")
+        resultado = medir_modo(modo, args)
+        resultados.append(resultado)
+        for clave, valor in resultado.items():
+            print(f"  {clave}: {valor}")
+
+    salida = args.salida or f"arranque_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump({"fecha": datetime.now().isoformat(), "resultados": resultados}, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Prueba de estrés de concurrencia sobre SQLite: escritores y lectores simultáneos, antes y
+después del perfil de conexión de BD_RELA/create_tables.py (aplicar_perfil_sqlite).
+
+Genera una tabla consultas con el esquema de BD_RELA/create_tables.py y N filas sintéticas, y
+para cada fase corre durante unos segundos:
+
+    escritores  alternan una consulta nueva (INSERT, como persistir_consulta) y un feedback
+                (UPDATE de respuesta_util), cada uno en su propia transacción con commit
+    lectores    consultas del panel de administración: estadísticas del mes en una pasada y
+                la primera página del listado
+
+Cada hilo usa su propia conexión, como los workers y el threadpool de la API. Fases:
+
+    antes    conexión como antes del perfil: journal_mode=DELETE, timeout por defecto de
+             sqlite3 (5 s) y sólo foreign_keys=ON
+    despues  aplicar_perfil_sqlite: WAL, synchronous=NORMAL, busy_timeout, mmap_size, cache_size
+
+Se reporta operaciones por segundo, p95 en ms y errores "database is locked" por tipo. Cada fase
+trabaja sobre una copia de la base generada, que se reutiliza en corridas siguientes.
+
+Se ejecuta desde la raíz del proyecto:
+    python pruebas_carga/estres_sqlite.py --filas 200000 --escritores 4 --lectores 8 --segundos 20
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from sqlalchemy.dialects import sqlite as dialecto_sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from BD_RELA.create_tables import Consulta, aplicar_perfil_sqlite
+
+UGLS = [f"UGL {numero}" for numero in ("I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X")]
+UTILIDAD = (["nada"] * 70) + (["si"] * 22) + (["no"] * 8)
+COLUMNAS_INSERT = ("timestamp", "id_usuario", "ugel_origen", "pregunta_usuario", "respuesta_asistente",
+                   "respuesta_es_vacia", "respuesta_util", "id_prompt_usado", "tokens_input", "tokens_output",
+                   "tiempo_respuesta_ms", "error_detectado")
+SQL_INSERT = f"INSERT INTO consultas ({', '.join(COLUMNAS_INSERT)}) VALUES ({', '.join('?' * len(COLUMNAS_INSERT))})"
+SQL_FEEDBACK = "UPDATE consultas SET respuesta_util = ? WHERE id_consulta = ?"
+
+DESDE, HASTA = "2025-03-01 00:00:00", "2025-04-01 00:00:00"
+LECTURAS = [
+    ("""SELECT COALESCE(ugel_origen, 'Sin UGEL'), COUNT(*), SUM(COALESCE(tokens_input, 0)), SUM(COALESCE(tokens_output, 0)),
+               SUM(CASE WHEN respuesta_util = 'si' THEN 1 ELSE 0 END), SUM(CASE WHEN respuesta_util = 'no' THEN 1 ELSE 0 END)
+        FROM consultas WHERE timestamp >= ? AND timestamp < ? GROUP BY ugel_origen""", (DESDE, HASTA)),
+    ("""SELECT id_consulta, timestamp, ugel_origen, SUBSTR(pregunta_usuario, 1, 51), respuesta_util
+        FROM consultas WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp DESC, id_consulta DESC LIMIT 51""",
+     (DESDE, HASTA)),
+]
+
+TIPOS = ("escritura", "lectura")
+
+
+def fila_sintetica(aleatorio, momento):
+    ugl = aleatorio.choice(UGLS)
+    return (
+        momento.strftime("%Y-%m-%d %H:%M:%S.%f"),
+        aleatorio.randint(1, 5000),
+        ugl,
+        f"¿Cómo solicito un trámite para un afiliado de la {ugl}?",
+        "Según la normativa vigente, el trámite requiere prescripción médica y formulario. " * 6,
+        0,
+        aleatorio.choice(UTILIDAD),
+        "1",
+        aleatorio.randint(800, 4000),
+        aleatorio.randint(100, 600),
+        aleatorio.randint(1500, 12000),
+        0,
+    )
+
+
+def preparar_base(ruta, filas, semilla):
+    conn = sqlite3.connect(ruta)
+    existe = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='consultas'").fetchone()
+    actuales = conn.execute("SELECT COUNT(*) FROM consultas").fetchone()[0] if existe else 0
+    if actuales != filas:
+        print(f"Generando {filas:,} consultas sintéticas en {ruta} ...")
+        conn.execute("DROP TABLE IF EXISTS consultas")
+        conn.execute(str(CreateTable(Consulta.__table__).compile(dialect=dialecto_sqlite.dialect())))
+        for indice in Consulta.__table__.indexes:
+            conn.execute(str(CreateIndex(indice).compile(dialect=dialecto_sqlite.dialect())))
+        aleatorio = random.Random(semilla)
+        inicio = datetime(2025, 1, 1)
+        segundos_anio = 365 * 24 * 3600
+        conn.executemany(SQL_INSERT, (fila_sintetica(aleatorio, inicio + timedelta(seconds=aleatorio.random() * segundos_anio))
+                                      for _ in range(filas)))
+        conn.commit()
+    conn.close()
+
+
+def conectar(ruta, fase):
+    conn = sqlite3.connect(ruta, check_same_thread=False)
+    if fase == "despues":
+        aplicar_perfil_sqlite(conn)
+    else:
+        conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+def escritor(ruta, fase, fin, filas, semilla, resultado):
+    aleatorio = random.Random(semilla)
+    conn = conectar(ruta, fase)
+    try:
+        while time.monotonic() < fin:
+            inicio = time.perf_counter()
+            try:
+                if aleatorio.random() < 0.5:
+                    conn.execute(SQL_INSERT, fila_sintetica(aleatorio, datetime(2025, 3, 15)))
+                else:
+                    conn.execute(SQL_FEEDBACK, (aleatorio.choice(("si", "no")), aleatorio.randint(1, filas)))
+                conn.commit()
+                resultado["latencias"].append((time.perf_counter() - inicio) * 1000)
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                resultado["errores"][str(e)] = resultado["errores"].get(str(e), 0) + 1
+    finally:
+        conn.close()
+
+
+def lector(ruta, fase, fin, semilla, resultado):
+    aleatorio = random.Random(semilla)
+    conn = conectar(ruta, fase)
+    try:
+        while time.monotonic() < fin:
+            sql, params = aleatorio.choice(LECTURAS)
+            inicio = time.perf_counter()
+            try:
+                conn.execute(sql, params).fetchall()
+                resultado["latencias"].append((time.perf_counter() - inicio) * 1000)
+            except sqlite3.OperationalError as e:
+                resultado["errores"][str(e)] = resultado["errores"].get(str(e), 0) + 1
+    finally:
+        conn.close()
+
+
+def p95(valores):
+    if len(valores) < 2:
+        return valores[0] if valores else 0.0
+    return statistics.quantiles(valores, n=20)[18]
+
+
+def correr_fase(base, fase, args):
+    ruta = f"{base}.{fase}"
+    for sufijo in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(ruta + sufijo):
+            os.remove(ruta + sufijo)
+    shutil.copyfile(base, ruta)
+    if fase == "antes":
+        conn = sqlite3.connect(ruta)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+
+    resultados = {tipo: [] for tipo in TIPOS}
+    hilos = []
+    fin = time.monotonic() + args.segundos
+    for i in range(args.escritores):
+        r = {"latencias": [], "errores": {}}
+        resultados["escritura"].append(r)
+        hilos.append(threading.Thread(target=escritor, args=(ruta, fase, fin, args.filas, args.semilla + i, r)))
+    for i in range(args.lectores):
+        r = {"latencias": [], "errores": {}}
+        resultados["lectura"].append(r)
+        hilos.append(threading.Thread(target=lector, args=(ruta, fase, fin, args.semilla + 1000 + i, r)))
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    resumen = {}
+    for tipo in TIPOS:
+        latencias = [l for r in resultados[tipo] for l in r["latencias"]]
+        errores = {}
+        for r in resultados[tipo]:
+            for mensaje, cantidad in r["errores"].items():
+                errores[mensaje] = errores.get(mensaje, 0) + cantidad
+        resumen[tipo] = {
+            "operaciones": len(latencias),
+            "ops_por_segundo": round(len(latencias) / args.segundos, 1),
+            "p95_ms": round(p95(latencias), 2),
+            "errores": errores,
+        }
+
+    conn = sqlite3.connect(ruta)
+    resumen["journal_mode"] = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.close()
+    for sufijo in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(ruta + sufijo):
+            os.remove(ruta + sufijo)
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estrés de escritores/lectores concurrentes sobre SQLite, antes y después del perfil")
+    parser.add_argument("--bd", default="estres_sqlite.db", help="Archivo SQLite a generar/reutilizar")
+    parser.add_argument("--filas", type=int, default=200_000, help="Cantidad de consultas sintéticas iniciales")
+    parser.add_argument("--escritores", type=int, default=4, help="Hilos escritores")
+    parser.add_argument("--lectores", type=int, default=8, help="Hilos lectores")
+    parser.add_argument("--segundos", type=float, default=20, help="Duración de cada fase")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    preparar_base(args.bd, args.filas, args.semilla)
+
+    resultados = {}
+    for fase in ("antes", "despues"):
+        print(f"Fase {fase}: {args.escritores} escritores y {args.lectores} lectores durante {args.segundos:g} s ...")
+        resultados[fase] = correr_fase(args.bd, fase, args)
+
+    print(f"\n{'fase':<10}{'journal':>9}{'escr/s':>10}{'p95 ms':>10}{'errores':>9}{'lect/s':>10}{'p95 ms':>10}{'errores':>9}")
+    for fase, r in resultados.items():
+        e, l = r["escritura"], r["lectura"]
+        print(f"{fase:<10}{r['journal_mode']:>9}{e['ops_por_segundo']:>10.1f}{e['p95_ms']:>10.1f}{sum(e['errores'].values()):>9}"
+              f"{l['ops_por_segundo']:>10.1f}{l['p95_ms']:>10.1f}{sum(l['errores'].values()):>9}")
+
+    salida = args.salida or f"estres_sqlite_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump({"fecha": datetime.now().isoformat(), "filas": args.filas, "escritores": args.escritores,
+                   "lectores": args.lectores, "segundos": args.segundos, "resultados": resultados},
+                  f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
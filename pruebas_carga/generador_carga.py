@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Generador de carga para la API (asyncio + httpx).
+
+Reproduce un set de preguntas contra /api/complete_analysis y/o /api/process_question a una
+tasa objetivo (requests por segundo, llegadas de lazo abierto: un request lento no frena a los
+siguientes) y registra latencias p50/p90/p95/p99, throughput logrado y tasa de errores por tipo.
+
+Las preguntas se leen de un .txt (una por línea) o de un .jsonl con campo "pregunta"
+(el mismo formato del set golden de CARGA_BDV/benchmark_recuperacion.py).
+
+Uso:
+    python generador_carga.py --url http://localhost:8000 --rps 5 --duracion 60 --endpoint complete_analysis
+    python generador_carga.py --rps 20 --duracion 30 --endpoint mixto --max-en-vuelo 100 --salida carga.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import statistics
+import time
+from collections import Counter
+from datetime import datetime
+
+import httpx
+
+ENDPOINTS = {
+    "complete_analysis": "/api/complete_analysis",
+    "process_question": "/api/process_question",
+}
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano sobre una lista de valores"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, math.ceil(p / 100.0 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def cargar_preguntas(ruta):
+    preguntas = []
+    with open(ruta, "r", encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea or linea.startswith("#"):
+                continue
+            if ruta.endswith(".jsonl"):
+                pregunta = json.loads(linea).get("pregunta")
+                if pregunta:
+                    preguntas.append(pregunta)
+            else:
+                preguntas.append(linea)
+    return preguntas
+
+
+def armar_request(endpoint, pregunta, args):
+    if endpoint == "complete_analysis":
+        return {"question_input": pregunta, "id_usuario": args.id_usuario, "ugel_origen": args.ugel}
+    return {"question_input": pregunta}
+
+
+async def ejecutar_request(cliente, endpoint, pregunta, args, resultados, semaforo):
+    inicio = time.perf_counter()
+    registro = {"endpoint": endpoint, "inicio": inicio}
+    try:
+        respuesta = await cliente.post(ENDPOINTS[endpoint], json=armar_request(endpoint, pregunta, args))
+        registro["status"] = respuesta.status_code
+        if respuesta.status_code != 200:
+            registro["error"] = f"HTTP {respuesta.status_code}"
+    except httpx.TimeoutException:
+        registro["status"] = None
+        registro["error"] = "timeout"
+    except httpx.HTTPError as e:
+        registro["status"] = None
+        registro["error"] = type(e).__name__
+    finally:
+        registro["latencia_ms"] = (time.perf_counter() - inicio) * 1000
+        resultados.append(registro)
+        semaforo.release()
+
+
+async def generar_carga(args, preguntas):
+    resultados = []
+    descartados = 0
+    semaforo = asyncio.Semaphore(args.max_en_vuelo)
+    limites = httpx.Limits(max_connections=args.max_en_vuelo, max_keepalive_connections=args.max_en_vuelo)
+    total = args.requests or int(args.rps * args.duracion)
+    endpoints = ["complete_analysis", "process_question"] if args.endpoint == "mixto" else [args.endpoint]
+    tareas = []
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limites) as cliente:
+        inicio = time.perf_counter()
+        proxima = inicio
+        for numero in range(total):
+            # Llegadas de Poisson (o uniformes) a la tasa objetivo, sin esperar a las respuestas
+            proxima += random.expovariate(args.rps) if args.poisson else 1.0 / args.rps
+            espera = proxima - time.perf_counter()
+            if espera > 0:
+                await asyncio.sleep(espera)
+
+            # Si se alcanzó el máximo en vuelo el request se cuenta como descartado (cliente saturado)
+            if semaforo.locked():
+                descartados += 1
+                continue
+            await semaforo.acquire()
+            pregunta = preguntas[numero % len(preguntas)]
+            endpoint = endpoints[numero % len(endpoints)]
+            tareas.append(asyncio.create_task(ejecutar_request(cliente, endpoint, pregunta, args, resultados, semaforo)))
+
+            if args.progreso and (numero + 1) % args.progreso == 0:
+                ok = sum(1 for r in resultados if not r.get("error"))
+                print(f"Enviados: {numero + 1}/{total} - completados: {len(resultados)} (ok: {ok}) - en vuelo: {len(tareas) - len(resultados)}")
+
+        await asyncio.gather(*tareas)
+        duracion = time.perf_counter() - inicio
+
+    return resultados, descartados, duracion
+
+
+def resumir(resultados, descartados, duracion, rps_objetivo):
+    def resumen(filas):
+        latencias_ok = [r["latencia_ms"] for r in filas if not r.get("error")]
+        errores = Counter(r["error"] for r in filas if r.get("error"))
+        return {
+            "requests": len(filas),
+            "ok": len(latencias_ok),
+            "tasa_error": round(sum(errores.values()) / len(filas), 4) if filas else 0.0,
+            "errores": dict(errores),
+            "latencia_ms_media": round(statistics.mean(latencias_ok), 1) if latencias_ok else None,
+            "latencia_ms_p50": round(percentil(latencias_ok, 50), 1),
+            "latencia_ms_p90": round(percentil(latencias_ok, 90), 1),
+            "latencia_ms_p95": round(percentil(latencias_ok, 95), 1),
+            "latencia_ms_p99": round(percentil(latencias_ok, 99), 1),
+            "latencia_ms_max": round(max(latencias_ok), 1) if latencias_ok else None,
+        }
+
+    total = resumen(resultados)
+    total.update({
+        "rps_objetivo": rps_objetivo,
+        "rps_logrado": round(total["ok"] / duracion, 2) if duracion > 0 else None,
+        "duracion_segundos": round(duracion, 2),
+        "descartados_cliente_saturado": descartados,
+    })
+    por_endpoint = {ep: resumen([r for r in resultados if r["endpoint"] == ep]) for ep in sorted({r["endpoint"] for r in resultados})}
+    return total, por_endpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de carga para /api/complete_analysis y /api/process_question")
+    parser.add_argument("--url", default="http://localhost:8000", help="URL base de la API")
+    parser.add_argument("--preguntas", default="preguntas_ejemplo.txt", help="Archivo .txt (una por línea) o .jsonl con campo 'pregunta'")
+    parser.add_argument("--endpoint", choices=["complete_analysis", "process_question", "mixto"], default="complete_analysis")
+    parser.add_argument("--rps", type=float, default=2.0, help="Requests por segundo objetivo")
+    parser.add_argument("--duracion", type=float, default=60.0, help="Duración de la prueba en segundos")
+    parser.add_argument("--requests", type=int, default=0, help="Cantidad total de requests (ignora --duracion)")
+    parser.add_argument("--max-en-vuelo", type=int, default=64, help="Máximo de requests simultáneos del cliente")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout por request en segundos")
+    parser.add_argument("--poisson", action="store_true", help="Llegadas de Poisson en lugar de uniformes")
+    parser.add_argument("--id-usuario", type=int, default=321, help="id_usuario de los requests a complete_analysis")
+    parser.add_argument("--ugel", default="Prueba de carga", help="ugel_origen de los requests a complete_analysis")
+    parser.add_argument("--progreso", type=int, default=50, help="Mostrar progreso cada N requests (0 = no)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    random.seed(args.semilla)
+    preguntas = cargar_preguntas(args.preguntas)
+    if not preguntas:
+        parser.error(f"No hay preguntas en {args.preguntas}")
+
+    print(f"Carga: {args.rps} rps contra {args.url} ({args.endpoint}) - {len(preguntas)} preguntas distintas")
+    resultados, descartados, duracion = asyncio.run(generar_carga(args, preguntas))
+    total, por_endpoint = resumir(resultados, descartados, duracion, args.rps)
+
+    print("\nRESULTADOS")
+    for clave, valor in total.items():
+        print(f"  {clave}: {valor}")
+    for endpoint, resumen in por_endpoint.items():
+        print(f"  [{endpoint}] p50={resumen['latencia_ms_p50']} ms p95={resumen['latencia_ms_p95']} ms p99={resumen['latencia_ms_p99']} ms errores={resumen['tasa_error']:.2%}")
+
+    salida = args.salida or f"carga_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump({
+            "fecha": datetime.now().isoformat(),
+            "parametros": {k: v for k, v in vars(args).items()},
+            "total": total,
+            "por_endpoint": por_endpoint,
+        }, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Servidor stub compatible con la API de OpenAI para pruebas de carga sin red ni costo.
+
+Atiende /v1/embeddings y /v1/chat/completions con latencia configurable:
+  - Embeddings: devuelve el vector grabado para el texto o, si no hay grabación, un vector
+    pseudoaleatorio determinista (mismo texto -> mismo vector) normalizado.
+  - Chat: si el request trae herramientas y todavía no hay respuesta de una herramienta en los
+    mensajes, devuelve un tool_call a la primera herramienta (el nodo "retrieve" del grafo)
+    con la última pregunta del usuario; si no, devuelve la respuesta grabada o una genérica.
+
+Con --grabar reenvía cada request a OpenAI (OPENAI_API_KEY) y guarda las respuestas en el
+archivo de grabaciones, para luego reproducirlas sin red.
+
+Uso:
+    python stub_openai.py --puerto 8900 --latencia-embeddings-ms 40 --latencia-chat-ms 800
+    # En la app:  OPENAI_BASE_URL=http://localhost:8900/v1  OPENAI_API_KEY=stub
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+
+app = FastAPI(title="Stub OpenAI")
+
+CONFIG = {
+    "dimension": 1536,
+    "latencia_embeddings_ms": 40.0,
+    "latencia_chat_ms": 800.0,
+    "jitter": 0.2,
+    "grabar": False,
+    "archivo": "grabaciones_openai.json",
+}
+GRABACIONES = {"embeddings": {}, "chat": {}}
+_lock_grabaciones = threading.Lock()
+CONTADORES = {"embeddings": 0, "chat": 0, "tool_calls": 0, "grabados": 0, "reproducidos": 0}
+
+
+def _clave(valor):
+    return hashlib.sha256(json.dumps(valor, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def vector_determinista(clave, dimension):
+    generador = random.Random(int(clave[:16], 16))
+    vector = [generador.gauss(0.0, 1.0) for _ in range(dimension)]
+    norma = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norma for x in vector]
+
+
+async def _esperar(latencia_ms):
+    if latencia_ms <= 0:
+        return
+    variacion = latencia_ms * CONFIG["jitter"]
+    await asyncio.sleep(max(0.0, random.uniform(latencia_ms - variacion, latencia_ms + variacion)) / 1000.0)
+
+
+async def _reenviar_a_openai(ruta, cuerpo):
+    async with httpx.AsyncClient(timeout=120) as cliente:
+        respuesta = await cliente.post(
+            f"https://api.openai.com/v1/{ruta}",
+            json=cuerpo,
+            headers={"Authorization": f"Bearer {os.environ['OPENAI_API_KEY']}"},
+        )
+        respuesta.raise_for_status()
+        return respuesta.json()
+
+
+def guardar_grabaciones():
+    with _lock_grabaciones:
+        with open(CONFIG["archivo"], "w", encoding="utf-8") as f:
+            json.dump(GRABACIONES, f)
+
+
+def _uso(tokens_entrada, tokens_salida=0):
+    return {"prompt_tokens": tokens_entrada, "completion_tokens": tokens_salida, "total_tokens": tokens_entrada + tokens_salida}
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    cuerpo = await request.json()
+    entradas = cuerpo.get("input")
+    # OpenAIEmbeddings de LangChain envía listas de tokens; también se aceptan textos
+    if isinstance(entradas, str) or (isinstance(entradas, list) and entradas and isinstance(entradas[0], int)):
+        entradas = [entradas]
+    CONTADORES["embeddings"] += 1
+
+    if CONFIG["grabar"]:
+        respuesta = await _reenviar_a_openai("embeddings", cuerpo)
+        with _lock_grabaciones:
+            for entrada, item in zip(entradas, respuesta["data"]):
+                GRABACIONES["embeddings"][_clave([cuerpo.get("model"), entrada])] = item["embedding"]
+        CONTADORES["grabados"] += len(entradas)
+        guardar_grabaciones()
+        return respuesta
+
+    await _esperar(CONFIG["latencia_embeddings_ms"])
+    datos = []
+    for indice, entrada in enumerate(entradas):
+        clave = _clave([cuerpo.get("model"), entrada])
+        vector = GRABACIONES["embeddings"].get(clave)
+        if vector is not None:
+            CONTADORES["reproducidos"] += 1
+        else:
+            vector = vector_determinista(clave, CONFIG["dimension"])
+        datos.append({"object": "embedding", "index": indice, "embedding": vector})
+    tokens = sum(len(e) if isinstance(e, list) else len(str(e).split()) for e in entradas)
+    return {"object": "list", "data": datos, "model": cuerpo.get("model", "text-embedding-ada-002"), "usage": _uso(tokens)}
+
+
+def _ultima_pregunta(mensajes):
+    for mensaje in reversed(mensajes):
+        if mensaje.get("role") == "user":
+            contenido = mensaje.get("content")
+            if isinstance(contenido, list):
+                contenido = " ".join(p.get("text", "") for p in contenido if isinstance(p, dict))
+            return contenido or ""
+    return ""
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    cuerpo = await request.json()
+    mensajes = cuerpo.get("messages", [])
+    CONTADORES["chat"] += 1
+    clave = _clave([cuerpo.get("model"), bool(cuerpo.get("tools")), mensajes])
+
+    if CONFIG["grabar"]:
+        respuesta = await _reenviar_a_openai("chat/completions", cuerpo)
+        with _lock_grabaciones:
+            GRABACIONES["chat"][clave] = respuesta
+        CONTADORES["grabados"] += 1
+        guardar_grabaciones()
+        return respuesta
+
+    await _esperar(CONFIG["latencia_chat_ms"])
+    grabada = GRABACIONES["chat"].get(clave)
+    if grabada is not None:
+        CONTADORES["reproducidos"] += 1
+        return grabada
+
+    pregunta = _ultima_pregunta(mensajes)
+    tokens_entrada = sum(len(str(m.get("content") or "").split()) for m in mensajes)
+    herramientas = cuerpo.get("tools") or []
+    ya_uso_herramienta = any(m.get("role") == "tool" for m in mensajes)
+
+    if herramientas and not ya_uso_herramienta:
+        CONTADORES["tool_calls"] += 1
+        funcion = herramientas[0].get("function", {})
+        parametros = list((funcion.get("parameters") or {}).get("properties", {}).keys()) or ["query"]
+        mensaje = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": funcion.get("name", "retrieve"), "arguments": json.dumps({parametros[0]: pregunta}, ensure_ascii=False)},
+            }],
+        }
+        motivo = "tool_calls"
+        tokens_salida = 20
+    else:
+        texto = f"Respuesta simulada para: {pregunta[:200]}"
+        mensaje = {"role": "assistant", "content": texto}
+        motivo = "stop"
+        tokens_salida = len(texto.split())
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": cuerpo.get("model", "gpt-4o-mini"),
+        "choices": [{"index": 0, "message": mensaje, "finish_reason": motivo}],
+        "usage": _uso(tokens_entrada, tokens_salida),
+    }
+
+
+@app.get("/v1/models")
+async def modelos():
+    return {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}, {"id": "text-embedding-ada-002", "object": "model"}]}
+
+
+@app.get("/stub/estadisticas")
+async def estadisticas():
+    return {"contadores": CONTADORES, "config": CONFIG,
+            "grabaciones": {"embeddings": len(GRABACIONES["embeddings"]), "chat": len(GRABACIONES["chat"])}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub compatible con OpenAI para pruebas de carga")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8900)
+    parser.add_argument("--latencia-embeddings-ms", type=float, default=40.0, help="Latencia media de /v1/embeddings")
+    parser.add_argument("--latencia-chat-ms", type=float, default=800.0, help="Latencia media de /v1/chat/completions")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Variación relativa de la latencia (0.2 = ±20%%)")
+    parser.add_argument("--dimension", type=int, default=1536, help="Dimensión de los embeddings sintéticos")
+    parser.add_argument("--grabaciones", default="grabaciones_openai.json", help="Archivo de grabaciones a reproducir/grabar")
+    parser.add_argument("--grabar", action="store_true", help="Reenviar a OpenAI y grabar las respuestas (requiere OPENAI_API_KEY)")
+    args = parser.parse_args()
+
+    CONFIG.update({
+        "dimension": args.dimension,
+        "latencia_embeddings_ms": args.latencia_embeddings_ms,
+        "latencia_chat_ms": args.latencia_chat_ms,
+        "jitter": args.jitter,
+        "grabar": args.grabar,
+        "archivo": args.grabaciones,
+    })
+    if os.path.exists(args.grabaciones):
+        with open(args.grabaciones, "r", encoding="utf-8") as f:
+            GRABACIONES.update(json.load(f))
+        print(f"Grabaciones cargadas: {len(GRABACIONES['embeddings'])} embeddings, {len(GRABACIONES['chat'])} respuestas de chat")
+    if args.grabar and not os.environ.get("OPENAI_API_KEY"):
+        parser.error("--grabar requiere OPENAI_API_KEY")
+
+    print(f"Stub OpenAI en http://{args.host}:{args.puerto}/v1 ({'GRABANDO' if args.grabar else 'reproduciendo'})")
+    uvicorn.run(app, host=args.host, port=args.puerto, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# pruebas_carga/test_rollup_consistencia.py
+"""
+El mantenimiento incremental de consultas_diarias (app/services/rollup_service.py) tiene que
+dejar la tabla igual que reconstruir() sobre las mismas consultas: cualquier desvío en los
+±1 de sumar_consulta / mover_feedback / mover_feedback_lote corrompe /api/admin/estadisticas
+sin que nada lo note.
+
+Sobre SQLite en memoria con el esquema de BD_RELA/create_tables.py: inserta consultas (con UGL,
+respuesta_util, respuesta_es_vacia y tiempo en NULL), aplica feedback uno a uno y en lote
+(incluido repetir el mismo valor) y compara la tabla con su reconstrucción.
+
+Se ejecuta desde la raíz del proyecto:
+    python pruebas_carga/test_rollup_consistencia.py     (o con pytest)
+"""
+
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from sqlalchemy.dialects import sqlite as dialecto_sqlite
+from sqlalchemy.schema import CreateTable
+
+from BD_RELA.create_tables import Consulta, ConsultaDiaria
+from app.services import rollup_service
+
+DIALECTO = "sqlite"
+
+# (ugel_origen, respuesta_util, respuesta_es_vacia, tokens_input, tokens_output, tiempo_respuesta_ms)
+CONSULTAS = [
+    ("UGL I", "nada", 0, 1200, 300, 4000),
+    ("UGL I", "si", 0, 900, 250, 3500),
+    ("UGL II", None, 1, 1000, 0, 2500),
+    (None, None, None, None, None, None),
+    (None, "Si", 0, 700, 120, 0),
+    ("UGL II", "no", 0, 1500, 410, 6100),
+    ("UGL III", "nada", None, 800, 200, None),
+    (None, "no", 1, 650, 90, 1800),
+]
+
+
+def crear_base():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    for modelo in (Consulta, ConsultaDiaria):
+        conn.execute(str(CreateTable(modelo.__table__).compile(dialect=dialecto_sqlite.dialect())))
+    rollup_service.olvidar_existencia()
+    return conn
+
+
+def insertar(cursor, indice, ugel, util, vacia, tokens_in, tokens_out, tiempo):
+    """INSERT + sumar_consulta en la misma transacción, como persistir_consulta"""
+    timestamp = (datetime(2025, 3, 1, 9) + timedelta(days=indice % 3, minutes=indice)).strftime("%Y-%m-%d %H:%M:%S.%f")
+    cursor.execute("""
+        INSERT INTO consultas (timestamp, id_usuario, ugel_origen, pregunta_usuario, respuesta_asistente,
+            respuesta_es_vacia, respuesta_util, tokens_input, tokens_output, tiempo_respuesta_ms, error_detectado)
+        VALUES (?, 321, ?, 'pregunta', 'respuesta', ?, ?, ?, ?, ?, 0)
+    """, (timestamp, ugel, vacia, util, tokens_in, tokens_out, tiempo))
+    rollup_service.sumar_consulta(
+        cursor, DIALECTO, timestamp=timestamp, ugel_origen=ugel, respuesta_util=util, respuesta_es_vacia=vacia,
+        tokens_input=tokens_in, tokens_output=tokens_out, tiempo_respuesta_ms=tiempo,
+    )
+    return cursor.lastrowid
+
+
+def feedback(cursor, id_consulta, util):
+    """mover_feedback antes del UPDATE, como actualizar_feedback"""
+    rollup_service.mover_feedback(cursor, DIALECTO, id_consulta, util)
+    cursor.execute("UPDATE consultas SET respuesta_util = ? WHERE id_consulta = ?", (util, id_consulta))
+
+
+def feedback_lote(cursor, cambios):
+    """mover_feedback_lote antes del UPDATE con executemany, como actualizar_feedback_lote"""
+    rollup_service.mover_feedback_lote(cursor, DIALECTO, cambios)
+    cursor.executemany("UPDATE consultas SET respuesta_util = ? WHERE id_consulta = ?",
+                       [(util, id_consulta) for id_consulta, util in cambios])
+
+
+def contenido_rollup(cursor):
+    cursor.execute("SELECT * FROM consultas_diarias ORDER BY fecha, ugel_origen, respuesta_util, respuesta_es_vacia")
+    return [tuple(fila) for fila in cursor.fetchall()]
+
+
+def test_rollup_incremental_igual_a_reconstruccion():
+    conn = crear_base()
+    cursor = conn.cursor()
+    ids = [insertar(cursor, i, *datos) for i, datos in enumerate(CONSULTAS)]
+    conn.commit()
+
+    feedback(cursor, ids[0], "si")       # nada -> si
+    feedback(cursor, ids[1], "si")       # mismo valor: no mueve nada
+    feedback(cursor, ids[3], "no")       # NULL (y UGL NULL) -> no
+    feedback(cursor, ids[3], "no")       # repetido
+    feedback(cursor, ids[4], "si")       # 'Si' en mayúscula -> si
+    feedback(cursor, ids[0], "no")       # si -> no
+    feedback(cursor, 999999, "si")       # consulta inexistente
+    conn.commit()
+
+    feedback_lote(cursor, [
+        (ids[2], "si"),                  # NULL -> si
+        (ids[5], "no"),                  # mismo valor
+        (ids[6], "no"),                  # respuesta_es_vacia y tiempo NULL
+        (ids[7], "si"),                  # UGL NULL
+        (ids[0], "si"),
+    ])
+    feedback_lote(cursor, [(ids[2], "si"), (ids[7], "no")])  # repetido y vuelta atrás
+    conn.commit()
+
+    incremental = contenido_rollup(cursor)
+    rollup_service.reconstruir(cursor, DIALECTO)
+    reconstruido = contenido_rollup(cursor)
+    conn.close()
+
+    assert incremental == reconstruido, f"\nincremental:  {incremental}\nreconstruido: {reconstruido}"
+    assert not any(fila[4] <= 0 for fila in incremental), "quedaron grupos vacíos en consultas_diarias"
+
+
+if __name__ == "__main__":
+    test_rollup_incremental_igual_a_reconstruccion()
+    print("OK: consultas_diarias incremental coincide con reconstruir()")
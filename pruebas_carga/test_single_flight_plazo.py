@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# pruebas_carga/test_single_flight_plazo.py
+"""
+Dos requests con plazos distintos comparten un solo cálculo (app/services/single_flight.py):
+el cálculo corre con el plazo propio del SingleFlight, no con el del request que lo inició, y
+el plazo de cada request sólo limita cuánto espera él.
+
+Se ejecuta desde la raíz del proyecto:
+    python pruebas_carga/test_single_flight_plazo.py     (o con pytest)
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.services.plazo import iniciar_plazo, tiempo_restante, verificar_plazo
+from app.services.single_flight import SingleFlight
+
+PLAZO_CALCULO = 30.0
+
+
+def calculo_lento():
+    """Simula el grafo: tarda 0.3 s y verifica el plazo al final, como los nodos"""
+    time.sleep(0.3)
+    verificar_plazo("calculo_lento")
+    return tiempo_restante()
+
+
+async def request(vuelo, plazo_request, demora=0.0):
+    """Un request con su propio plazo, como lo fija el middleware de la API"""
+    await asyncio.sleep(demora)
+    iniciar_plazo(plazo_request)
+    resultado, compartido = await vuelo.ejecutar("misma pregunta", calculo_lento, espera_maxima=tiempo_restante())
+    return resultado, compartido, tiempo_restante()
+
+
+async def escenario():
+    vuelo = SingleFlight("prueba", plazo=PLAZO_CALCULO)
+    # El primero llega con un plazo de 50 ms (X-Request-Timeout-Ms corto): se cansa de esperar,
+    # pero el cálculo que inició sigue con su propio plazo y le llega completo al segundo
+    corto = asyncio.ensure_future(request(vuelo, 0.05))
+    largo = asyncio.ensure_future(request(vuelo, 10.0, demora=0.01))
+    resultados = await asyncio.gather(corto, largo, return_exceptions=True)
+    return vuelo, resultados
+
+
+def test_plazo_propio_del_calculo_compartido():
+    vuelo, (corto, largo) = asyncio.run(escenario())
+
+    assert isinstance(corto, asyncio.TimeoutError), f"el request de plazo corto debía dejar de esperar: {corto!r}"
+    assert not isinstance(largo, BaseException), f"el cálculo compartido falló: {largo!r}"
+    restante_calculo, compartido, restante_request = largo
+    assert compartido, "el segundo request debía sumarse al cálculo en vuelo"
+    # El cálculo vio su propio plazo (~30 s), no los 50 ms del request que lo inició ni los 10 s del segundo
+    assert PLAZO_CALCULO - 5 < restante_calculo <= PLAZO_CALCULO, restante_calculo
+    assert 0 < restante_request < 10.0, restante_request
+    assert vuelo.estado()["ejecuciones"] == 1 and vuelo.estado()["coalescidas"] == 1, vuelo.estado()
+
+
+if __name__ == "__main__":
+    test_plazo_propio_del_calculo_compartido()
+    print("OK: el cálculo compartido usa su propio plazo")